@@ -1,21 +1,31 @@
 import streamlit as st
 import os
-import chromadb
-from openai import OpenAI, AuthenticationError
 from dotenv import load_dotenv
 from pathlib import Path
+import sys
 import time
-from importlib.util import module_from_spec, spec_from_file_location
 
+SCRIPTS_DIR = Path(__file__).resolve().parent / "scripts"
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
 
-def load_script_module(script_filename: str, module_name: str):
-    script_path = Path(__file__).resolve().parent / "scripts" / script_filename
-    module_spec = spec_from_file_location(module_name, script_path)
-    if module_spec is None or module_spec.loader is None:
-        raise ImportError(f"Could not load module from {script_path}")
-    module = module_from_spec(module_spec)
-    module_spec.loader.exec_module(module)
-    return module
+from context_packing import CONTEXT_TOP_K
+from eval_queue import get_default_queue
+from llm_cache import cached_chat_completion, get_default_cache, is_cache_hit
+from resources import (
+    get_context_packer,
+    get_embedding_function,
+    get_eval_worker_pool,
+    get_openai_client,
+    get_retrieval_service,
+    get_router,
+    get_semantic_cache,
+    load_script_module,
+    registry,
+    start_preflight_check,
+)
+from streaming import stream_chat_completion
+from tracing import read_spans, span, summarize_by_stage, trace, tracer
 
 env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(env_path)
@@ -25,62 +35,129 @@ if not api_key:
     st.error("Missing OPENAI_API_KEY. Add it to .env in the project root.")
     st.stop()
 
-client = OpenAI(api_key=api_key)
-
-if "openai_auth_ok" not in st.session_state:
-    try:
-        client.models.list()
-        st.session_state["openai_auth_ok"] = True
-        st.session_state["openai_auth_error"] = ""
-    except AuthenticationError:
-        st.session_state["openai_auth_ok"] = False
-        st.session_state["openai_auth_error"] = (
-            "OpenAI authentication failed (401). Your OPENAI_API_KEY appears invalid, revoked, "
-            "or from a different project. Generate a fresh key in OpenAI, update .env, then restart Streamlit."
-        )
-    except Exception as error:
-        st.session_state["openai_auth_ok"] = False
-        st.session_state["openai_auth_error"] = f"OpenAI preflight check failed: {error}"
+# Clients, modules, the compiled graph and the Chroma collection live in the
+# process-wide resource registry and are built on first use, so the page
+# renders before any of them and reruns and new sessions skip cold start.
+# The OpenAI auth check runs in the background instead of blocking the page.
+preflight = start_preflight_check()
+# Sampled workflow outputs are judged by these background workers, off the request path.
+get_eval_worker_pool()
 
 st.set_page_config(page_title="QA AI Workflow Lab", page_icon="🤖")
 st.title("🚀 QA AI Workflow Orchestrator")
 
-if not st.session_state.get("openai_auth_ok", False):
-    st.error(st.session_state.get("openai_auth_error", "OpenAI authentication check failed."))
-    st.stop()
+with st.sidebar:
+    st.caption(f"Cached resources: {', '.join(registry.names()) or 'none'}")
+    st.caption(f"OpenAI auth: {preflight.result()[1] if preflight.done() else 'checking in the background...'}")
+    if st.button("Reload cached resources"):
+        eval_workers = registry.peek("eval_worker_pool")
+        if eval_workers is not None:
+            eval_workers.stop(timeout=0)  # A fresh pool starts with the next run.
+        registry.invalidate()
+        st.rerun()
 
-# --- Initialize Database ---
-db_client = chromadb.PersistentClient(path="./data/chroma_db")
-collection = db_client.get_collection(name="engineering_docs")
+if preflight.done():
+    openai_auth_ok, openai_auth_error = preflight.result()
+    if not openai_auth_ok:
+        st.error(openai_auth_error)
+        st.stop()
 
 user_query = st.text_input("Enter a requirement to generate a test case:")
+use_response_cache = st.checkbox("Reuse cached responses for identical prompts", value=True)
+use_semantic_cache = st.checkbox("Reuse answers for similar requirements", value=True)
+use_streaming = st.checkbox("Stream tokens as they are generated", value=True)
 
 if st.button("Generate & Trace"):
     if user_query:
+        from openai import AuthenticationError
+
         # Start a timer for the trace
         start_time = time.time()
+        client = get_openai_client()
+        router = get_router()
+        retriever = get_retrieval_service()
+        semantic_cache = get_semantic_cache()
+        stream_stats = {}
+        usage = {}
+        cache_hit = False
         
         try:
-            with st.spinner("Executing Workflow..."):
-                # STAGE 1: ROUTING
-                router_prompt = f"Categorize as 'security' or 'technical': {user_query}. Return one word."
-                category = client.chat.completions.create(
-                    model="gpt-4o", messages=[{"role": "user", "content": router_prompt}]
-                ).choices[0].message.content.strip().lower()
-                
-                # STAGE 2: RETRIEVAL
-                results = collection.query(query_texts=[user_query], n_results=1, where={"category": category})
-                context = results['documents'][0][0]
-                metadata = results['metadatas'][0][0]
-                
-                # STAGE 3: GENERATION
-                prompt = f"Using this rule: '{context}', write a test case for: {user_query}"
-                response = client.chat.completions.create(
-                    model="gpt-4o", messages=[{"role": "user", "content": prompt}]
-                )
-                output = response.choices[0].message.content
-                
-                end_time = time.time()
+            with trace() as trace_id:
+                with st.spinner("Executing Workflow..."):
+                    # STAGE 1: ROUTING
+                    query_embedding = retriever.embed_queries([user_query])[0]
+                    route_decision = router.route(user_query, query_embedding=query_embedding)
+                    category = route_decision["category"]
+
+                    # A near-paraphrase in the same category was answered before: skip retrieval and the LLM.
+                    semantic_hit = None
+                    if use_semantic_cache:
+                        semantic_hit = semantic_cache.lookup("generate_trace", user_query, category, query_embedding)
+
+                    if semantic_hit is not None:
+                        output = semantic_hit["answer"]["output"]
+                        context = semantic_hit["answer"]["context"]
+                        metadata = semantic_hit["answer"]["metadata"]
+                    else:
+                        # STAGE 2: RETRIEVAL (reuses the routing embedding), packed into the context token budget
+                        matches = retriever.retrieve(user_query, category, k=CONTEXT_TOP_K)["matches"]
+                        packed_context = get_context_packer().pack(matches)
+                        if not packed_context["matches"]:
+                            st.warning(
+                                f"No rules are indexed for category '{category}', so there is nothing to ground "
+                                "the test case on. Run scripts/1_ingest.py and try again."
+                            )
+                            st.stop()
+                        context = packed_context["context"]
+                        metadata = packed_context["matches"][0]["metadata"]
+                        retrieval_method = packed_context["matches"][0]["retrieval"]
+                        
+                        # STAGE 3: GENERATION
+                        prompt = f"Using these rules:\n{context}\nwrite a test case for: {user_query}"
+                        generation_request = {"model": "gpt-4o", "messages": [{"role": "user", "content": prompt}]}
+                        if not use_streaming:
+                            with span("generation") as generation_span:
+                                response = cached_chat_completion(client, use_cache=use_response_cache, **generation_request)
+                                generation_span.record_usage(response)
+                            output = response.choices[0].message.content
+                            cache_hit = is_cache_hit(response)
+                            if response.usage:
+                                usage = {
+                                    "prompt_tokens": response.usage.prompt_tokens,
+                                    "completion_tokens": response.usage.completion_tokens,
+                                }
+
+                # --- FINAL OUTPUT ---
+                st.markdown("### Generated Test Case")
+                if semantic_hit is not None:
+                    st.caption(
+                        f"♻️ Reused the plan for a similar requirement "
+                        f"(similarity {semantic_hit['similarity']:.3f}): \"{semantic_hit['cached_requirement']}\""
+                    )
+                    st.success(output)
+                elif use_streaming:
+                    # Tokens are rendered as they arrive instead of after the full completion.
+                    output = st.write_stream(stream_chat_completion(
+                        client, stats=stream_stats, use_cache=use_response_cache, **generation_request
+                    ))
+                    cache_hit = stream_stats.get("cache_hit", False)
+                    usage = {
+                        "prompt_tokens": stream_stats.get("prompt_tokens"),
+                        "completion_tokens": stream_stats.get("completion_tokens"),
+                    }
+                else:
+                    st.success(output)
+
+                if semantic_hit is None and use_semantic_cache:
+                    semantic_cache.store(
+                        "generate_trace",
+                        user_query,
+                        category,
+                        {"output": output, "context": context, "metadata": metadata},
+                        query_embedding,
+                    )
+
+            end_time = time.time()
         except AuthenticationError:
             st.error(
                 "OpenAI authentication failed (401). Your OPENAI_API_KEY appears invalid, revoked, or from a different project. "
@@ -91,26 +168,56 @@ if st.button("Generate & Trace"):
         # --- THE TRACE SECTION ---
         with st.expander("🔍 View Execution Trace"):
             st.write(f"**Total Execution Time:** {round(end_time - start_time, 2)}s")
+            generation_trace = {
+                "model": "gpt-4o",
+                **usage,
+                "cache_hit": cache_hit,
+                "streamed": use_streaming and semantic_hit is None,
+            }
+            if generation_trace["streamed"]:
+                generation_trace.update({
+                    "time_to_first_token_s": round(stream_stats.get("ttft_s", 0.0), 3),
+                    "tokens_per_sec": round(stream_stats["tokens_per_sec"], 1) if stream_stats.get("tokens_per_sec") else None,
+                })
             st.json({
+                "trace_id": trace_id,
                 "routing": {
                     "detected_category": category,
-                    "logic": "LLM-based Intent Classification"
+                    "logic": "Embedding nearest-centroid with LLM fallback",
+                    "path": route_decision["path"],
+                    "margin": round(route_decision["margin"], 3),
+                    "latency_ms": round(route_decision["latency_ms"], 1),
                 },
                 "retrieval": {
                     "source_document": context,
                     "metadata_filter_applied": metadata,
-                    "database": "ChromaDB"
+                    "method": None if semantic_hit is not None else retrieval_method,
+                    "packed_rules": None if semantic_hit is not None else len(packed_context["matches"]),
+                    "candidates": None if semantic_hit is not None else packed_context["candidates"],
+                    "duplicates_dropped": None if semantic_hit is not None else packed_context["duplicates"],
+                    "context_tokens": None if semantic_hit is not None else packed_context["tokens"],
+                    "context_token_budget": get_context_packer().token_budget,
+                    "database": "ChromaDB + BM25"
+                },
+                "generation": generation_trace,
+                "semantic_cache": {
+                    "hit": semantic_hit is not None,
+                    "similarity": round(semantic_hit["similarity"], 3) if semantic_hit else None,
+                    "threshold": semantic_cache.threshold,
+                    **semantic_cache.stats,
+                    "hit_rate": round(semantic_cache.hit_rate(), 3),
+                },
+                "response_cache": {
+                    **get_default_cache().stats,
+                    "hit_rate": round(get_default_cache().hit_rate(), 3),
+                },
+                "stages_ms": {
+                    record["stage"]: record["duration_ms"]
+                    for record in read_spans(limit=50)
+                    if record.get("trace_id") == trace_id
                 },
-                "generation": {
-                    "model": "gpt-4o",
-                    "tokens_used": "Estimate ~200"
-                }
             })
 
-        # --- FINAL OUTPUT ---
-        st.markdown("### Generated Test Case")
-        st.success(output)
-
 st.divider()
 st.subheader("🧪 Integrated Scripts")
 
@@ -125,7 +232,12 @@ with left_col:
                 batch_results = test_suite_module.run_batch_test()
 
             if batch_results:
-                st.success(f"Completed {len(batch_results)} test scenarios")
+                reused = sum(1 for row in batch_results if row.get("reused"))
+                judged = sum(1 for row in batch_results if row.get("reused") is not None)
+                st.success(
+                    f"Completed {len(batch_results)} test scenarios "
+                    f"(♻️ {reused} evaluations reused, {judged - reused} recomputed)"
+                )
                 st.dataframe(batch_results, use_container_width=True)
             else:
                 st.warning("Batch test completed, but no results were returned.")
@@ -140,11 +252,40 @@ with right_col:
         key="multi_agent_requirement"
     )
 
+    use_speculative = st.checkbox(
+        "Speculative drafting (parallel drafts, first approved wins)",
+        value=False,
+        key="multi_agent_speculative"
+    )
+    speculative_drafts = st.slider(
+        "Speculative drafts", min_value=2, max_value=6, value=3, disabled=not use_speculative
+    )
+
     if st.button("Run Multi-Agent Workflow"):
         try:
             with st.spinner("Running multi-agent workflow..."):
                 multi_agent_module = load_script_module("5_multi_agent.py", "multi_agent_module")
-                review_result = multi_agent_module.run_multi_agent_workflow(multi_agent_requirement)
+                review_result = multi_agent_module.run_multi_agent_workflow(
+                    multi_agent_requirement,
+                    use_semantic_cache=use_semantic_cache,
+                    speculative=use_speculative,
+                    drafts=speculative_drafts,
+                    max_concurrency=speculative_drafts,
+                )
+
+            if review_result.get("semantic_cache_hit"):
+                st.caption(
+                    f"♻️ Reused the review of a similar requirement: "
+                    f"\"{review_result['semantic_cache_hit']['cached_requirement']}\""
+                )
+
+            if review_result.get("speculative"):
+                speculation = review_result["speculative"]
+                st.caption(
+                    f"⚡ Chose draft #{speculation['chosen_draft'] + 1} of "
+                    f"{speculation['drafts_completed']}/{speculation['drafts_requested']} completed "
+                    f"({speculation['tokens_used']} tokens)"
+                )
 
             st.markdown("##### Architect Plan")
             st.write(review_result["initial_plan"])
@@ -167,12 +308,28 @@ with right_col:
         value="A login system that requires MFA and SHA-256 password hashing.",
         key="langgraph_requirement"
     )
+    langgraph_delta = st.checkbox(
+        "Delta revisions (architect patches changed sections only)", value=True, key="langgraph_delta"
+    )
+    budget_cols = st.columns(2)
+    langgraph_token_budget = budget_cols[0].number_input(
+        "Token budget (0 = unlimited)", min_value=0, value=0, step=500, key="langgraph_token_budget"
+    )
+    langgraph_time_budget = budget_cols[1].number_input(
+        "Time budget, s (0 = unlimited)", min_value=0.0, value=0.0, step=5.0, key="langgraph_time_budget"
+    )
+    langgraph_options = {
+        "use_semantic_cache": use_semantic_cache,
+        "revision_mode": "delta" if langgraph_delta else "full",
+        "token_budget": int(langgraph_token_budget),
+        "time_budget_s": float(langgraph_time_budget),
+    }
 
     if st.button("Run LangGraph Workflow"):
         try:
             with st.spinner("Running LangGraph workflow..."):
                 langgraph_module = load_script_module("6_langgraph_flow.py", "langgraph_flow_module")
-                flow_result = langgraph_module.run_langgraph_workflow(langgraph_requirement)
+                flow_result = langgraph_module.run_langgraph_workflow(langgraph_requirement, **langgraph_options)
 
             st.markdown("##### Final Test Plan")
             st.write(flow_result["test_plan"])
@@ -185,21 +342,76 @@ with right_col:
                 {
                     "revisions_used": flow_result["revision_count"],
                     "auditor_decision": flow_result["auditor_decision"],
+                    "run_id": flow_result.get("run_id"),
+                    "stop_reason": flow_result.get("stop_reason"),
+                    "tokens_used": flow_result.get("tokens_used"),
+                    "tokens_per_revision": flow_result.get("iteration_tokens"),
+                    "semantic_cache_hit": bool(flow_result.get("semantic_cache_hit")),
                 }
             )
         except Exception as error:
-            st.error(f"LangGraph workflow failed: {error}")
+            st.error(f"LangGraph workflow failed: {error} (completed steps are checkpointed; resume below)")
+
+    with st.expander("💾 Checkpointed LangGraph runs"):
+        # Expander bodies run on every rerun; only load LangGraph when asked to.
+        langgraph_runs = []
+        if st.checkbox("Load checkpointed runs", key="langgraph_load_runs"):
+            try:
+                langgraph_module = load_script_module("6_langgraph_flow.py", "langgraph_flow_module")
+                langgraph_runs = langgraph_module.list_langgraph_runs()
+            except Exception as error:
+                st.error(f"Could not read LangGraph checkpoints: {error}")
+
+        if langgraph_runs:
+            st.dataframe(langgraph_runs, use_container_width=True)
+            resumable = [run["run_id"] for run in langgraph_runs if run["status"] == "interrupted"]
+            if resumable:
+                resume_run_id = st.selectbox("Interrupted run to resume:", resumable)
+                if st.button("Resume Run"):
+                    try:
+                        with st.spinner(f"Resuming run {resume_run_id}..."):
+                            resumed = langgraph_module.resume_langgraph_run(
+                                resume_run_id, use_semantic_cache=use_semantic_cache
+                            )
+                        st.markdown("##### Final Test Plan")
+                        st.write(resumed["test_plan"])
+                        st.json(
+                            {
+                                "run_id": resumed["run_id"],
+                                "stop_reason": resumed["stop_reason"],
+                                "revisions_used": resumed["revision_count"],
+                                "tokens_used": resumed.get("tokens_used"),
+                            }
+                        )
+                    except Exception as error:
+                        st.error(f"Resume failed: {error}")
+            else:
+                st.caption("No interrupted runs.")
+        elif st.session_state["langgraph_load_runs"]:
+            st.caption("No checkpointed runs yet.")
 
     if st.button("Run LangGraph + Final Audit"):
         try:
-            with st.spinner("Running LangGraph and final audit..."):
+            with st.spinner("Running LangGraph..."):
                 langgraph_module = load_script_module("6_langgraph_flow.py", "langgraph_flow_eval_module")
-                final_eval_module = load_script_module("7_final_eval.py", "final_eval_module")
-                flow_result = langgraph_module.run_langgraph_workflow(langgraph_requirement)
-                audit_scores = final_eval_module.run_final_audit(
-                    query=langgraph_requirement,
-                    context=langgraph_requirement,
-                    output=flow_result["test_plan"],
+                # Routed once: the same category keys the semantic cache and labels the audit.
+                audit_embedding = get_embedding_function()([langgraph_requirement])[0]
+                audit_category = get_router().route(langgraph_requirement, query_embedding=audit_embedding)["category"]
+                flow_result = langgraph_module.run_langgraph_workflow(
+                    langgraph_requirement,
+                    category=audit_category,
+                    offer=False,
+                    query_embedding=audit_embedding,
+                    **langgraph_options,
+                )
+                # The audit is always wanted here, so bypass sampling; the
+                # background workers score it while the plan is shown.
+                st.session_state["langgraph_audit_job"] = get_default_queue().enqueue(
+                    "langgraph",
+                    audit_category,
+                    langgraph_requirement,
+                    langgraph_requirement,
+                    flow_result["test_plan"],
                 )
 
             st.markdown("##### Final Test Plan")
@@ -207,16 +419,48 @@ with right_col:
 
             st.markdown("##### Auditor Feedback")
             st.info(flow_result["feedback"])
-
-            st.markdown("##### System Health Report")
-            st.json(
-                {
-                    "retrieval_quality": audit_scores["retrieval_quality"],
-                    "generation_honesty": audit_scores["generation_honesty"],
-                    "user_satisfaction": audit_scores["user_satisfaction"],
-                    "revisions_used": flow_result["revision_count"],
-                    "auditor_decision": flow_result["auditor_decision"],
-                }
+            st.caption(
+                f"Revisions used: {flow_result['revision_count']} · "
+                f"auditor decision: {flow_result['auditor_decision']}"
             )
         except Exception as error:
-            st.error(f"LangGraph + final audit failed: {error}")
\ No newline at end of file
+            st.error(f"LangGraph + final audit failed: {error}")
+
+    audit_job_id = st.session_state.get("langgraph_audit_job")
+    if audit_job_id is not None:
+        audit_job = get_default_queue().job(audit_job_id)
+        st.markdown("##### System Health Report")
+        if audit_job is None or audit_job["status"] in {"queued", "running"}:
+            st.info(f"Final audit queued as job #{audit_job_id}; refresh to see the scores.")
+            st.button("Refresh audit status")
+        elif audit_job["status"] == "failed":
+            st.error(f"Final audit job #{audit_job_id} failed: {audit_job['error']}")
+        else:
+            st.json({**audit_job["scores"], "metric_reasons": audit_job["reasons"], "job_id": audit_job_id})
+
+st.divider()
+st.subheader("🧪 Background Evaluation")
+eval_queue = get_default_queue()
+eval_summary = eval_queue.summary()
+if eval_summary:
+    st.caption(
+        "Sampled workflow outputs scored by the background DeepEval workers "
+        "(`EVAL_SAMPLE_RATE`, per category via `EVAL_SAMPLE_RATES`)."
+    )
+    st.dataframe(eval_summary, use_container_width=True)
+    with st.expander("Recent evaluation jobs"):
+        st.dataframe(eval_queue.recent(limit=50), use_container_width=True)
+else:
+    st.caption("No outputs sampled for evaluation yet. Run a workflow above.")
+
+st.divider()
+st.subheader("📈 Stage Latency & Spend")
+if tracer.enabled:
+    stage_summary = summarize_by_stage(read_spans(limit=5000))
+    if stage_summary:
+        st.caption(f"Aggregated from the last 5000 spans in `{tracer.path}`.")
+        st.dataframe(stage_summary, use_container_width=True)
+    else:
+        st.caption("No spans recorded yet. Run a workflow above.")
+else:
+    st.caption("Tracing is disabled (TRACING_ENABLED=0).")
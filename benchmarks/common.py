@@ -0,0 +1,115 @@
+import hashlib
+import math
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+from chromadb import EmbeddingFunction
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = ROOT_DIR / "scripts"
+
+RULE_TEMPLATES = {
+    "security": [
+        "All {subject} accounts must use Multi-Factor Authentication (MFA).",
+        "Passwords for {subject} must be hashed using SHA-256 with a unique salt.",
+        "Sessions for {subject} must expire after 15 minutes of inactivity.",
+        "Access to {subject} data requires role-based authorization.",
+    ],
+    "technical": [
+        "API response time for {subject} must be under 200ms at p95.",
+        "The {subject} endpoint must return HTTP 429 when rate limited.",
+        "Responses from {subject} must be valid JSON with a stable schema.",
+        "The {subject} service must sustain 500 requests per second.",
+    ],
+}
+SUBJECTS = ["admin", "billing", "login", "search", "reporting", "profile", "checkout", "audit log"]
+
+
+def add_scripts_to_path():
+    if str(SCRIPTS_DIR) not in sys.path:
+        sys.path.insert(0, str(SCRIPTS_DIR))
+
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """Deterministic bag-of-words embeddings via feature hashing.
+
+    No model download and no network: identical text always maps to the same
+    unit vector, which is all the benchmarks need.
+    """
+
+    def __init__(self, dimensions=64):
+        self.dimensions = dimensions
+
+    def __call__(self, input):
+        return [self._embed(text) for text in input]
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+
+def synthetic_rules(count, category_count=len(RULE_TEMPLATES)):
+    """Yield ``count`` distinct ``{"text", "metadata"}`` rule records spread over ``category_count`` categories.
+
+    Categories beyond ``security`` and ``technical`` are named ``domain-N`` and
+    reuse their templates.
+    """
+    categories = list(RULE_TEMPLATES) + [f"domain-{index}" for index in range(len(RULE_TEMPLATES), category_count)]
+    template_sets = list(RULE_TEMPLATES.values())
+    for index in range(count):
+        position = index % len(categories)
+        category = categories[position]
+        templates = template_sets[position % len(template_sets)]
+        template = templates[(index // len(categories)) % len(templates)]
+        subject = SUBJECTS[(index // 7) % len(SUBJECTS)]
+        yield {
+            "text": f"Rule {index}: {template.format(subject=subject)}",
+            "metadata": {
+                "category": category,
+                "priority": "high" if index % 3 == 0 else "medium",
+                "source": f"synthetic/{category}.txt",
+            },
+        }
+
+
+def stub_environment(base_url):
+    """Environment for a run against the local stub: no key, caches, tracing or rate limits."""
+    return {
+        "OPENAI_API_KEY": "benchmark-stub",
+        "OPENAI_BASE_URL": base_url,
+        "LLM_CACHE_DISABLED": "1",
+        "SEMANTIC_CACHE_DISABLED": "1",
+        "TRACING_ENABLED": "0",
+        "OPENAI_RPM_LIMIT": "0",
+        "OPENAI_TPM_LIMIT": "0",
+        "EVAL_SAMPLE_RATE": "0",
+        "EVAL_QUEUE_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-eval-queue-"), "eval_queue.sqlite"),
+        "LANGGRAPH_CHECKPOINT_PATH": os.path.join(tempfile.mkdtemp(prefix="bench-checkpoints-"), "checkpoints.sqlite"),
+    }
+
+
+def prepare_corpus(corpus_size, embedding_function):
+    """Ingest ``corpus_size`` synthetic rules into a fresh temporary Chroma store and BM25 index."""
+    import resources
+    from ingestion import ingest_records
+
+    # Fresh registry per corpus: modules capture the collection at import time.
+    resources.registry.invalidate()
+    resources.CHROMA_PATH = tempfile.mkdtemp(prefix=f"bench-chroma-{corpus_size}-")
+    resources.LEXICAL_INDEX_PATH = os.path.join(resources.CHROMA_PATH, "bm25_index.json")
+    resources.registry.override("embedding_function", embedding_function)
+    collection = resources.get_collection(create=True)
+    lexical_index = resources.get_lexical_index(collection)
+    stats = ingest_records(
+        collection, synthetic_rules(corpus_size), embedding_function=embedding_function, lexical_index=lexical_index
+    )
+    lexical_index.save()
+    return stats
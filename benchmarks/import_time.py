@@ -0,0 +1,122 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from common import ROOT_DIR, SCRIPTS_DIR
+
+DEFAULT_OUTPUT = ROOT_DIR / "benchmarks" / "results" / "import_time.json"
+SCRIPT_TARGETS = ["3_workflow.py", "5_multi_agent.py", "6_langgraph_flow.py", "7_final_eval.py", "test_suite.py"]
+
+
+def _module_imports(path):
+    """Source of the module-level import statements in ``path``: what loading it costs before any call."""
+    source = path.read_text(encoding="utf-8")
+    return "\n".join(
+        ast.get_source_segment(source, node)
+        for node in ast.parse(source).body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def targets():
+    """Name -> Python snippet whose import cost is measured."""
+    prelude = f"import sys\nsys.path.insert(0, {str(SCRIPTS_DIR)!r})\nsys.path.insert(0, {str(ROOT_DIR)!r})\n"
+    snippets = {
+        # Streamlit executes app.py itself; its module-level imports are what every cold start pays.
+        "app.py": prelude + _module_imports(ROOT_DIR / "app.py"),
+        "service.py": prelude + "import service",
+    }
+    for script in SCRIPT_TARGETS:
+        snippets[script] = prelude + f"from resources import load_script_module\nload_script_module({script!r})"
+    return snippets
+
+
+def parse_importtime(stderr):
+    """``[(level, name, self_us, cumulative_us)]`` from ``python -X importtime`` output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((level, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure(snippet, repeat):
+    """Best of ``repeat`` cold interpreter runs: wall time, import time and the heaviest packages."""
+    best = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", snippet],
+            cwd=ROOT_DIR, capture_output=True, text=True,
+        )
+        wall_ms = (time.perf_counter() - start_time) * 1000
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"
+            return {"error": error}
+        entries = [entry for entry in parse_importtime(completed.stderr) if entry[0] == 0]
+        import_ms = sum(cumulative_us for _, _, _, cumulative_us in entries) / 1000
+        if best is None or import_ms < best["import_ms"]:
+            packages = {}
+            for _, name, _, cumulative_us in entries:
+                package = name.split(".")[0]
+                packages[package] = packages.get(package, 0) + cumulative_us
+            best = {
+                "wall_ms": round(wall_ms, 1),
+                "import_ms": round(import_ms, 1),
+                "modules": len(entries),
+                "top_packages_ms": {
+                    package: round(cumulative_us / 1000, 1)
+                    for package, cumulative_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:10]
+                },
+            }
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start import cost of the app, service and scripts.")
+    parser.add_argument("--repeat", type=int, default=3, help="Interpreter runs per target; the fastest is kept.")
+    parser.add_argument("--baseline", help="Earlier report to compare against.")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)["results"]
+
+    results = {}
+    for name, snippet in targets().items():
+        results[name] = measure(snippet, max(1, args.repeat))
+        result = results[name]
+        if "error" in result:
+            print(f"   {name}: ❌ {result['error']}")
+            continue
+        line = f"   {name}: {result['import_ms']}ms imports ({result['wall_ms']}ms wall)"
+        previous = baseline.get(name, {}).get("import_ms")
+        if previous:
+            line += f" | {result['import_ms'] - previous:+.1f}ms vs baseline"
+        heaviest = ", ".join(f"{package} {ms}ms" for package, ms in list(result["top_packages_ms"].items())[:3])
+        print(f"{line} | heaviest: {heaviest}")
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"✅ Import-time report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
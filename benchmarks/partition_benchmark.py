@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from common import ROOT_DIR, HashingEmbeddingFunction, add_scripts_to_path, synthetic_rules
+
+DEFAULT_OUTPUT = ROOT_DIR / "benchmarks" / "results" / "partitions.json"
+INSERT_BATCH_SIZE = 5000
+LAYOUTS = ("filtered", "partitioned")
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def _hnsw_list(value):
+    """``"16:100:64,32:200:128"`` -> ``[{"M", "ef_construction", "ef_search"}, ...]``."""
+    configs = []
+    for item in value.split(","):
+        m, ef_construction, ef_search = (int(part) for part in item.split(":"))
+        configs.append({"M": m, "ef_construction": ef_construction, "ef_search": ef_search})
+    return configs
+
+
+def build_corpus(size, category_count, query_count, seed=0):
+    """Synthetic rules, their embeddings and ``query_count`` queries with the category the router would pick.
+
+    Each query is a rule's text without its ``Rule N:`` prefix, so it is
+    close to, but not identical with, many rules of its category.
+    """
+    import numpy as np
+
+    embedding_function = HashingEmbeddingFunction()
+    records = list(synthetic_rules(size, category_count))
+    embeddings = np.asarray(embedding_function([record["text"] for record in records]), dtype=np.float32)
+    rng = random.Random(seed)
+    queries = []
+    for index in rng.sample(range(size), min(query_count, size)):
+        text = records[index]["text"].split(": ", 1)[1]
+        queries.append({"text": text, "category": records[index]["metadata"]["category"],
+                        "embedding": embedding_function([text])[0]})
+    return records, embeddings, queries
+
+
+def exact_neighbours(records, embeddings, queries, k):
+    """Distance of each query's exact ``k``-th nearest rule in its category (squared L2, as Chroma reports).
+
+    Recall counts an approximate hit as correct when it is no farther than
+    this, so ties between identical rules do not count as misses.
+    """
+    import numpy as np
+
+    by_category = {}
+    for index, record in enumerate(records):
+        by_category.setdefault(record["metadata"]["category"], []).append(index)
+    by_category = {category: np.asarray(indices) for category, indices in by_category.items()}
+
+    truth = []
+    for query in queries:
+        indices = by_category[query["category"]]
+        distances = ((embeddings[indices] - np.asarray(query["embedding"], dtype=np.float32)) ** 2).sum(axis=1)
+        truth.append(float(np.sort(distances)[min(k, len(distances)) - 1]))
+    return truth
+
+
+def load_layout(client, layout, records, embeddings, params):
+    """Write the corpus as one filtered collection or as per-category partitions; returns the collection."""
+    from partitioned_index import PartitionedCollection, hnsw_metadata
+
+    if layout == "partitioned":
+        collection = PartitionedCollection(client, "engineering_docs", params=params)
+    else:
+        collection = client.create_collection(name="engineering_docs", metadata=hnsw_metadata(params))
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        batch = records[start:start + INSERT_BATCH_SIZE]
+        collection.upsert(
+            ids=[f"rule-{index}" for index in range(start, start + len(batch))],
+            documents=[record["text"] for record in batch],
+            metadatas=[record["metadata"] for record in batch],
+            embeddings=embeddings[start:start + len(batch)].tolist(),
+        )
+    return collection
+
+
+def measure_queries(collection, queries, truth, k):
+    from tracing import percentile
+
+    latencies_ms = []
+    recalls = []
+    for query, kth_distance in zip(queries, truth):
+        start_time = time.perf_counter()
+        response = collection.query(
+            query_embeddings=[query["embedding"]],
+            n_results=k,
+            where={"category": query["category"]},
+            include=["distances"],
+        )
+        latencies_ms.append((time.perf_counter() - start_time) * 1000)
+        hits = sum(1 for distance in response["distances"][0] if distance <= kth_distance + 1e-4)
+        recalls.append(hits / k)
+    return {
+        "p50_ms": round(percentile(latencies_ms, 0.50), 2),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 2),
+        "recall_at_k": round(sum(recalls) / len(recalls), 4),
+    }
+
+
+def run_partition_benchmarks(sizes, category_count, hnsw_configs, query_count, k):
+    import chromadb
+
+    results = []
+    for size in sizes:
+        print(f"📚 {size} rules over {category_count} categories")
+        records, embeddings, queries = build_corpus(size, category_count, query_count)
+        truth = exact_neighbours(records, embeddings, queries, k)
+        for params in hnsw_configs:
+            for layout in LAYOUTS:
+                path = tempfile.mkdtemp(prefix=f"bench-partitions-{size}-")
+                try:
+                    client = chromadb.PersistentClient(path=path)
+                    start_time = time.perf_counter()
+                    collection = load_layout(client, layout, records, embeddings, params)
+                    ingest_s = time.perf_counter() - start_time
+                    row = {
+                        "corpus_size": size,
+                        "categories": category_count,
+                        "layout": layout,
+                        **params,
+                        "k": k,
+                        "ingest_s": round(ingest_s, 1),
+                        **measure_queries(collection, queries, truth, k),
+                    }
+                finally:
+                    shutil.rmtree(path, ignore_errors=True)
+                results.append(row)
+                print(f"   {layout:<12} M={params['M']} ef_c={params['ef_construction']} ef_s={params['ef_search']}: "
+                      f"recall@{k} {row['recall_at_k']:.3f} | p50 {row['p50_ms']}ms p95 {row['p95_ms']}ms | "
+                      f"ingest {row['ingest_s']}s")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Recall and latency of one category-filtered collection vs per-category partitions."
+    )
+    parser.add_argument("--sizes", type=_int_list, default=[10000, 100000, 1000000])
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--hnsw", type=_hnsw_list, default=[{"M": 16, "ef_construction": 100, "ef_search": 64}],
+                        help="Comma-separated M:ef_construction:ef_search configurations.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+
+    os.environ["TRACING_ENABLED"] = "0"
+    add_scripts_to_path()
+    results = run_partition_benchmarks(args.sizes, args.categories, args.hnsw, args.queries, args.k)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"✅ Partition benchmark written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
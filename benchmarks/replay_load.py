@@ -0,0 +1,341 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from common import ROOT_DIR, HashingEmbeddingFunction, add_scripts_to_path, prepare_corpus, stub_environment
+from stub_server import StubConfig, start_stub_server
+
+DEFAULT_WORKLOAD = ROOT_DIR / "benchmarks" / "workloads" / "sample.jsonl"
+DEFAULT_OUTPUT = ROOT_DIR / "benchmarks" / "results" / "replay_load.json"
+WORKFLOWS = ("generate", "langgraph")
+# Upper bucket edges (ms) of the latency histograms; the last bucket is open-ended.
+HISTOGRAM_EDGES_MS = [25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+TEXT_FIELDS = ("requirement", "query", "input", "title", "body")
+
+
+def _arrival_s(row):
+    """Arrival time of a workload row in seconds, or None when it has none.
+
+    ``at`` is an offset in seconds from the start of the workload;
+    ``timestamp`` is epoch seconds or an ISO 8601 string.
+    """
+    if row.get("at") is not None:
+        return float(row["at"])
+    timestamp = row.get("timestamp")
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).timestamp()
+
+
+def load_workload(path, default_workflow="generate"):
+    """Read a JSONL workload into ``{"text", "workflow", "arrival_s"}`` requests.
+
+    The text is the first of ``requirement``, ``query``, ``input``, ``title``
+    or ``body`` present, so scenario files and request logs replay as-is.
+    ``workflow`` comes from the row or ``default_workflow`` (``mixed``
+    alternates generate and langgraph). Arrival times are made relative to
+    the first request; they are all None if any row lacks one.
+    """
+    requests = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            text = next((row[field] for field in TEXT_FIELDS if row.get(field)), None)
+            if text is None:
+                raise ValueError(f"Workload row has none of {', '.join(TEXT_FIELDS)}: {line.strip()[:80]}")
+            workflow = row.get("workflow") or default_workflow
+            if workflow == "mixed":
+                workflow = WORKFLOWS[len(requests) % len(WORKFLOWS)]
+            if workflow not in WORKFLOWS:
+                raise ValueError(f"Unknown workflow {workflow!r}; expected one of {', '.join(WORKFLOWS)}")
+            requests.append({"text": text, "workflow": workflow, "arrival_s": _arrival_s(row)})
+
+    arrivals = [request["arrival_s"] for request in requests]
+    if None in arrivals:
+        for request in requests:
+            request["arrival_s"] = None
+    elif arrivals:
+        first = min(arrivals)
+        for request in requests:
+            request["arrival_s"] -= first
+    return requests
+
+
+def schedule(requests, total=None, rps=None, speed=1.0, poisson=False, seed=0):
+    """Cycle the workload up to ``total`` requests and fix each one's arrival offset.
+
+    With ``rps`` the arrivals are evenly spaced (or exponentially spaced when
+    ``poisson``) at that rate; otherwise the recorded arrivals are replayed,
+    compressed by ``speed``. Cycled passes are appended after the previous
+    pass, keeping its inter-arrival gaps.
+    """
+    total = total or len(requests)
+    rng = random.Random(seed)
+    span_s = max((request["arrival_s"] or 0.0) for request in requests)
+    gap_s = span_s / (len(requests) - 1) if len(requests) > 1 else 0.0
+    scheduled = []
+    next_arrival = 0.0
+    for index in range(total):
+        request = dict(requests[index % len(requests)], index=index)
+        if rps:
+            request["arrival_s"] = next_arrival
+            next_arrival += rng.expovariate(rps) if poisson else 1.0 / rps
+        elif request["arrival_s"] is not None:
+            passes = index // len(requests)
+            request["arrival_s"] = (request["arrival_s"] + passes * (span_s + gap_s)) / speed
+        scheduled.append(request)
+    return scheduled
+
+
+class LoadRunner:
+    """Replays scheduled requests against the workflow functions and records each outcome.
+
+    Open loop submits every request at its arrival time whether or not
+    earlier ones have finished, so latency (measured from the scheduled
+    arrival) includes any queueing behind the ``concurrency`` workers.
+    Closed loop keeps exactly ``concurrency`` requests in flight and ignores
+    arrival times, which measures peak sustainable throughput instead.
+    """
+
+    def __init__(self, handlers, concurrency):
+        self.handlers = handlers
+        self.concurrency = max(1, concurrency)
+        self.records = []
+        self._lock = threading.Lock()
+
+    def _execute(self, request, scheduled_at):
+        from tracing import trace
+
+        started_at = time.perf_counter()
+        error = None
+        try:
+            # One trace per request, so its spans can be told apart afterwards.
+            with trace(f"load-{request['index']}"):
+                self.handlers[request["workflow"]](request["text"])
+        except Exception as error_:
+            error = f"{type(error_).__name__}: {error_}"
+        finished_at = time.perf_counter()
+        with self._lock:
+            self.records.append({
+                "index": request["index"],
+                "workflow": request["workflow"],
+                "latency_ms": (finished_at - scheduled_at) * 1000,
+                "service_ms": (finished_at - started_at) * 1000,
+                "finished_at": finished_at,
+                "error": error,
+            })
+
+    def run_open(self, requests):
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load") as executor:
+            for request in sorted(requests, key=lambda request: request["arrival_s"]):
+                scheduled_at = start_time + request["arrival_s"]
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._execute, request, scheduled_at)
+        return start_time
+
+    def run_closed(self, requests):
+        pending = iter(requests)
+        pending_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with pending_lock:
+                    request = next(pending, None)
+                if request is None:
+                    return
+                self._execute(request, time.perf_counter())
+
+        start_time = time.perf_counter()
+        threads = [threading.Thread(target=worker, name=f"load-{index}") for index in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return start_time
+
+
+def histogram(latencies_ms):
+    """``{"<=25ms": n, ..., ">60000ms": n}`` counts over ``HISTOGRAM_EDGES_MS``."""
+    counts = {f"<={edge}ms": 0 for edge in HISTOGRAM_EDGES_MS}
+    counts[f">{HISTOGRAM_EDGES_MS[-1]}ms"] = 0
+    for latency in latencies_ms:
+        edge = next((edge for edge in HISTOGRAM_EDGES_MS if latency <= edge), None)
+        counts[f"<={edge}ms" if edge is not None else f">{HISTOGRAM_EDGES_MS[-1]}ms"] += 1
+    return counts
+
+
+def latency_summary(latencies_ms, errors, wall_s=None):
+    from tracing import percentile
+
+    summary = {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "error_rate": round(errors / len(latencies_ms), 4) if latencies_ms else None,
+    }
+    if wall_s is not None:
+        summary["throughput_rps"] = round(len(latencies_ms) / wall_s, 3) if wall_s else None
+    for name, fraction in (("p50_ms", 0.50), ("p90_ms", 0.90), ("p99_ms", 0.99)):
+        value = percentile(latencies_ms, fraction)
+        summary[name] = round(value, 1) if value is not None else None
+    summary["histogram"] = histogram(latencies_ms)
+    return summary
+
+
+def build_report(records, spans, start_time):
+    """End-to-end results per workflow plus per-stage latency from the recorded spans."""
+    wall_s = max((record["finished_at"] for record in records), default=start_time) - start_time
+    workflows = {}
+    for workflow in sorted({record["workflow"] for record in records}):
+        rows = [record for record in records if record["workflow"] == workflow]
+        workflows[workflow] = {
+            **latency_summary(
+                [row["latency_ms"] for row in rows], sum(1 for row in rows if row["error"]), wall_s
+            ),
+            "service_p50_ms": latency_summary([row["service_ms"] for row in rows], 0)["p50_ms"],
+        }
+
+    stages = {}
+    for record in spans:
+        if str(record.get("trace_id", "")).startswith("load-"):
+            stages.setdefault(record["stage"], []).append(record)
+    return {
+        "wall_s": round(wall_s, 3),
+        "overall": latency_summary(
+            [record["latency_ms"] for record in records], sum(1 for record in records if record["error"]), wall_s
+        ),
+        "workflows": workflows,
+        "stages": {
+            stage: latency_summary(
+                [record["duration_ms"] for record in stage_records],
+                sum(1 for record in stage_records if record.get("error")),
+            )
+            for stage, stage_records in sorted(stages.items())
+        },
+        "sample_errors": sorted({record["error"] for record in records if record["error"]})[:5],
+    }
+
+
+def _print_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'name':<28}{'n':>6}{'err%':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for name, summary in rows.items():
+        error_rate = (summary["error_rate"] or 0) * 100
+        print(
+            f"  {name:<28}{summary['requests']:>6}{error_rate:>7.1f}"
+            f"{summary['p50_ms'] or 0:>10.1f}{summary['p90_ms'] or 0:>10.1f}{summary['p99_ms'] or 0:>10.1f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay a JSONL workload against the workflows and report latency.")
+    parser.add_argument("--workload", default=str(DEFAULT_WORKLOAD),
+                        help="JSONL with one request per line (requirement/query/input/title/body, "
+                             "optional workflow and at/timestamp).")
+    parser.add_argument("--workflow", default="generate", choices=[*WORKFLOWS, "mixed"],
+                        help="Workflow for rows that do not name one.")
+    parser.add_argument("--mode", default="open", choices=["open", "closed"])
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers (closed loop: requests in flight).")
+    parser.add_argument("--rps", type=float, help="Open loop: target arrival rate instead of recorded timestamps.")
+    parser.add_argument("--poisson", action="store_true", help="With --rps: exponential inter-arrival times.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay recorded timestamps this many times faster.")
+    parser.add_argument("--requests", type=int, help="Total requests; the workload is cycled as needed.")
+    parser.add_argument("--target", default="stub", choices=["stub", "live"],
+                        help="stub: local OpenAI stub and a synthetic corpus; live: the configured API and store.")
+    parser.add_argument("--corpus-size", type=int, default=1000, help="Synthetic rules ingested for --target stub.")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+
+    requests = load_workload(args.workload, args.workflow)
+    if not requests:
+        parser.error(f"{args.workload} has no requests")
+    if args.mode == "open" and not args.rps and requests[0]["arrival_s"] is None:
+        parser.error("open loop needs --rps or arrival times (at/timestamp) on every workload row")
+    scheduled = schedule(requests, args.requests, args.rps if args.mode == "open" else None, args.speed,
+                         args.poisson)
+
+    server = stub_config = None
+    if args.target == "stub":
+        stub_config = StubConfig(args.latency_ms, args.tokens_per_sec, args.completion_tokens)
+        server, base_url = start_stub_server(stub_config)
+        os.environ.update(stub_environment(base_url))
+    # Spans go to a scratch file so per-stage latency covers only this run.
+    trace_path = os.path.join(tempfile.mkdtemp(prefix="load-test-"), "traces.jsonl")
+    os.environ.update({"TRACING_ENABLED": "1", "TRACE_PATH": trace_path})
+    add_scripts_to_path()
+
+    from resources import load_script_module
+    from tracing import read_spans
+
+    try:
+        if args.target == "stub":
+            prepare_corpus(args.corpus_size, HashingEmbeddingFunction())
+        with contextlib.redirect_stdout(io.StringIO()):
+            workflow = load_script_module("3_workflow.py", "workflow_module")
+            langgraph_flow = load_script_module("6_langgraph_flow.py", "langgraph_flow_module")
+        runner = LoadRunner(
+            {"generate": workflow.run_integrated_workflow, "langgraph": langgraph_flow.run_langgraph_workflow},
+            args.concurrency,
+        )
+        print(f"🚦 Replaying {len(scheduled)} requests ({args.mode} loop, concurrency {args.concurrency}, "
+              f"target {args.target})...")
+        with contextlib.redirect_stdout(io.StringIO()):
+            if args.mode == "open":
+                start_time = runner.run_open(scheduled)
+            else:
+                start_time = runner.run_closed(scheduled)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    results = build_report(runner.records, read_spans(trace_path), start_time)
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "workload": str(args.workload),
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "rps": args.rps,
+        "target": args.target,
+        "stub": {
+            "latency_ms": args.latency_ms,
+            "tokens_per_sec": args.tokens_per_sec,
+            "completion_tokens": args.completion_tokens,
+            "requests_served": stub_config.requests,
+        } if stub_config else None,
+        **results,
+    }
+
+    overall = results["overall"]
+    print(f"✅ {overall['requests']} requests in {results['wall_s']}s | "
+          f"{overall['throughput_rps']} req/s | error rate {(overall['error_rate'] or 0) * 100:.1f}%")
+    _print_table("Per workflow (latency from scheduled arrival)", results["workflows"])
+    _print_table("Per stage", results["stages"])
+    for error in results["sample_errors"]:
+        print(f"⚠️ {error}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"\n📄 Load-test report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
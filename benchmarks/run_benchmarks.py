@@ -0,0 +1,169 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from common import ROOT_DIR, HashingEmbeddingFunction, add_scripts_to_path, prepare_corpus, stub_environment
+from stub_server import StubConfig, start_stub_server
+
+DEFAULT_OUTPUT = ROOT_DIR / "benchmarks" / "results" / "latest.json"
+
+BENCHMARK_QUERIES = [
+    "How should I test SHA-256 encryption?",
+    "What is the requirement for API response timeout?",
+    "How do we handle MFA login verification?",
+    "Which status code should the API return when rate limited?",
+    "Verify admin session expiry.",
+    "Check the JSON schema of the search endpoint.",
+]
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _summarize(name, latencies_s, wall_s, **extra):
+    from tracing import percentile
+
+    latencies_ms = [seconds * 1000 for seconds in latencies_s]
+    return {
+        "workflow": name,
+        **extra,
+        "requests": len(latencies_ms),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(latencies_ms) / wall_s, 3) if wall_s else None,
+        "p50_ms": round(percentile(latencies_ms, 0.50), 1),
+        "p95_ms": round(percentile(latencies_ms, 0.95), 1),
+    }
+
+
+def _time_sequential(function, queries):
+    latencies = []
+    start_time = time.perf_counter()
+    for query in queries:
+        call_start = time.perf_counter()
+        function(query)
+        latencies.append(time.perf_counter() - call_start)
+    return latencies, time.perf_counter() - start_time
+
+
+def run_benchmarks(corpus_sizes, concurrency_levels, requests_per_workflow):
+    from resources import load_script_module
+
+    embedding_function = HashingEmbeddingFunction()
+    queries = [BENCHMARK_QUERIES[index % len(BENCHMARK_QUERIES)] for index in range(requests_per_workflow)]
+    results = []
+
+    for corpus_size in corpus_sizes:
+        print(f"📚 Corpus size {corpus_size}")
+        ingest_stats = prepare_corpus(corpus_size, embedding_function)
+        results.append({
+            "workflow": "ingest",
+            "corpus_size": corpus_size,
+            "requests": ingest_stats["seen"],
+            "wall_s": round(ingest_stats["seconds"], 3),
+            "throughput_rps": round(ingest_stats["docs_per_sec"], 1),
+        })
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            workflow = load_script_module("3_workflow.py", "workflow_module")
+            multi_agent = load_script_module("5_multi_agent.py", "multi_agent_module")
+            langgraph_flow = load_script_module("6_langgraph_flow.py", "langgraph_flow_module")
+            test_suite = load_script_module("test_suite.py", "test_suite_module")
+
+        sequential = {
+            "run_integrated_workflow": workflow.run_integrated_workflow,
+            "run_multi_agent_workflow": multi_agent.run_multi_agent_workflow,
+            "run_multi_agent_workflow[speculative]": functools.partial(
+                multi_agent.run_multi_agent_workflow, speculative=True
+            ),
+            "run_langgraph_workflow": langgraph_flow.run_langgraph_workflow,
+        }
+        for name, function in sequential.items():
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies, wall_s = _time_sequential(function, queries)
+            results.append(_summarize(name, latencies, wall_s, corpus_size=corpus_size, concurrency=1))
+            print(f"   {name}: {results[-1]['p50_ms']}ms p50")
+
+        scenarios = [{"input": query} for query in queries]
+        for concurrency in concurrency_levels:
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                batch = test_suite.run_batch_test(scenarios, concurrency=concurrency, evaluate=False)
+            wall_s = time.perf_counter() - start_time
+            results.append(_summarize(
+                "run_batch_test",
+                [row["latency_s"] for row in batch],
+                wall_s,
+                corpus_size=corpus_size,
+                concurrency=concurrency,
+                errors=sum(1 for row in batch if row["error"]),
+            ))
+            print(f"   run_batch_test x{concurrency}: {results[-1]['throughput_rps']} req/s, "
+                  f"{results[-1]['errors']} errors")
+            if results[-1]["errors"] == len(batch):
+                # Timing a batch in which every scenario failed would only measure the failure path.
+                raise RuntimeError(f"Every run_batch_test scenario failed, e.g.: {batch[0]['error']}")
+
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline throughput benchmarks against a local OpenAI stub.")
+    parser.add_argument("--corpus-sizes", type=_int_list, default=[100, 1000, 10000])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=24, help="Requests per workflow and corpus size.")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT))
+    args = parser.parse_args()
+
+    stub_config = StubConfig(args.latency_ms, args.tokens_per_sec, args.completion_tokens)
+    server, base_url = start_stub_server(stub_config)
+
+    # Must be set before the scripts are imported: they read these at import time.
+    os.environ.update(stub_environment(base_url))
+    add_scripts_to_path()
+
+    try:
+        results = run_benchmarks(args.corpus_sizes, args.concurrency, args.requests)
+    finally:
+        server.shutdown()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "stub": {
+            "latency_ms": args.latency_ms,
+            "tokens_per_sec": args.tokens_per_sec,
+            "completion_tokens": args.completion_tokens,
+            "requests_served": stub_config.requests,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"✅ Benchmark report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+# Local stand-in for the OpenAI chat-completions API.
+#
+# Replies are deterministic and free; latency is simulated as a fixed
+# time-to-first-token plus completion_tokens / tokens_per_sec. Only the
+# endpoints this project calls are implemented: GET /v1/models and
+# POST /v1/chat/completions (plain and stream=True).
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubConfig:
+    def __init__(self, latency_ms=50.0, tokens_per_sec=500.0, completion_tokens=200, approve_rate=0.5):
+        self.latency_ms = latency_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.approve_rate = approve_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def _stable_fraction(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+def _reply_for(prompt, config):
+    """Pick a plausible reply for each prompt shape used by the scripts."""
+    lowered = prompt.lower()
+    security_terms = ("mfa", "encrypt", "sha", "password", "access", "auth")
+    if "categor" in lowered and "queries:" in lowered:
+        # Batched routing: one numbered query per line, answered as a JSON array.
+        queries = re.findall(r"^\s*\d+\.\s+(.+)$", lowered.split("queries:", 1)[1], re.MULTILINE)
+        categories = [
+            "security" if any(term in query for term in security_terms) else "technical" for query in queries
+        ]
+        return json.dumps({"categories": categories})
+    if "categor" in lowered:
+        return "security" if any(term in lowered for term in security_terms) else "technical"
+    filler = " ".join(f"step{i}" for i in range(config.completion_tokens))
+    # Every auditor prompt (first review, delta re-review, multi-agent audit) asks for 'APPROVED'.
+    if "approved" in lowered:
+        if _stable_fraction(prompt) < config.approve_rate:
+            return f"APPROVED {filler}"
+        return f"FEEDBACK: add negative and boundary cases. {filler}"
+    return f"Test plan: {filler}"
+
+
+def _count_tokens(text):
+    return max(1, len(text.split()))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config = StubConfig()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json({"object": "list", "data": [{"id": "gpt-4o", "object": "model", "created": 0, "owned_by": "stub"}]})
+        else:
+            self._send_json({"error": {"message": "not found"}}, status=404)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json({"error": {"message": "not found"}}, status=404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+        with config.lock:
+            config.requests += 1
+            request_number = config.requests
+
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        reply = _reply_for(prompt, config)
+        prompt_tokens = _count_tokens(prompt)
+        completion_tokens = _count_tokens(reply)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        base = {
+            "id": f"chatcmpl-stub-{request_number}",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+        }
+
+        time.sleep(config.latency_ms / 1000)
+        if request.get("stream"):
+            self._stream(base, reply, usage, config)
+            return
+
+        time.sleep(completion_tokens / config.tokens_per_sec)
+        self._send_json({
+            **base,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, base, reply, usage, config):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        words = reply.split(" ")
+        for index, word in enumerate(words):
+            delta = word if index == 0 else f" {word}"
+            send(json.dumps({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }))
+            time.sleep(1 / config.tokens_per_sec)
+        send(json.dumps({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    """Start the stub on a background thread; returns ``(server, base_url)``."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible chat-completions stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Simulated time to first token.")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--approve-rate", type=float, default=0.5, help="Share of audits that reply APPROVED.")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.tokens_per_sec, args.completion_tokens, args.approve_rate)
+    server, base_url = start_stub_server(config, args.host, args.port)
+    print(f"🧪 Stub OpenAI API listening on {base_url} (set OPENAI_BASE_URL to use it)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,6 +6,20 @@ from dotenv import load_dotenv
 from openai import AuthenticationError, OpenAI
 
 
+def check_openai_auth(client):
+    """Return ``(ok, message)`` for a ``models.list()`` round trip with ``client``."""
+    try:
+        client.models.list()
+        return True, "OpenAI auth check passed"
+    except AuthenticationError:
+        return False, (
+            "OpenAI authentication failed (401). Your OPENAI_API_KEY appears invalid, revoked, "
+            "or from a different project. Generate a fresh key in OpenAI, update .env, then restart."
+        )
+    except Exception as error:
+        return False, f"OpenAI health check failed: {error}"
+
+
 def main() -> int:
     root_dir = Path(__file__).resolve().parent.parent
     load_dotenv(root_dir / ".env")
@@ -15,18 +29,10 @@ def main() -> int:
         print("❌ Missing OPENAI_API_KEY in .env")
         return 1
 
-    client = OpenAI(api_key=api_key)
-    try:
-        client.models.list()
-        print("✅ OpenAI auth check passed")
-        return 0
-    except AuthenticationError:
-        print("❌ OpenAI auth failed (401): invalid/revoked key or wrong project")
-        return 1
-    except Exception as error:
-        print(f"❌ OpenAI health check failed: {error}")
-        return 1
+    ok, message = check_openai_auth(OpenAI(api_key=api_key))
+    print(f"{'✅' if ok else '❌'} {message}")
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
\ No newline at end of file
+    raise SystemExit(main())
@@ -1,33 +1,96 @@
-import chromadb
-import uuid
+import argparse
 
-# Initialize DB in the 'data' folder
-client = chromadb.PersistentClient(path="./data/chroma_db")
-collection = client.get_or_create_collection(name="engineering_docs")
+from ingestion import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CHUNK_CHARS,
+    DEFAULT_OVERLAP_SENTENCES,
+    ingest_records,
+    iter_requirement_files,
+)
+from resources import (
+    get_collection,
+    get_embedding_function,
+    get_lexical_index,
+    get_semantic_cache,
+)
 
 # Requirement Data with Metadata for Workflow Routing
 raw_data = [
     {
-        "text": "Rule: All admin accounts must use Multi-Factor Authentication (MFA).", 
+        "id": "admin-mfa",
+        "text": "Rule: All admin accounts must use Multi-Factor Authentication (MFA).",
         "metadata": {"category": "security", "priority": "high"}
     },
     {
-        "text": "Rule: API response time for login must be under 200ms.", 
+        "id": "login-latency",
+        "text": "Rule: API response time for login must be under 200ms.",
         "metadata": {"category": "technical", "priority": "medium"}
     },
     {
-        "text": "Rule: Passwords must be encrypted using SHA-256.", 
+        "id": "password-hashing",
+        "text": "Rule: Passwords must be encrypted using SHA-256.",
         "metadata": {"category": "security", "priority": "high"}
     }
 ]
 
-print("📥 Starting professional ingestion...")
 
-for item in raw_data:
-    collection.add(
-        documents=[item["text"]],
-        metadatas=[item["metadata"]],
-        ids=[str(uuid.uuid4())]
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ingest requirement rules into ChromaDB.")
+    parser.add_argument(
+        "--source-dir",
+        help="Directory of requirement files (*.jsonl records, one-rule-per-line *.txt, or long *.md "
+             "specifications that are chunked). Defaults to the built-in sample rules.",
     )
+    parser.add_argument("--namespace",
+                        help="Identity of --source-dir's rules (default: its absolute path). Reuse it to keep ids "
+                             "stable when the directory moves.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Embedding worker processes (0 embeds in this process).")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS,
+                        help="Target chunk size for *.md specifications.")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP_SENTENCES,
+                        help="Sentences repeated between consecutive chunks.")
+    parser.add_argument("--migrate-legacy-ids", action="store_true",
+                        help="One-off after upgrading: also remove copies of the ingested rules left under the "
+                             "random uuid4 ids of older ingests (scans every id in the collection).")
+    args = parser.parse_args()
 
-print(f"✅ Ingested {len(raw_data)} documents into 'my-ai-journey-' memory.")
\ No newline at end of file
+    # Initialize DB in the 'data' folder; new stores get one HNSW index per category.
+    collection = get_collection(create=True)
+    # The BM25 index mirrors the collection and is updated in the same pass.
+    lexical_index = get_lexical_index(collection)
+    if args.source_dir:
+        records = iter_requirement_files(args.source_dir, args.chunk_chars, args.overlap, args.namespace)
+    else:
+        records = raw_data
+
+    print("📥 Starting professional ingestion...")
+    stats = ingest_records(
+        collection,
+        records,
+        batch_size=args.batch_size,
+        embedding_function=get_embedding_function(),
+        lexical_index=lexical_index,
+        workers=args.workers,
+        migrate_legacy_ids=args.migrate_legacy_ids,
+    )
+    if stats["upserted"] or stats["removed"]:
+        lexical_index.save()
+
+    print(
+        f"✅ Processed {stats['seen']} documents into 'my-ai-journey-' memory: "
+        f"{stats['upserted']} upserted, {stats['skipped']} unchanged, {stats['removed']} outdated removed "
+        f"({stats['docs_per_sec']:.0f} docs/sec, collection size {collection.count()}, "
+        f"BM25 index size {len(lexical_index)})."
+    )
+
+    # Cached test plans built on rules that just changed must not be served again.
+    if stats["changed_categories"]:
+        dropped = get_semantic_cache().invalidate(stats["changed_categories"])
+        print(f"🧹 Invalidated {dropped} cached answers for: {', '.join(stats['changed_categories'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,59 +1,134 @@
-import os
-import chromadb
-from openai import OpenAI
-from dotenv import load_dotenv
+import asyncio
 
-dotenv_path = os.path.join(os.path.dirname(__file__), "..", ".env")
-load_dotenv(dotenv_path=dotenv_path)
+from eval_queue import offer_for_evaluation
+from llm_cache import acached_chat_completion, cached_chat_completion
+from context_packing import CONTEXT_TOP_K
+from resources import get_context_packer, get_openai_client, get_retrieval_service, get_router, get_semantic_cache
+from streaming import stream_chat_completion
+from tracing import span, trace
 
-api_key = (os.getenv("OPENAI_API_KEY") or "").strip().strip('"').strip("'")
-if not api_key:
-    raise RuntimeError(
-        "OPENAI_API_KEY is missing. Set it in .env in the project root."
-    )
+# Clients, the Chroma collection and the router come from the process-wide
+# registry on first use, so importing this module stays cheap and loading it
+# repeatedly never reopens the database.
 
-client = OpenAI(api_key=api_key)
+def retrieve_context(user_query, category):
+    # We only look for documents that match the category identified by the router (metadata filtering).
+    # The top-k candidates are deduplicated and packed into the context token budget.
+    result = get_retrieval_service().retrieve(user_query, category, k=CONTEXT_TOP_K)
+    packed = get_context_packer().pack(result["matches"])
+    return packed["context"], packed["source"]
 
-# Initialize Database Connection
-db_client = chromadb.PersistentClient(path="./data/chroma_db")
-collection = db_client.get_collection(name="engineering_docs")
+def route_and_retrieve(user_queries):
+    """Route and retrieve many queries at once: one embedding batch, one collection.query per category."""
+    results = get_retrieval_service().retrieve_many(user_queries, k=CONTEXT_TOP_K)
+    packed = get_context_packer().pack_many(result["matches"] for result in results)
+    return [
+        {
+            "category": result["category"],
+            "route_path": result["route_path"],
+            "context": context["context"],
+            "source": context["source"],
+            "context_tokens": context["tokens"],
+        }
+        for result, context in zip(results, packed)
+    ]
 
-def run_integrated_workflow(user_query):
+def build_generation_prompt(user_query, context, source):
+    return f"""
+    You are a QA Specialist. Using these rules from {source}:
+    {context}
+    write a detailed test case for: {user_query}
+    """
+
+def run_integrated_workflow(user_query, stream=False, use_semantic_cache=True):
+    with trace():
+        return _run_integrated_workflow(user_query, stream, use_semantic_cache)
+
+def _run_integrated_workflow(user_query, stream, use_semantic_cache):
     # --- STAGE 1: ROUTING ---
-    # Determine the category to filter our database
-    router_prompt = f"Categorize this as 'security' or 'technical': {user_query}. Return only the word."
-    category = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": router_prompt}]
-    ).choices[0].message.content.strip().lower()
-    
-    print(f"🚦 Router categorized this as: {category}")
+    # Determine the category to filter our database (local embeddings, LLM only if ambiguous)
+    # The query embedding is computed once and reused by retrieval.
+    query_embedding = get_retrieval_service().embed_queries([user_query])[0]
+    decision = get_router().route(user_query, query_embedding=query_embedding)
+    category = decision["category"]
+
+    print(f"🚦 Router categorized this as: {category} (via {decision['path']})")
+
+    # A near-identical requirement in the same category was answered before: reuse it.
+    if use_semantic_cache:
+        cached = get_semantic_cache().lookup("generate", user_query, category, query_embedding)
+        if cached is not None:
+            print(f"♻️ Semantic cache hit (similarity {cached['similarity']:.3f}): '{cached['cached_requirement']}'")
+            if stream:
+                print(cached["answer"])
+            return cached["answer"]
 
     # --- STAGE 2: FILTERED RETRIEVAL ---
-    # We only look for documents that match the category identified by the router
-    results = collection.query(
-        query_texts=[user_query],
-        n_results=1,
-        where={"category": category} # This is Metadata Filtering
-    )
-    context = results['documents'][0][0]
-    source = results['metadatas'][0][0]['source'] if 'source' in results['metadatas'][0][0] else "Unknown"
+    context, source = retrieve_context(user_query, category)
 
     # --- STAGE 3: GENERATION ---
-    prompt = f"""
-    You are a QA Specialist. Using the rule from {source}: '{context}', 
-    write a detailed test case for: {user_query}
+    prompt = build_generation_prompt(user_query, context, source)
+
+    if stream:
+        # Print tokens as they arrive for CLI callers; a cached response is printed in one piece.
+        stats = {}
+        chunks = []
+        for delta in stream_chat_completion(
+            get_openai_client(), stats=stats, model="gpt-4o", messages=[{"role": "user", "content": prompt}]
+        ):
+            print(delta, end="", flush=True)
+            chunks.append(delta)
+        print(f"\n⏱️ TTFT {stats.get('ttft_s', 0.0):.2f}s | {stats.get('tokens_per_sec') or 0:.1f} tokens/s")
+        output = "".join(chunks)
+        return _finish(user_query, category, context, output, query_embedding, use_semantic_cache)
+
+    with span("generation") as generation_span:
+        response = cached_chat_completion(
+            get_openai_client(),
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}]
+        )
+        generation_span.record_usage(response)
+
+    output = response.choices[0].message.content
+    return _finish(user_query, category, context, output, query_embedding, use_semantic_cache)
+
+def _finish(user_query, category, context, output, query_embedding, use_semantic_cache):
+    if use_semantic_cache:
+        get_semantic_cache().store("generate", user_query, category, output, query_embedding)
+    # A sampled share of fresh outputs is judged later by the background evaluation workers.
+    offer_for_evaluation("generate", category, user_query, context, output)
+    return output
+
+async def arun_integrated_workflow(user_query, async_client, retrieval=None):
+    """Async variant for batch runners: same stages, but returns the retrieved context too.
+
+    ``async_client`` is an ``AsyncOpenAI`` owned by the caller's event loop.
+    ``retrieval`` may be a precomputed entry from :func:`route_and_retrieve`.
     """
-    
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    
-    return response.choices[0].message.content
-
-# Execute the workflow
-print("🤖 AI Workflow starting...")
-result = run_integrated_workflow("I need to test our encryption standard.")
-print("\n--- FINAL TEST CASE ---")
-print(result)
\ No newline at end of file
+    with trace():
+        if retrieval is None:
+            # Routing and retrieval are CPU/local-IO bound; keep them off the event loop.
+            retrieval = (await asyncio.to_thread(route_and_retrieve, [user_query]))[0]
+        category, context, source = retrieval["category"], retrieval["context"], retrieval["source"]
+
+        with span("generation") as generation_span:
+            response = await acached_chat_completion(
+                async_client,
+                model="gpt-4o",
+                messages=[{"role": "user", "content": build_generation_prompt(user_query, context, source)}]
+            )
+            generation_span.record_usage(response)
+    return {
+        "category": category,
+        "route_path": retrieval["route_path"],
+        "context": context,
+        "source": source,
+        "output": response.choices[0].message.content,
+    }
+
+if __name__ == "__main__":
+    # Execute the workflow
+    print("🤖 AI Workflow starting...")
+    print("\n--- FINAL TEST CASE ---")
+    run_integrated_workflow("I need to test our encryption standard.", stream=True)
@@ -1,20 +1,69 @@
+import contextvars
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-load_dotenv()
-client = OpenAI()
+from eval_queue import offer_for_evaluation
+from llm_cache import cached_chat_completion, is_cache_hit
+from resources import get_embedding_function, get_openai_client, get_router, get_semantic_cache
+from semantic_cache import variant
+from tracing import span, trace
 
-def architect_agent(requirement):
+DEFAULT_SPECULATIVE_DRAFTS = int(os.getenv("MULTI_AGENT_DRAFTS", "3"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("MULTI_AGENT_MAX_CONCURRENCY", "3"))
+DEFAULT_TOKEN_BUDGET = int(os.getenv("MULTI_AGENT_TOKEN_BUDGET", "0"))  # 0 = unlimited
+
+# Each speculative draft gets a different emphasis so the candidates actually differ.
+DRAFT_FOCUSES = [
+    "security edge cases",
+    "performance and load edge cases",
+    "input validation and error handling",
+    "session, state and concurrency edge cases",
+]
+DRAFT_TEMPERATURE = 0.8
+SCORE_PATTERN = re.compile(r"SCORE:\s*(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+class TokenBudget:
+    """Thread-safe running total of tokens spent on uncached completions."""
+
+    def __init__(self, limit=DEFAULT_TOKEN_BUDGET):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def spend(self, response):
+        usage = getattr(response, "usage", None)
+        if usage is None or is_cache_hit(response):
+            return
+        with self._lock:
+            self.used += usage.total_tokens
+
+    def exhausted(self):
+        return bool(self.limit) and self.used >= self.limit
+
+
+def architect_agent(requirement, focus=None, budget=None):
     print("🎨 Architect: Drafting the test plan...")
     prompt = f"Create a detailed QA test plan for this requirement: {requirement}. Focus on edge cases."
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}]
-    )
+    request = {}
+    if focus:
+        prompt += f" Pay particular attention to {focus}."
+        request["temperature"] = DRAFT_TEMPERATURE
+    with span("multi_agent.architect", focus=focus) as agent_span:
+        response = cached_chat_completion(
+            get_openai_client(),
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            **request
+        )
+        agent_span.record_usage(response)
+    if budget is not None:
+        budget.spend(response)
     return response.choices[0].message.content
 
-def auditor_agent(test_plan):
+def auditor_agent(test_plan, scored=False, budget=None):
     print("⚖️ Auditor: Reviewing the plan for gaps...")
     prompt = f"""
     Act as a Senior QA Auditor. Review this test plan:
@@ -24,20 +73,21 @@ def auditor_agent(test_plan):
     If the plan is perfect, say 'APPROVED'. 
     If not, provide 'FEEDBACK' on what to improve.
     """
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}]
-    )
+    if scored:
+        prompt += "End your review with a line 'SCORE: <0-10>' rating the plan's coverage.\n"
+    with span("multi_agent.auditor", scored=scored) as agent_span:
+        response = cached_chat_completion(
+            get_openai_client(),
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}]
+        )
+        agent_span.record_usage(response)
+    if budget is not None:
+        budget.spend(response)
     return response.choices[0].message.content
 
-
-def run_multi_agent_workflow(requirement):
-    draft = architect_agent(requirement)
-    review = auditor_agent(draft)
-
-    refined_draft = None
-    if "APPROVED" not in review.upper():
-        refinement_prompt = f"""
+def refine_agent(draft, review):
+    refinement_prompt = f"""
         Revise the following QA test plan based on this auditor feedback.
 
         Original plan:
@@ -48,11 +98,76 @@ def run_multi_agent_workflow(requirement):
 
         Return only the improved test plan.
         """
-        response = client.chat.completions.create(
+    with span("multi_agent.refine") as agent_span:
+        response = cached_chat_completion(
+            get_openai_client(),
             model="gpt-4o",
             messages=[{"role": "user", "content": refinement_prompt}]
         )
-        refined_draft = response.choices[0].message.content
+        agent_span.record_usage(response)
+    return response.choices[0].message.content
+
+
+def review_score(review):
+    """Auditor score out of 10; an unscored APPROVED counts as 10, anything else unscored as 0."""
+    match = SCORE_PATTERN.search(review)
+    if match:
+        return float(match.group(1))
+    return 10.0 if "APPROVED" in review.upper() else 0.0
+
+
+def run_multi_agent_workflow(requirement, use_semantic_cache=True, speculative=False,
+                             drafts=DEFAULT_SPECULATIVE_DRAFTS, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                             token_budget=DEFAULT_TOKEN_BUDGET, category=None, offer=True, query_embedding=None):
+    """Draft, audit and (if rejected) refine a QA test plan.
+
+    With ``speculative=True``, ``drafts`` plans are drafted and audited in
+    parallel (at most ``max_concurrency`` at a time); the first approved one
+    wins, otherwise only the best-scored draft is refined. Once
+    ``token_budget`` tokens have been spent, drafts that have not started yet
+    are skipped.
+
+    ``category`` is the requirement's routed category when the caller has
+    it; otherwise the requirement is routed once, and only if the semantic
+    cache or evaluation sampling (``offer``) needs it. The requirement is
+    embedded at most once (or not at all when ``query_embedding`` is given)
+    for both routing and the cache lookup. Cached plans are kept apart per
+    ``speculative`` / ``drafts`` setting.
+    """
+    def compute():
+        if speculative:
+            result = _run_speculative_workflow(requirement, drafts, max_concurrency, token_budget)
+        else:
+            result = _run_multi_agent_workflow(requirement)
+        if offer:
+            # The requirement is the only context the agents saw.
+            offer_for_evaluation("multi_agent", category, requirement, requirement,
+                                 result["refined_plan"] or result["initial_plan"])
+        return result
+
+    with trace():
+        needs_category = category is None and (use_semantic_cache or offer)
+        if query_embedding is None and (use_semantic_cache or needs_category):
+            query_embedding = get_embedding_function()([requirement])[0]
+        if needs_category:
+            category = get_router().route(requirement, query_embedding=query_embedding)["category"]
+        if not use_semantic_cache:
+            return compute()
+        # Paraphrases of an already-reviewed requirement reuse its plan and skip every agent call.
+        cache_key = variant("multi_agent", speculative=speculative, **({"drafts": drafts} if speculative else {}))
+        result, hit = get_semantic_cache().get_or_compute(
+            cache_key, requirement, category, compute, query_embedding=query_embedding
+        )
+        return {**result, "requirement": requirement, "semantic_cache_hit": hit}
+
+
+def _run_multi_agent_workflow(requirement):
+    draft = architect_agent(requirement)
+    review = auditor_agent(draft)
+
+    refined_draft = None
+    if "APPROVED" not in review.upper():
+        refined_draft = refine_agent(draft, review)
 
     return {
         "requirement": requirement,
@@ -62,6 +177,79 @@ def run_multi_agent_workflow(requirement):
         "approved": "APPROVED" in review.upper()
     }
 
+
+def _draft_and_audit(requirement, index, budget, done):
+    # Checked before each call: a running draft stops once the budget is spent
+    # or another draft was approved. A request already sent cannot be
+    # recalled, so the budget can be overshot by at most one completion per
+    # running draft.
+    if budget.exhausted() or done.is_set():
+        return None
+    draft = architect_agent(requirement, focus=DRAFT_FOCUSES[index % len(DRAFT_FOCUSES)], budget=budget)
+    if budget.exhausted() or done.is_set():
+        return None
+    review = auditor_agent(draft, scored=True, budget=budget)
+    return {
+        "index": index,
+        "plan": draft,
+        "review": review,
+        "score": review_score(review),
+        "approved": "APPROVED" in review.upper(),
+    }
+
+
+def _run_speculative_workflow(requirement, drafts, max_concurrency, token_budget):
+    budget = TokenBudget(token_budget)
+    done = threading.Event()
+    candidates = []
+    errors = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(drafts, max_concurrency)))
+    try:
+        # copy_context keeps every draft's spans under the caller's trace id.
+        futures = {
+            executor.submit(contextvars.copy_context().run, _draft_and_audit, requirement, index, budget, done): index
+            for index in range(drafts)
+        }
+        for future in as_completed(futures):
+            try:
+                candidate = future.result()
+            except Exception as error:
+                # One failed draft must not sink the others.
+                print(f"⚠️ Draft {futures[future]} failed: {error}")
+                errors[futures[future]] = str(error)
+                continue
+            if candidate is None:
+                continue
+            candidates.append(candidate)
+            if candidate["approved"]:
+                break
+    finally:
+        # Queued drafts are dropped; running ones stop before their next call.
+        done.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if not candidates:
+        raise RuntimeError(f"All {drafts} speculative drafts failed or were skipped: {errors or 'token budget spent'}")
+    best = max(candidates, key=lambda candidate: (candidate["approved"], candidate["score"]))
+    refined_draft = None if best["approved"] else refine_agent(best["plan"], best["review"])
+
+    return {
+        "requirement": requirement,
+        "initial_plan": best["plan"],
+        "auditor_review": best["review"],
+        "refined_plan": refined_draft,
+        "approved": best["approved"],
+        "speculative": {
+            "drafts_requested": drafts,
+            "drafts_completed": len(candidates),
+            "draft_errors": errors,
+            "chosen_draft": best["index"],
+            "scores": {candidate["index"]: candidate["score"] for candidate in candidates},
+            "tokens_used": budget.used,
+            "token_budget": token_budget or None,
+        },
+    }
+
 if __name__ == "__main__":
     requirement = "A login system that requires MFA and SHA-256 password hashing."
     result = run_multi_agent_workflow(requirement)
@@ -73,4 +261,4 @@ if __name__ == "__main__":
 
     if result["refined_plan"]:
         print("\n--- REFINED PLAN ---")
-        print(result["refined_plan"])
\ No newline at end of file
+        print(result["refined_plan"])
@@ -1,10 +1,32 @@
+import os
+import re
+import time
+import uuid
 from typing import TypedDict
-from langgraph.graph import StateGraph, END
-from openai import OpenAI
-from dotenv import load_dotenv
 
-load_dotenv()
-client = OpenAI()
+from eval_queue import offer_for_evaluation
+from llm_cache import cached_chat_completion, is_cache_hit
+from resources import (
+    get_embedding_function,
+    get_langgraph_checkpointer,
+    get_openai_client,
+    get_router,
+    get_semantic_cache,
+    registry,
+)
+from semantic_cache import variant
+from tracing import span, trace
+
+MAX_REVISIONS = 3
+DEFAULT_REVISION_MODE = os.getenv("LANGGRAPH_REVISION_MODE", "delta")  # "delta" or "full"
+DEFAULT_TOKEN_BUDGET = int(os.getenv("LANGGRAPH_TOKEN_BUDGET", "0"))  # 0 = unlimited
+DEFAULT_TIME_BUDGET_S = float(os.getenv("LANGGRAPH_TIME_BUDGET_S", "0"))  # 0 = unlimited
+
+# Node whose output is checkpointed just before each node runs; a resume records its update as that node.
+PREVIOUS_NODE = {"auditor": "architect", "architect": "auditor"}
+
+SECTION_HEADING = re.compile(r"^##\s+(.+?)\s*$", re.MULTILINE)
+REMOVED_MARKER = "(REMOVED)"
 
 # 1. Define the Shared Memory (State)
 class AgentState(TypedDict):
@@ -13,61 +35,344 @@ class AgentState(TypedDict):
     feedback: str
     revision_count: int
     auditor_decision: str
+    revision_mode: str
+    changed_sections: str
+    token_budget: int
+    time_budget_s: float
+    started_at: float
+    tokens_used: int
+    iteration_tokens: list
+    stop_reason: str
+    category: str
+
+
+def split_sections(plan):
+    """``{"## heading": body}`` in order; text before the first heading is kept under ``""``."""
+    sections = {}
+    matches = list(SECTION_HEADING.finditer(plan))
+    preamble = plan[:matches[0].start()] if matches else plan
+    if preamble.strip():
+        sections[""] = preamble.strip()
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(plan)
+        sections[match.group(1)] = plan[match.end():end].strip()
+    return sections
+
+
+def join_sections(sections):
+    return "\n\n".join(body if heading == "" else f"## {heading}\n{body}" for heading, body in sections.items())
+
+
+def is_section_patch(patch):
+    return SECTION_HEADING.search(patch) is not None
+
+
+def apply_plan_patch(plan, patch):
+    """Replace, add or drop (body ``(REMOVED)``) the ``## `` sections named in ``patch``.
+
+    A patch without any ``## `` heading cannot be matched to sections, so it
+    is taken as a complete replacement plan rather than silently dropped.
+    """
+    if not is_section_patch(patch):
+        return patch.strip()
+    sections = split_sections(plan)
+    for heading, body in split_sections(patch).items():
+        if heading == "":
+            continue
+        if body.strip() == REMOVED_MARKER:
+            sections.pop(heading, None)
+        else:
+            sections[heading] = body
+    return join_sections(sections)
+
+
+def _tokens(completion):
+    # Cache hits are free, so they do not count against the budget.
+    usage = getattr(completion, "usage", None)
+    return 0 if usage is None or is_cache_hit(completion) else usage.total_tokens
+
+
+def _delta_revision(state):
+    return state.get("revision_mode") == "delta" and state["revision_count"] > 0 and state["test_plan"]
+
 
 # 2. Define the Nodes (The Agents)
 def architect_node(state: AgentState):
     print(f"🎨 Architect (Attempt {state['revision_count'] + 1})")
-    prompt = f"Requirement: {state['requirement']}\nFeedback: {state['feedback']}\nCreate a test plan."
-    response = client.chat.completions.create(
-        model="gpt-4o", messages=[{"role": "user", "content": prompt}]
-    ).choices[0].message.content
-    return {"test_plan": response, "revision_count": state['revision_count'] + 1}
+    delta = _delta_revision(state)
+    if delta:
+        # Only the sections that change are generated; the rest of the plan is reused as-is.
+        prompt = (
+            f"Requirement: {state['requirement']}\nCurrent test plan:\n{state['test_plan']}\n"
+            f"Feedback: {state['feedback']}\n"
+            "Revise the plan to address the feedback. Output ONLY the sections you change or add, "
+            "each starting with its '## ' heading exactly as in the plan. "
+            f"To delete a section, output its heading followed by {REMOVED_MARKER}."
+        )
+    else:
+        prompt = f"Requirement: {state['requirement']}\nFeedback: {state['feedback']}\nCreate a test plan."
+        if state.get("revision_mode") == "delta":
+            prompt += " Format it as markdown sections, each starting with a '## ' heading."
+    with span("langgraph.architect_node", revision=state['revision_count'] + 1, delta=bool(delta)) as node_span:
+        completion = cached_chat_completion(
+            get_openai_client(), model="gpt-4o", messages=[{"role": "user", "content": prompt}]
+        )
+        node_span.record_usage(completion)
+    response = completion.choices[0].message.content
+    tokens = _tokens(completion)
+    # A reply with no section headings replaced the whole plan, so the auditor reviews all of it.
+    patched = delta and is_section_patch(response)
+    return {
+        "test_plan": apply_plan_patch(state["test_plan"], response) if delta else response,
+        "changed_sections": response if patched else "",
+        "revision_count": state['revision_count'] + 1,
+        "tokens_used": state.get("tokens_used", 0) + tokens,
+        "iteration_tokens": state.get("iteration_tokens", []) + [
+            {"revision": state['revision_count'] + 1, "architect": tokens, "auditor": 0}
+        ],
+    }
 
 def auditor_node(state: AgentState):
     print("⚖️ Auditor Checking...")
-    prompt = f"Review this: {state['test_plan']}. If perfect, say 'APPROVED'. Otherwise, list missing cases."
-    response = client.chat.completions.create(
-        model="gpt-4o", messages=[{"role": "user", "content": prompt}]
-    ).choices[0].message.content
+    if state.get("changed_sections"):
+        prompt = (
+            f"Earlier you reviewed a test plan and asked for: {state['feedback']}\n"
+            f"These are the revised sections:\n{state['changed_sections']}\n"
+            "If they resolve your feedback and the plan is now complete, say 'APPROVED'. "
+            "Otherwise, list missing cases."
+        )
+    else:
+        prompt = f"Review this: {state['test_plan']}. If perfect, say 'APPROVED'. Otherwise, list missing cases."
+    with span("langgraph.auditor_node", revision=state['revision_count'],
+              delta=bool(state.get("changed_sections"))) as node_span:
+        completion = cached_chat_completion(
+            get_openai_client(), model="gpt-4o", messages=[{"role": "user", "content": prompt}]
+        )
+        node_span.record_usage(completion)
+    response = completion.choices[0].message.content
     decision = "approved" if "APPROVED" in response.upper() else "revise"
-    return {"feedback": response, "auditor_decision": decision}
+    tokens = _tokens(completion)
+    iteration_tokens = [dict(entry) for entry in state.get("iteration_tokens", [])]
+    if iteration_tokens:
+        iteration_tokens[-1]["auditor"] += tokens
+    return {
+        "feedback": response,
+        "auditor_decision": decision,
+        "tokens_used": state.get("tokens_used", 0) + tokens,
+        "iteration_tokens": iteration_tokens,
+    }
 
 # 3. Define the Logic Gate (The Router)
+def stop_reason(state: AgentState):
+    """Why the loop should end now, or None to keep revising."""
+    if state.get("auditor_decision") == "approved":
+        return "approved"
+    if state['revision_count'] >= MAX_REVISIONS:
+        return "max_revisions"
+    if state.get("token_budget") and state.get("tokens_used", 0) >= state["token_budget"]:
+        return "token_budget"
+    if state.get("time_budget_s") and time.time() - state.get("started_at", time.time()) >= state["time_budget_s"]:
+        return "time_budget"
+    return None
+
+
 def decide_to_continue(state: AgentState):
-    if state.get("auditor_decision") == "approved" or state['revision_count'] >= 3:
-        return "end"
-    return "revise"
+    return "revise" if stop_reason(state) is None else "end"
 
 # 4. Build the Graph
-workflow = StateGraph(AgentState)
+def build_graph(checkpointer=None):
+    # Imported here so loading this module does not pull in langgraph.
+    from langgraph.graph import StateGraph, END
 
-workflow.add_node("architect", architect_node)
-workflow.add_node("auditor", auditor_node)
+    workflow = StateGraph(AgentState)
 
-workflow.set_entry_point("architect")
-workflow.add_edge("architect", "auditor")
+    workflow.add_node("architect", architect_node)
+    workflow.add_node("auditor", auditor_node)
 
-workflow.add_conditional_edges(
-    "auditor",
-    decide_to_continue,
-    {
-        "revise": "architect",
-        "end": END,
-    }
-)
+    workflow.set_entry_point("architect")
+    workflow.add_edge("architect", "auditor")
 
-app = workflow.compile()
+    workflow.add_conditional_edges(
+        "auditor",
+        decide_to_continue,
+        {
+            "revise": "architect",
+            "end": END,
+        }
+    )
 
+    return workflow.compile(checkpointer=checkpointer)
 
-def run_langgraph_workflow(requirement: str):
-    initial_state: AgentState = {
-        "requirement": requirement,
-        "test_plan": "",
-        "feedback": "",
-        "revision_count": 0,
-        "auditor_decision": "revise",
-    }
-    return app.invoke(initial_state)
+
+def get_graph():
+    # Compiled once per process and kept in the resource registry. State is
+    # checkpointed to SQLite after every node, keyed by run id (thread_id).
+    return registry.get("langgraph_app", lambda: build_graph(get_langgraph_checkpointer()))
+
+
+def _run_config(run_id):
+    return {"configurable": {"thread_id": run_id}}
+
+
+def _finish(final_state, run_id):
+    final_state = dict(final_state)
+    final_state["stop_reason"] = stop_reason(final_state)
+    final_state["run_id"] = run_id
+    return final_state
+
+
+def _invoke(state, run_id, category=None, offer=True):
+    try:
+        result = _finish(get_graph().invoke(state, _run_config(run_id)), run_id)
+    except Exception:
+        print(f"💾 LangGraph run {run_id} failed; completed nodes are checkpointed. "
+              f"Resume with resume_langgraph_run('{run_id}').")
+        raise
+    if offer:
+        offer_for_evaluation("langgraph", category, result["requirement"], result["requirement"], result["test_plan"])
+    return result
+
+
+def run_langgraph_workflow(requirement: str, use_semantic_cache: bool = True,
+                           revision_mode: str = DEFAULT_REVISION_MODE,
+                           token_budget: int = DEFAULT_TOKEN_BUDGET,
+                           time_budget_s: float = DEFAULT_TIME_BUDGET_S,
+                           run_id: str = None,
+                           category: str = None,
+                           offer: bool = True,
+                           query_embedding=None):
+    """Run the Architect -> Auditor loop.
+
+    ``revision_mode="delta"`` has the architect emit only changed sections and
+    the auditor review only those. The loop also ends early once
+    ``token_budget`` tokens or ``time_budget_s`` seconds are spent (0 disables
+    either); the final state reports ``stop_reason``, ``tokens_used`` and the
+    per-revision ``iteration_tokens``.
+
+    State is checkpointed after every node under ``run_id`` (a new id when
+    None, returned as ``result["run_id"]``), so a failed run can be picked up
+    with :func:`resume_langgraph_run` without repeating completed LLM calls.
+
+    ``category`` is the requirement's routed category when the caller has
+    it; otherwise the requirement is routed once, and only if the semantic
+    cache or evaluation sampling needs it. ``offer=False`` keeps the result
+    out of evaluation sampling, e.g. when the caller queues an audit itself.
+    The requirement is embedded at most once (not at all when
+    ``query_embedding`` is given) for routing and the cache lookup, and
+    cached plans are kept apart per ``revision_mode``.
+    """
+    run_id = run_id or uuid.uuid4().hex[:16]
+
+    with trace():
+        needs_category = category is None and (use_semantic_cache or offer)
+        if query_embedding is None and (use_semantic_cache or needs_category):
+            query_embedding = get_embedding_function()([requirement])[0]
+        if needs_category:
+            category = get_router().route(requirement, query_embedding=query_embedding)["category"]
+        initial_state: AgentState = {
+            "requirement": requirement,
+            "test_plan": "",
+            "feedback": "",
+            "revision_count": 0,
+            "auditor_decision": "revise",
+            "revision_mode": revision_mode,
+            "changed_sections": "",
+            "token_budget": token_budget,
+            "time_budget_s": time_budget_s,
+            "started_at": time.time(),
+            "tokens_used": 0,
+            "iteration_tokens": [],
+            "stop_reason": "",
+            # Kept in the checkpoint so a resumed run reuses it instead of routing again.
+            "category": category,
+        }
+        if not use_semantic_cache:
+            return _invoke(initial_state, run_id, category, offer)
+        # Paraphrases of an already-audited requirement skip the whole Architect -> Auditor loop.
+        result, hit = get_semantic_cache().get_or_compute(
+            variant("langgraph", revision_mode=revision_mode),
+            requirement,
+            category,
+            lambda: _invoke(initial_state, run_id, category, offer),
+            query_embedding=query_embedding,
+        )
+        return {**result, "requirement": requirement, "semantic_cache_hit": hit}
+
+
+def resume_langgraph_run(run_id: str, use_semantic_cache: bool = True, offer: bool = True):
+    """Continue a checkpointed run from its last completed node.
+
+    A run that already finished just returns its final state. The wall-clock
+    budget restarts on resume; the token budget keeps counting. The routed
+    category stored with the run is reused (runs checkpointed without one
+    are routed once), and ``offer=False`` keeps the result out of
+    evaluation sampling, as in :func:`run_langgraph_workflow`.
+    """
+    graph = get_graph()
+    config = _run_config(run_id)
+    snapshot = graph.get_state(config)
+    if not snapshot.values:
+        raise KeyError(f"No checkpointed LangGraph run with id {run_id!r}")
+    if not snapshot.next:
+        return _finish(snapshot.values, run_id)
+
+    with trace():
+        print(f"▶️ Resuming LangGraph run {run_id} at: {', '.join(snapshot.next)}")
+        try:
+            if snapshot.metadata.get("step", 0) <= 0:
+                # Died before any node finished: nothing to keep, so start over from the saved input.
+                final_state = graph.invoke({**snapshot.values, "started_at": time.time()}, config)
+            else:
+                graph.update_state(config, {"started_at": time.time()}, as_node=PREVIOUS_NODE[snapshot.next[0]])
+                final_state = graph.invoke(None, config)
+            result = _finish(final_state, run_id)
+        except Exception:
+            print(f"💾 LangGraph run {run_id} failed again; resume it later.")
+            raise
+        requirement = result["requirement"]
+        category = result.get("category")
+        if category is None and (offer or use_semantic_cache):
+            category = get_router().route(requirement)["category"]
+        if offer:
+            offer_for_evaluation("langgraph", category, requirement, requirement, result["test_plan"])
+        if use_semantic_cache:
+            # The namespace run_langgraph_workflow looks up. Checkpoints from
+            # before revision modes existed always reviewed the full plan.
+            namespace = variant("langgraph", revision_mode=result.get("revision_mode", "full"))
+            get_semantic_cache().store(namespace, requirement, category, result)
+        return result
+
+
+def list_langgraph_runs(limit: int = 20):
+    """Most recent checkpointed runs, newest first.
+
+    Each row has ``run_id``, ``requirement``, ``revision_count``,
+    ``auditor_decision``, ``status`` (``completed`` or ``interrupted``),
+    ``next`` (nodes still to run) and ``updated_at``.
+    """
+    graph = get_graph()
+    runs = []
+    seen = set()
+    # Checkpoints come back newest first, so the first one per thread is its latest.
+    for checkpoint in get_langgraph_checkpointer().list(None):
+        run_id = checkpoint.config["configurable"]["thread_id"]
+        if run_id in seen:
+            continue
+        seen.add(run_id)
+        snapshot = graph.get_state(_run_config(run_id))
+        values = snapshot.values or {}
+        runs.append({
+            "run_id": run_id,
+            "requirement": values.get("requirement", ""),
+            "revision_count": values.get("revision_count", 0),
+            "auditor_decision": values.get("auditor_decision", ""),
+            "status": "interrupted" if snapshot.next else "completed",
+            "next": list(snapshot.next),
+            "updated_at": checkpoint.checkpoint.get("ts"),
+        })
+        if len(runs) >= limit:
+            break
+    return runs
 
 
 if __name__ == "__main__":
@@ -79,4 +384,5 @@ if __name__ == "__main__":
     print("\n--- FINAL FEEDBACK ---")
     print(result["feedback"])
     print(f"\n--- REVISIONS USED ---\n{result['revision_count']}")
-    print(f"\n--- AUDITOR DECISION ---\n{result['auditor_decision']}")
\ No newline at end of file
+    print(f"\n--- AUDITOR DECISION ---\n{result['auditor_decision']}")
+    print(f"\n--- TOKENS PER REVISION ---\n{result['iteration_tokens']} (stop: {result['stop_reason']})")
\ No newline at end of file
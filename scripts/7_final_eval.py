@@ -1,36 +1,110 @@
-from deepeval.metrics import FaithfulnessMetric, AnswerRelevancyMetric, ContextualRelevancyMetric
-from deepeval.test_case import LLMTestCase
+import asyncio
+import time
+
+from eval_store import ameasure, reuse_summary
+from tracing import span
+
+# Report key -> deepeval metric class name. The key is what run_final_audit
+# returns; classes are resolved on first audit so importing this module
+# does not load deepeval.
+AUDIT_METRICS = {
+    "retrieval_quality": "ContextualRelevancyMetric",
+    "generation_honesty": "FaithfulnessMetric",
+    "user_satisfaction": "AnswerRelevancyMetric",
+}
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+async def _measure(name, metric, test_case, semaphore, use_store):
+    async with semaphore:
+        start_time = time.perf_counter()
+        with span(f"metric.{name}", metric=type(metric).__name__) as metric_span:
+            result = await ameasure(metric, test_case, use_store=use_store)
+            metric_span.set(
+                score=result["score"],
+                reused=result["reused"],
+                evaluation_cost=None if result["reused"] else getattr(metric, "evaluation_cost", None),
+            )
+        return name, result, time.perf_counter() - start_time
+
+
+def _metric(name):
+    import deepeval.metrics
+    from resources import get_judge_model
+
+    # The judge shares the workflows' rate limiter and retries instead of DeepEval's own client.
+    return getattr(deepeval.metrics, AUDIT_METRICS[name])(
+        threshold=DEFAULT_THRESHOLD, async_mode=True, model=get_judge_model()
+    )
+
+
+async def _audit_async(query, context, output, metrics, semaphore, use_store=True):
+    from deepeval.test_case import LLMTestCase
 
-# This script would run your compiled LangGraph app and capture the output
-def run_final_audit(query, context, output):
-    # Initialize metrics
-    f_metric = FaithfulnessMetric(threshold=0.7)
-    a_metric = AnswerRelevancyMetric(threshold=0.7)
-    c_metric = ContextualRelevancyMetric(threshold=0.7)
-    
     test_case = LLMTestCase(
         input=query,
         actual_output=output,
         retrieval_context=[context]
     )
-    
-    # Measure everything
-    f_metric.measure(test_case)
-    a_metric.measure(test_case)
-    c_metric.measure(test_case)
-    
+    # Fresh metric objects per audit so concurrent audits never share state.
+    measurements = await asyncio.gather(*(
+        _measure(name, _metric(name), test_case, semaphore, use_store)
+        for name in metrics
+    ))
+
+    scores = {name: result["score"] for name, result, _ in measurements}
+    scores["reasons"] = {name: result["reason"] for name, result, _ in measurements}
+    scores["reused"] = {name: result["reused"] for name, result, _ in measurements}
+    scores["timings"] = {name: round(seconds, 3) for name, _, seconds in measurements}
+    return scores
+
+
+def _print_report(scores):
     print(f"""
     📈 --- SYSTEM HEALTH REPORT ---
-    1. Retrieval Quality (Context): {c_metric.score}
-    2. Generation Honesty (Faithfulness): {f_metric.score}
-    3. User Satisfaction (Relevance): {a_metric.score}
+    1. Retrieval Quality (Context): {scores.get("retrieval_quality")}
+    2. Generation Honesty (Faithfulness): {scores.get("generation_honesty")}
+    3. User Satisfaction (Relevance): {scores.get("user_satisfaction")}
+    ⏱️ Metric timings (s): {scores["timings"]}
+    ♻️ Evaluations: {reuse_summary(list(scores["reused"].values()))}
     """)
 
-    return {
-        "retrieval_quality": c_metric.score,
-        "generation_honesty": f_metric.score,
-        "user_satisfaction": a_metric.score,
-    }
+
+# This script would run your compiled LangGraph app and capture the output
+def run_final_audit(query, context, output, metrics=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, use_store=True):
+    """Score one output with all ``metrics`` (default: every AUDIT_METRICS key) concurrently.
+
+    Wall time is roughly the slowest metric instead of the sum of all three.
+    The result maps each metric key to its score, plus per-metric ``reasons``,
+    ``reused`` flags and ``timings``. Unchanged (query, context, output)
+    triples reuse stored results from the evaluation store unless
+    ``use_store=False``.
+    """
+    metrics = list(metrics or AUDIT_METRICS)
+    scores = asyncio.run(
+        _audit_async(query, context, output, metrics, asyncio.Semaphore(max_concurrency), use_store)
+    )
+    _print_report(scores)
+    return scores
+
+
+async def run_batch_audit_async(triples, metrics=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, use_store=True):
+    metrics = list(metrics or AUDIT_METRICS)
+    # One semaphore across every (triple, metric) pair caps total judge calls in flight.
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(*(
+        _audit_async(query, context, output, metrics, semaphore, use_store)
+        for query, context, output in triples
+    ))
+    reused = [flag for scores in results for flag in scores["reused"].values()]
+    print(f"♻️ Batch audit evaluations: {reuse_summary(reused)}")
+    return results
+
+
+def run_batch_audit(triples, metrics=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, use_store=True):
+    """Audit many ``(query, context, output)`` triples; results are returned in input order."""
+    return asyncio.run(run_batch_audit_async(triples, metrics, max_concurrency, use_store))
 
 # Example usage with your Architect's output
-# run_final_audit(user_requirement, retrieved_doc, final_test_plan)
\ No newline at end of file
+# run_final_audit(user_requirement, retrieved_doc, final_test_plan)
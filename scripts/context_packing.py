@@ -0,0 +1,150 @@
+import math
+import os
+import threading
+
+from tracing import span
+
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "8"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+# Candidates at least this cosine-similar to an already packed rule add nothing new.
+CONTEXT_DEDUP_SIMILARITY = float(os.getenv("CONTEXT_DEDUP_SIMILARITY", "0.95"))
+TOKENIZER_ENCODING = os.getenv("CONTEXT_TOKENIZER", "o200k_base")  # gpt-4o's encoding
+CHARS_PER_TOKEN = 4
+
+
+class Tokenizer:
+    """Local token counter: tiktoken's ``encoding`` when available, else ~4 characters per token.
+
+    tiktoken downloads its BPE file on first use, so offline machines
+    without a cached copy fall back to the estimate instead of failing.
+    """
+
+    def __init__(self, encoding=TOKENIZER_ENCODING):
+        self.encoding_name = encoding
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if not self._loaded:
+                try:
+                    import tiktoken
+
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+                except Exception as exc:
+                    print(f"⚠️ tiktoken unavailable ({exc}); estimating {CHARS_PER_TOKEN} characters per token.")
+                self._loaded = True
+        return self._encoding
+
+    @property
+    def exact(self):
+        return self._load() is not None
+
+    def count(self, text):
+        encoding = self._load()
+        if encoding is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(encoding.encode(text))
+
+    def truncate(self, text, max_tokens):
+        encoding = self._load()
+        if encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def _cosine(left, right):
+    dot = sum(a * b for a, b in zip(left, right))
+    norm = math.sqrt(sum(a * a for a in left)) * math.sqrt(sum(b * b for b in right))
+    return dot / norm if norm else 0.0
+
+
+def format_rule(match):
+    return f"- [{match['metadata'].get('source', 'Unknown')}] {match['document']}"
+
+
+class ContextPacker:
+    """Turns ranked retrieval matches into a prompt context of at most ``token_budget`` tokens.
+
+    Matches are taken in rank order. A candidate whose stored embedding is
+    ``dedup_similarity``-close to one already packed is skipped, as is one
+    that no longer fits the remaining budget (smaller, lower-ranked rules
+    may still fit). The top match is always kept, truncated if it alone
+    exceeds the budget, so generation never runs without a rule.
+    """
+
+    def __init__(self, collection, token_budget=CONTEXT_TOKEN_BUDGET,
+                 dedup_similarity=CONTEXT_DEDUP_SIMILARITY, tokenizer=None):
+        self.collection = collection
+        self.token_budget = token_budget
+        self.dedup_similarity = dedup_similarity
+        self.tokenizer = tokenizer or Tokenizer()
+
+    def _embeddings(self, ids):
+        """Stored embeddings for ``ids`` in one ``collection.get``, so dedup never re-embeds."""
+        ids = list(dict.fromkeys(ids))
+        if not ids or self.dedup_similarity >= 1:
+            return {}
+        response = self.collection.get(ids=ids, include=["embeddings"])
+        embeddings = response.get("embeddings")
+        if embeddings is None:
+            return {}
+        return {doc_id: [float(value) for value in vector] for doc_id, vector in zip(response["ids"], embeddings)}
+
+    def _pack(self, matches, embeddings):
+        packed, packed_vectors, lines = [], [], []
+        tokens = duplicates = over_budget = 0
+        for match in matches:
+            vector = embeddings.get(match["id"])
+            if vector is not None and any(
+                _cosine(vector, other) >= self.dedup_similarity for other in packed_vectors
+            ):
+                duplicates += 1
+                continue
+            line = format_rule(match)
+            # Rules are joined with newlines; count the separator too.
+            line_tokens = self.tokenizer.count(line) + (1 if lines else 0)
+            if tokens + line_tokens > self.token_budget:
+                if packed:
+                    over_budget += 1
+                    continue
+                line = self.tokenizer.truncate(line, self.token_budget)
+                line_tokens = self.tokenizer.count(line)
+            packed.append(match)
+            lines.append(line)
+            tokens += line_tokens
+            if vector is not None:
+                packed_vectors.append(vector)
+        sources = list(dict.fromkeys(match["metadata"].get("source", "Unknown") for match in packed))
+        return {
+            "context": "\n".join(lines),
+            "source": ", ".join(sources) or "Unknown",
+            "matches": packed,
+            "tokens": tokens,
+            "candidates": len(matches),
+            "duplicates": duplicates,
+            "over_budget": over_budget,
+        }
+
+    def pack_many(self, match_lists):
+        """One packed context per entry of ``match_lists``; embeddings are fetched for the whole batch at once.
+
+        Each result is ``{"context", "source", "matches", "tokens",
+        "candidates", "duplicates", "over_budget"}``.
+        """
+        match_lists = [list(matches) for matches in match_lists]
+        with span("context.pack", batch_size=len(match_lists), token_budget=self.token_budget) as pack_span:
+            embeddings = self._embeddings(match["id"] for matches in match_lists for match in matches)
+            results = [self._pack(matches, embeddings) for matches in match_lists]
+            pack_span.set(
+                tokens=sum(result["tokens"] for result in results),
+                packed=sum(len(result["matches"]) for result in results),
+                candidates=sum(result["candidates"] for result in results),
+                duplicates=sum(result["duplicates"] for result in results),
+                exact_tokens=self.tokenizer.exact,
+            )
+        return results
+
+    def pack(self, matches):
+        return self.pack_many([matches])[0]
@@ -0,0 +1,338 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_QUEUE_PATH = os.getenv("EVAL_QUEUE_PATH", "./data/eval_queue.sqlite")
+DEFAULT_SAMPLE_RATE = float(os.getenv("EVAL_SAMPLE_RATE", "0.1"))
+DEFAULT_WORKERS = int(os.getenv("EVAL_WORKERS", "2"))
+DEFAULT_POLL_INTERVAL_S = 1.0
+# A job claimed longer ago than this is assumed abandoned (worker crashed) and re-queued.
+DEFAULT_LEASE_S = 600.0
+MAX_ATTEMPTS = 3
+UNCATEGORIZED = "uncategorized"
+
+
+def parse_sample_rates(value):
+    """``"security=0.5,technical=0.1"`` -> ``{"security": 0.5, "technical": 0.1}``."""
+    rates = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            category, rate = item.split("=", 1)
+            rates[category.strip()] = float(rate)
+    return rates
+
+
+CATEGORY_SAMPLE_RATES = parse_sample_rates(os.getenv("EVAL_SAMPLE_RATES"))
+
+
+class EvalQueue:
+    """Durable SQLite queue of outputs waiting for (or scored by) the DeepEval judge.
+
+    Sampling is stratified: each category keeps its own seen/enqueued
+    counters, and an output is enqueued whenever that keeps the category's
+    enqueued share at its sample rate. Ten percent of traffic is then
+    exactly every tenth output per category, not ten percent of whichever
+    category happens to be busiest.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, sample_rate=DEFAULT_SAMPLE_RATE, category_rates=None):
+        self.sample_rate = sample_rate
+        self.category_rates = CATEGORY_SAMPLE_RATES if category_rates is None else category_rates
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS eval_jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, workflow TEXT NOT NULL, category TEXT NOT NULL, "
+            "query TEXT NOT NULL, context TEXT NOT NULL, output TEXT NOT NULL, metrics TEXT, "
+            "status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0, "
+            "scores TEXT, reasons TEXT, error TEXT, "
+            "created_at REAL NOT NULL, claimed_at REAL, finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS eval_jobs_status ON eval_jobs (status, id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS eval_sampling ("
+            "category TEXT PRIMARY KEY, seen INTEGER NOT NULL, enqueued INTEGER NOT NULL)"
+        )
+
+    def rate_for(self, category):
+        return self.category_rates.get(category, self.sample_rate)
+
+    def offer(self, workflow, category, query, context, output, metrics=None, sample_rate=None):
+        """Enqueue the output if its category's sample calls for it; returns the job id or None."""
+        category = category or UNCATEGORIZED
+        rate = self.rate_for(category) if sample_rate is None else sample_rate
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT seen, enqueued FROM eval_sampling WHERE category = ?", (category,)
+                ).fetchone()
+                seen, enqueued = row if row else (0, 0)
+                seen += 1
+                take = enqueued < math.ceil(seen * rate - 1e-9)
+                job_id = None
+                if take:
+                    enqueued += 1
+                    job_id = self._insert(workflow, category, query, context, output, metrics)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO eval_sampling (category, seen, enqueued) VALUES (?, ?, ?)",
+                    (category, seen, enqueued),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def enqueue(self, workflow, category, query, context, output, metrics=None):
+        """Always enqueue (e.g. an audit the user explicitly asked for), outside the sampling counters."""
+        with self._lock:
+            return self._insert(workflow, category or UNCATEGORIZED, query, context, output, metrics)
+
+    def _insert(self, workflow, category, query, context, output, metrics):
+        return self._db.execute(
+            "INSERT INTO eval_jobs (workflow, category, query, context, output, metrics, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (workflow, category, query, context, output, json.dumps(list(metrics)) if metrics else None, time.time()),
+        ).lastrowid
+
+    def claim(self, lease_s=DEFAULT_LEASE_S):
+        """Take the oldest queued (or abandoned) job; returns a job dict or None.
+
+        An abandoned job (its worker died holding the lease) is retried until
+        it has used ``MAX_ATTEMPTS`` attempts, then marked ``failed``.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE eval_jobs SET status = 'failed', error = ?, finished_at = ? "
+                    "WHERE status = 'running' AND claimed_at < ? AND attempts >= ?",
+                    (f"worker lease expired on all {MAX_ATTEMPTS} attempts", now, now - lease_s, MAX_ATTEMPTS),
+                )
+                row = self._db.execute(
+                    "SELECT id, workflow, category, query, context, output, metrics, attempts FROM eval_jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND claimed_at < ? AND attempts < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now - lease_s, MAX_ATTEMPTS),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE eval_jobs SET status = 'running', claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        keys = ("id", "workflow", "category", "query", "context", "output", "metrics", "attempts")
+        job = dict(zip(keys, row))
+        job["metrics"] = json.loads(job["metrics"]) if job["metrics"] else None
+        job["attempts"] += 1
+        return job
+
+    def complete(self, job_id, scores, reasons):
+        with self._lock:
+            self._db.execute(
+                "UPDATE eval_jobs SET status = 'done', scores = ?, reasons = ?, error = NULL, finished_at = ? "
+                "WHERE id = ?",
+                (json.dumps(scores), json.dumps(reasons), time.time(), job_id),
+            )
+
+    def fail(self, job, error):
+        # Transient judge failures (rate limits, timeouts) get another attempt.
+        status = "failed" if job["attempts"] >= MAX_ATTEMPTS else "queued"
+        with self._lock:
+            self._db.execute(
+                "UPDATE eval_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, str(error), time.time(), job["id"]),
+            )
+
+    def job(self, job_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, scores, reasons, error FROM eval_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "scores": json.loads(row[2]) if row[2] else None,
+            "reasons": json.loads(row[3]) if row[3] else None,
+            "error": row[4],
+        }
+
+    def recent(self, limit=50):
+        """Latest jobs, newest first, flattened for a table."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, workflow, category, status, query, scores, error, created_at, finished_at "
+                "FROM eval_jobs ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        jobs = []
+        for job_id, workflow, category, status, query, scores, error, created_at, finished_at in rows:
+            jobs.append({
+                "id": job_id,
+                "workflow": workflow,
+                "category": category,
+                "status": status,
+                "query": query,
+                **(json.loads(scores) if scores else {}),
+                "error": error,
+                "queue_s": round(finished_at - created_at, 1) if finished_at else None,
+            })
+        return jobs
+
+    def summary(self):
+        """Per-category sampling counters, job status counts and mean score per metric."""
+        with self._lock:
+            sampling = self._db.execute("SELECT category, seen, enqueued FROM eval_sampling").fetchall()
+            statuses = self._db.execute(
+                "SELECT category, status, COUNT(*) FROM eval_jobs GROUP BY category, status"
+            ).fetchall()
+            scored = self._db.execute(
+                "SELECT category, scores FROM eval_jobs WHERE status = 'done' AND scores IS NOT NULL"
+            ).fetchall()
+
+        rows = {}
+        for category, seen, enqueued in sampling:
+            rows[category] = {"category": category, "seen": seen, "sampled": enqueued,
+                              "sample_rate": self.rate_for(category)}
+        for category, status, count in statuses:
+            rows.setdefault(category, {"category": category})[status] = count
+        totals = {}
+        for category, scores in scored:
+            for metric, score in json.loads(scores).items():
+                if score is not None:
+                    totals.setdefault((category, metric), []).append(score)
+        for (category, metric), values in totals.items():
+            rows.setdefault(category, {"category": category})[f"mean_{metric}"] = round(sum(values) / len(values), 3)
+        return sorted(rows.values(), key=lambda row: row["category"])
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def get_default_queue():
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = EvalQueue()
+        return _default_queue
+
+
+def offer_for_evaluation(workflow, category, query, context, output, metrics=None):
+    """Sampled enqueue from a request path; never raises, since monitoring must not break serving."""
+    try:
+        return get_default_queue().offer(workflow, category, query, context, output, metrics)
+    except Exception as error:
+        print(f"⚠️ Could not enqueue output for evaluation: {error}")
+        return None
+
+
+class EvalWorkerPool:
+    """Background threads that drain the queue with ``run_final_audit`` (the existing DeepEval metrics)."""
+
+    def __init__(self, queue=None, workers=DEFAULT_WORKERS, poll_interval_s=DEFAULT_POLL_INTERVAL_S):
+        self.queue = queue or get_default_queue()
+        self.workers = workers
+        self.poll_interval_s = poll_interval_s
+        self.stats = {"scored": 0, "failed": 0}
+        self._stop = threading.Event()
+        self._threads = []
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"eval-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_once(self):
+        """Score one job; returns False when the queue was empty."""
+        from resources import load_script_module
+
+        job = self.queue.claim()
+        if job is None:
+            return False
+        final_eval = load_script_module("7_final_eval.py", "final_eval_module")
+        try:
+            result = final_eval.run_final_audit(job["query"], job["context"], job["output"], metrics=job["metrics"])
+        except Exception as error:
+            self.queue.fail(job, error)
+            outcome = "failed"
+        else:
+            metric_names = job["metrics"] or list(final_eval.AUDIT_METRICS)
+            self.queue.complete(
+                job["id"],
+                {name: result[name] for name in metric_names},
+                result.get("reasons", {}),
+            )
+            outcome = "scored"
+        with self._stats_lock:
+            self.stats[outcome] += 1
+        return True
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                busy = self.run_once()
+            except Exception as error:
+                print(f"⚠️ Evaluation worker error: {error}")
+                busy = False
+            if not busy:
+                self._stop.wait(self.poll_interval_s)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Score queued outputs with the DeepEval judge.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty.")
+    args = parser.parse_args()
+
+    pool = EvalWorkerPool(workers=args.workers)
+    if args.drain:
+        def drain():
+            while pool.run_once():
+                pass
+
+        threads = [threading.Thread(target=drain) for _ in range(max(1, args.workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"✅ Queue drained: {pool.stats}")
+        return 0
+
+    print(f"🧪 {args.workers} evaluation workers polling {DEFAULT_QUEUE_PATH} (Ctrl+C to stop)...")
+    pool.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop(timeout=5)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_STORE_PATH = os.getenv("EVAL_STORE_PATH", "./data/eval_store.sqlite")
+STORE_DISABLED = os.getenv("EVAL_STORE_DISABLED", "").lower() in {"1", "true", "yes"}
+
+
+def judge_model_name(metric):
+    model = getattr(metric, "evaluation_model", None) or getattr(metric, "model", None)
+    if hasattr(model, "get_model_name"):
+        model = model.get_model_name()
+    return str(model) if model is not None else None
+
+
+def evaluation_key(test_case, metric):
+    """Hash of the test case plus metric name, threshold and judge model.
+
+    Any change to the input, output or retrieval context, or to how it is
+    judged, yields a new key and therefore a fresh evaluation.
+    """
+    payload = json.dumps(
+        {
+            "input": test_case.input,
+            "actual_output": test_case.actual_output,
+            "expected_output": getattr(test_case, "expected_output", None),
+            "retrieval_context": getattr(test_case, "retrieval_context", None),
+            "context": getattr(test_case, "context", None),
+            "metric": type(metric).__name__,
+            "threshold": getattr(metric, "threshold", None),
+            "judge_model": judge_model_name(metric),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EvalStore:
+    """SQLite store of metric results (score, reason, success) keyed by :func:`evaluation_key`."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.stats = {"reused": 0, "computed": 0}
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS evaluations ("
+            "key TEXT PRIMARY KEY, metric TEXT NOT NULL, score REAL, reason TEXT, "
+            "success INTEGER, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT score, reason, success FROM evaluations WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"score": row[0], "reason": row[1], "success": bool(row[2])}
+
+    def set(self, key, metric, score, reason, success):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO evaluations (key, metric, score, reason, success, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, metric, score, reason, int(bool(success)), time.time()),
+            )
+            self._db.commit()
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM evaluations")
+            self._db.commit()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = EvalStore()
+        return _default_store
+
+
+async def ameasure(metric, test_case, use_store=True, store=None):
+    """``await metric.a_measure(test_case)`` unless an identical evaluation is stored.
+
+    Returns ``{"score", "reason", "success", "reused"}``; fresh results are
+    written back so the next run can reuse them.
+    """
+    if not use_store or STORE_DISABLED:
+        await metric.a_measure(test_case)
+        return {"score": metric.score, "reason": metric.reason, "success": metric.is_successful(), "reused": False}
+
+    store = store or get_default_store()
+    key = evaluation_key(test_case, metric)
+    stored = store.get(key)
+    if stored is not None:
+        store.count("reused")
+        return {**stored, "reused": True}
+
+    await metric.a_measure(test_case)
+    result = {"score": metric.score, "reason": metric.reason, "success": metric.is_successful()}
+    store.set(key, type(metric).__name__, **result)
+    store.count("computed")
+    return {**result, "reused": False}
+
+
+def reuse_summary(reused_flags):
+    """``"N reused, M recomputed"`` for a list of ``reused`` booleans."""
+    reused = sum(1 for flag in reused_flags if flag)
+    return f"{reused} reused, {len(reused_flags) - reused} recomputed"
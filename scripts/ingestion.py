@@ -0,0 +1,451 @@
+import hashlib
+import json
+import pickle
+import re
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from pathlib import Path
+
+from partitioned_index import PartitionedCollection
+
+CHROMA_PATH = "./data/chroma_db"
+COLLECTION_NAME = "engineering_docs"
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_PRIORITY = "medium"
+DEFAULT_CHUNK_CHARS = 800
+DEFAULT_OVERLAP_SENTENCES = 1
+# Records without a ``source`` (e.g. the built-in sample rules) are keyed under this.
+INLINE_SOURCE = "inline"
+
+MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# RFC 2119 keywords decide a chunk's priority; the first matching level wins.
+PRIORITY_KEYWORDS = [
+    ("high", re.compile(r"\b(must|shall|required)\b", re.IGNORECASE)),
+    ("medium", re.compile(r"\b(should|recommended)\b", re.IGNORECASE)),
+    ("low", re.compile(r"\b(may|optional)\b", re.IGNORECASE)),
+]
+
+
+def content_hash(text, metadata=None):
+    """Stable fingerprint of a document's text plus its metadata."""
+    payload = json.dumps({"text": text, "metadata": metadata or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def document_id(source, key, namespace=None):
+    """Stable id of the record at ``key`` (its own id, line or chunk number) in ``source``.
+
+    ``namespace`` tells apart equally named sources of different source
+    directories. An edited rule keeps its id, so the new text overwrites the
+    old row; ``content_hash`` only decides whether the row changed.
+    """
+    origin = source if namespace is None else f"{namespace}\x1f{source}"
+    return hashlib.sha256(f"{origin}\x1f{key}".encode("utf-8")).hexdigest()[:32]
+
+
+def legacy_document_id(text):
+    """The content-addressed id earlier ingests stored ``text`` under."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()[:32]
+
+
+def _is_uuid4(value):
+    try:
+        return uuid.UUID(value).version == 4
+    except ValueError:
+        return False
+
+
+def _read_jsonl(path):
+    # A record's own "id" keys it; otherwise its line number does.
+    with path.open(encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            metadata = dict(record.get("metadata") or {})
+            for key in ("category", "priority"):
+                if key in record:
+                    metadata[key] = record[key]
+            yield {"text": record["text"], "metadata": metadata, "key": record.get("id", f"line-{number}")}
+
+
+def _read_text(path):
+    # One rule per line; the file name (e.g. security.txt) is the category.
+    with path.open(encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield {
+                    "text": line,
+                    "metadata": {"category": path.stem.lower(), "priority": DEFAULT_PRIORITY},
+                    "key": f"line-{number}",
+                }
+
+
+def chunk_priority(text):
+    for priority, pattern in PRIORITY_KEYWORDS:
+        if pattern.search(text):
+            return priority
+    return DEFAULT_PRIORITY
+
+
+def _split_sentences(buffer, max_chars):
+    """Split complete sentences off ``buffer``; returns ``(sentences, remainder)``.
+
+    Text with no sentence boundary is hard-split at ``max_chars`` so a single
+    run-on paragraph can never grow without bound.
+    """
+    parts = SENTENCE_END.split(buffer)
+    sentences, remainder = parts[:-1], parts[-1]
+    while len(remainder) > max_chars:
+        sentences.append(remainder[:max_chars])
+        remainder = remainder[max_chars:]
+    return sentences, remainder
+
+
+def chunk_lines(lines, max_chars=DEFAULT_CHUNK_CHARS, overlap_sentences=DEFAULT_OVERLAP_SENTENCES):
+    """Stream ``(heading, text)`` chunks of at most about ``max_chars`` from ``lines``.
+
+    A Markdown heading always starts a new chunk. Within a section, chunks end
+    on sentence boundaries, and each chunk repeats the last
+    ``overlap_sentences`` sentences of the previous one. Only the current
+    section's pending sentences are held in memory.
+    """
+    heading = ""
+    sentences = []
+    buffer = ""
+
+    def take(sentence):
+        nonlocal sentences
+        chunk = None
+        if sentences and sum(len(item) + 1 for item in sentences) + len(sentence) > max_chars:
+            chunk = (heading, " ".join(sentences))
+            sentences = sentences[-overlap_sentences:] if overlap_sentences else []
+            # Never carry over more than half a chunk, or chunks would barely advance.
+            while sentences and sum(len(item) + 1 for item in sentences) > max_chars // 2:
+                sentences.pop(0)
+        sentences.append(sentence)
+        return chunk
+
+    for line in lines:
+        stripped = line.strip()
+        match = MARKDOWN_HEADING.match(stripped)
+        if match or not stripped:
+            # A blank line ends the paragraph; a heading also ends the section.
+            pending = [buffer.strip()] if buffer.strip() else []
+            buffer = ""
+            for sentence in pending:
+                chunk = take(sentence)
+                if chunk:
+                    yield chunk
+            if match:
+                if sentences:
+                    yield heading, " ".join(sentences)
+                heading, sentences = match.group(1), []
+            continue
+
+        buffer = f"{buffer} {stripped}" if buffer else stripped
+        complete, buffer = _split_sentences(buffer, max_chars)
+        for sentence in complete:
+            chunk = take(sentence)
+            if chunk:
+                yield chunk
+
+    if buffer.strip():
+        chunk = take(buffer.strip())
+        if chunk:
+            yield chunk
+    if sentences:
+        yield heading, " ".join(sentences)
+
+
+def _read_spec(path, max_chars=DEFAULT_CHUNK_CHARS, overlap_sentences=DEFAULT_OVERLAP_SENTENCES):
+    # Long specification documents: read lazily and chunked; the file name is the category.
+    with path.open(encoding="utf-8") as handle:
+        for index, (heading, text) in enumerate(chunk_lines(handle, max_chars, overlap_sentences)):
+            metadata = {"category": path.stem.lower(), "priority": chunk_priority(text), "chunk": index}
+            if heading:
+                metadata["section"] = heading
+            yield {"text": f"{heading}: {text}" if heading else text, "metadata": metadata, "key": f"chunk-{index}"}
+
+
+READERS = {".jsonl": _read_jsonl, ".txt": _read_text, ".md": _read_spec, ".markdown": _read_spec}
+
+
+def iter_requirement_files(directory, chunk_chars=DEFAULT_CHUNK_CHARS,
+                           overlap_sentences=DEFAULT_OVERLAP_SENTENCES, namespace=None):
+    """Lazily yield records from every supported file under ``directory``.
+
+    Each record's ``source`` metadata is its path relative to ``directory``,
+    and its ``source_namespace`` is ``namespace`` (default: the directory's
+    absolute path), so two directories that both contain e.g.
+    ``rules.jsonl`` neither share ids nor prune each other's rows.
+    Markdown specs are chunked with ``chunk_chars`` / ``overlap_sentences``.
+    """
+    root = Path(directory)
+    namespace = namespace or str(root.resolve())
+    for path in sorted(root.rglob("*")):
+        reader = READERS.get(path.suffix.lower())
+        if reader is None or not path.is_file():
+            continue
+        if reader is _read_spec:
+            reader = partial(_read_spec, max_chars=chunk_chars, overlap_sentences=overlap_sentences)
+        source = str(path.relative_to(root))
+        for record in reader(path):
+            record["metadata"].setdefault("source", source)
+            record["metadata"].setdefault("source_namespace", namespace)
+            yield record
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def default_embedding_function():
+    # chromadb is imported on first use so `1_ingest.py --help` and the
+    # chunking helpers do not pay for it.
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+_worker_embedding_function = None
+EMBEDDING_PROBE = ["Rule: embedding consistency probe."]
+EMBEDDING_TOLERANCE = 1e-4
+
+
+def _init_embedding_worker(embedding_factory, embedding_function=None):
+    global _worker_embedding_function
+    _worker_embedding_function = embedding_function or (embedding_factory or default_embedding_function)()
+
+
+def _check_worker_embeddings(pool, embedding_function):
+    """Raise if the workers' model embeds differently from ``embedding_function``."""
+    worker_vector = pool.submit(_embed_in_worker, EMBEDDING_PROBE).result()[0]
+    local_vector = [float(value) for value in embedding_function(EMBEDDING_PROBE)[0]]
+    if len(worker_vector) != len(local_vector) or any(
+        abs(a - b) > EMBEDDING_TOLERANCE for a, b in zip(worker_vector, local_vector)
+    ):
+        raise ValueError(
+            "embedding_factory and embedding_function produce different embeddings; "
+            "documents would not be comparable with queries. Pass only one of them."
+        )
+
+
+def _embed_in_worker(documents):
+    return [[float(value) for value in vector] for vector in _worker_embedding_function(documents)]
+
+
+def get_collection(path=CHROMA_PATH, name=COLLECTION_NAME, embedding_function=None):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=path)
+    return client.get_or_create_collection(
+        name=name,
+        embedding_function=embedding_function or default_embedding_function(),
+    )
+
+
+def ingest_records(collection, records, batch_size=DEFAULT_BATCH_SIZE, embedding_function=None,
+                   lexical_index=None, workers=0, embedding_factory=None, migrate_legacy_ids=False):
+    """Upsert a stream of ``{"text", "metadata"}`` records in batches.
+
+    Each record is keyed by its ``source_namespace`` and ``source`` plus its
+    ``key`` (a record id, line or chunk number; its position in the source
+    when missing), so an
+    edited rule overwrites its previous version. Records whose content hash
+    is unchanged are skipped, so re-running the same corpus leaves the index
+    untouched. Embeddings are computed once per batch and only for new or
+    changed rows. Once the stream ends, rows of an ingested source that it
+    no longer contains are deleted, as are copies of ingested rules left
+    under the content-addressed ids of earlier ingests. Copies under the
+    uuid4 ids of the first ingests can only be found by scanning every id,
+    so they are removed only with ``migrate_legacy_ids=True``, a one-off
+    after upgrading.
+    ``stats["changed_categories"]`` lists the categories that received
+    writes or deletions. Every write is mirrored into ``lexical_index`` (a
+    BM25 ``LexicalIndex``) when given; the caller saves it.
+
+    With ``workers > 0`` batches are embedded in a process pool. Each worker
+    gets a copy of ``embedding_function``, or builds its own model from
+    ``embedding_factory`` (a picklable zero-arg callable, default
+    ``DefaultEmbeddingFunction``). When both are given, they must embed a
+    probe text identically, or ``ValueError`` is raised. At most
+    ``2 * workers`` batches are in flight, so memory stays bounded however
+    large the input.
+    """
+    stats = {"seen": 0, "skipped": 0, "upserted": 0, "removed": 0, "seconds": 0.0}
+    changed_categories = set()
+    start_time = time.perf_counter()
+    state = {
+        "positions": Counter(),
+        "seen_ids": {},
+        "uuid_rows": _legacy_uuid_rows(collection) if migrate_legacy_ids else {},
+        # Categories that changed rows are moving out of: their cached answers are stale too.
+        "replaced_categories": set(),
+    }
+
+    def delete(rows):
+        if not rows:
+            return
+        ids = [doc_id for doc_id, _ in rows]
+        collection.delete(ids=ids)
+        if lexical_index is not None:
+            lexical_index.delete(ids)
+        stats["removed"] += len(ids)
+        changed_categories.update(metadata.get("category") for _, metadata in rows)
+
+    def write(ids, documents, metadatas, superseded, previous_categories, embeddings):
+        delete(superseded)
+        # The batch lookup already found each id's stored category, so a
+        # partitioned index need not search its other partitions for it.
+        moves = {"previous_categories": previous_categories} if isinstance(collection, PartitionedCollection) else {}
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings, **moves)
+        if lexical_index is not None:
+            lexical_index.upsert(ids, documents, metadatas)
+        stats["upserted"] += len(ids)
+        changed_categories.update(metadata.get("category") for metadata in metadatas)
+
+    if workers > 0:
+        initargs = (embedding_factory, None)
+        if embedding_factory is None and embedding_function is not None:
+            # Workers embed with the caller's model, the one queries are embedded with.
+            try:
+                pickle.dumps(embedding_function)
+            except Exception as error:
+                raise ValueError(
+                    f"embedding_function cannot be sent to worker processes ({error}); "
+                    "pass an embedding_factory that builds the same model"
+                ) from error
+            initargs = (None, embedding_function)
+        pool = ProcessPoolExecutor(workers, initializer=_init_embedding_worker, initargs=initargs)
+        embed = None
+    else:
+        pool = None
+        embed = embedding_function or default_embedding_function()
+    in_flight = deque()
+
+    try:
+        if pool is not None and embedding_factory is not None and embedding_function is not None:
+            _check_worker_embeddings(pool, embedding_function)
+        for batch in _pending_batches(collection, records, batch_size, stats, state):
+            ids, documents = batch[0], batch[1]
+            if not ids:
+                delete(batch[3])
+                continue
+            if pool is None:
+                write(*batch, embed(documents))
+                continue
+            in_flight.append((pool.submit(_embed_in_worker, documents), *batch))
+            if len(in_flight) >= 2 * workers:
+                future, *batch = in_flight.popleft()
+                write(*batch, future.result())
+        while in_flight:
+            future, *batch = in_flight.popleft()
+            write(*batch, future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    # Rules dropped from a source (or chunks past its new end) must not stay searchable.
+    for (namespace, source), seen in state["seen_ids"].items():
+        stored = collection.get(where={"source": source}, include=["metadatas"])
+        delete([
+            (doc_id, metadata or {})
+            for doc_id, metadata in zip(stored["ids"], stored["metadatas"])
+            # Rows stored before namespaces existed belong to whichever directory re-ingests the source.
+            if doc_id not in seen and (metadata or {}).get("source_namespace") in (namespace, None)
+        ])
+
+    stats["seconds"] = time.perf_counter() - start_time
+    stats["docs_per_sec"] = stats["seen"] / stats["seconds"] if stats["seconds"] else 0.0
+    # Downstream caches (e.g. the semantic answer cache) invalidate these.
+    changed_categories |= state["replaced_categories"]
+    stats["changed_categories"] = sorted(category for category in changed_categories if category)
+    return stats
+
+
+def _legacy_uuid_rows(collection):
+    """``{legacy_document_id(text): [(id, metadata)]}`` for rows the original uuid4-keyed ingest left behind."""
+    ids = [doc_id for doc_id in collection.get(include=[])["ids"] if _is_uuid4(doc_id)]
+    if not ids:
+        return {}
+    stored = collection.get(ids=ids, include=["documents", "metadatas"])
+    rows = {}
+    for doc_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+        rows.setdefault(legacy_document_id(document), []).append((doc_id, metadata or {}))
+    return rows
+
+
+def _pending_batches(collection, records, batch_size, stats, state):
+    """Yield ``(ids, documents, metadatas, superseded, previous_categories)`` per batch.
+
+    Rows already stored unchanged are left out. ``superseded`` holds
+    ``(id, metadata)`` of legacy-keyed copies of the batch's rules, to be
+    deleted when the batch is written. ``previous_categories`` maps the
+    batch's already stored ids to their stored category.
+    """
+    for batch in _batched(records, batch_size):
+        # Collapse duplicates inside the batch; the last occurrence wins.
+        pending = {}
+        legacy_ids = {}
+        for record in batch:
+            metadata = dict(record.get("metadata") or {})
+            metadata.pop("content_hash", None)
+            metadata["content_hash"] = content_hash(record["text"], metadata)
+            source = metadata.get("source", INLINE_SOURCE)
+            origin = (metadata.get("source_namespace"), source)
+            key = record.get("key", record.get("id"))
+            if key is None:
+                key = f"position-{state['positions'][origin]}"
+            state["positions"][origin] += 1
+            doc_id = document_id(source, key, origin[0])
+            pending[doc_id] = (record["text"], metadata)
+            legacy_ids[legacy_document_id(record["text"])] = doc_id
+            if "source" in metadata:
+                state["seen_ids"].setdefault(origin, set()).add(doc_id)
+        stats["seen"] += len(batch)
+
+        superseded = []
+        for legacy_id in legacy_ids:
+            superseded.extend(state["uuid_rows"].pop(legacy_id, []))
+        lookup = list(pending) + [legacy_id for legacy_id in legacy_ids if legacy_id not in pending]
+        existing = collection.get(ids=lookup, include=["metadatas"])
+        previous_categories = {}
+        for doc_id, metadata in zip(existing["ids"], existing["metadatas"]):
+            if doc_id not in pending:
+                superseded.append((doc_id, metadata or {}))
+            elif metadata and metadata.get("content_hash") == pending[doc_id][1]["content_hash"]:
+                del pending[doc_id]
+            elif metadata:
+                state["replaced_categories"].add(metadata.get("category"))
+                previous_categories[doc_id] = metadata.get("category")
+        stats["skipped"] += len(batch) - len(pending)
+
+        if not pending and not superseded:
+            continue
+
+        ids = list(pending)
+        yield (ids, [pending[doc_id][0] for doc_id in ids], [pending[doc_id][1] for doc_id in ids], superseded,
+               previous_categories)
+
+
+def ingest_directory(collection, directory, batch_size=DEFAULT_BATCH_SIZE, embedding_function=None,
+                     lexical_index=None, workers=0, chunk_chars=DEFAULT_CHUNK_CHARS,
+                     overlap_sentences=DEFAULT_OVERLAP_SENTENCES, namespace=None):
+    return ingest_records(
+        collection,
+        iter_requirement_files(directory, chunk_chars, overlap_sentences, namespace),
+        batch_size=batch_size,
+        embedding_function=embedding_function,
+        lexical_index=lexical_index,
+        workers=workers,
+    )
@@ -0,0 +1,277 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from llm_cache import cached_chat_completion
+from tracing import span
+
+# Labeled examples per category. Centroids of their embeddings are the
+# "prototypes" queries are compared against.
+DEFAULT_EXAMPLES = {
+    "security": [
+        "What are the MFA requirements?",
+        "How should I test SHA-256 encryption?",
+        "How do we handle MFA login verification?",
+        "Admin accounts need multi-factor authentication.",
+        "Passwords must be hashed before they are stored.",
+        "Verify that only authorized roles can access the admin panel.",
+        "Test session expiry and token revocation.",
+        "Check that sensitive data is encrypted at rest and in transit.",
+    ],
+    "technical": [
+        "How do I test the login speed?",
+        "What is the requirement for API response timeout?",
+        "API response time for login must be under 200ms.",
+        "Which HTTP status codes should the endpoint return?",
+        "Validate the JSON response format of the API.",
+        "Measure throughput of the search service under load.",
+        "Check pagination and error payload formatting.",
+        "The service must handle 500 requests per second.",
+    ],
+}
+
+DEFAULT_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+# Concurrent LLM fallbacks are collected for up to this long (0 disables
+# micro-batching) or until ROUTER_MAX_BATCH queries are waiting.
+DEFAULT_BATCH_WINDOW_MS = float(os.getenv("ROUTER_BATCH_WINDOW_MS", "20"))
+DEFAULT_MAX_BATCH = int(os.getenv("ROUTER_MAX_BATCH", "16"))
+
+ROUTER_PROMPT = """
+    Analyze the following user query and categorize it into exactly one of these two categories:
+    1. 'security' (if it relates to MFA, encryption, or access)
+    2. 'technical' (if it relates to API performance, status codes, or formatting)
+
+    Query: {query}
+
+    Return ONLY the category name in lowercase.
+    """
+
+ROUTER_BATCH_PROMPT = """
+    Analyze each of the following user queries and categorize it into exactly one of these two categories:
+    1. 'security' (if it relates to MFA, encryption, or access)
+    2. 'technical' (if it relates to API performance, status codes, or formatting)
+
+    Queries:
+{queries}
+
+    Return a JSON object {{"categories": [...]}} with one lowercase category per query, in the same order.
+    """
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class RoutingBatcher:
+    """Collects concurrent LLM routing requests into one call.
+
+    ``submit`` returns a ``Future``. The batch is classified as soon as
+    ``max_batch`` queries are waiting (on the submitting thread) or when
+    ``window_s`` has passed since the first one arrived (on a timer thread).
+    """
+
+    def __init__(self, classify_many, window_s, max_batch):
+        self.classify_many = classify_many
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self.stats = {"batches": 0, "queries": 0}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def submit(self, query):
+        future = Future()
+        with self._lock:
+            self._pending.append((query, future))
+            if len(self._pending) >= self.max_batch:
+                batch, self._pending = self._pending, []
+            else:
+                batch = None
+                if len(self._pending) == 1:
+                    timer = threading.Timer(self.window_s, self._flush)
+                    timer.daemon = True
+                    timer.start()
+        if batch:
+            self._run(batch)
+        return future
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._run(batch)
+
+    def _run(self, batch):
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["queries"] += len(batch)
+        try:
+            categories = self.classify_many([query for query, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), category in zip(batch, categories):
+            future.set_result(category)
+
+
+class IntentRouter:
+    """Nearest-centroid intent classifier with an LLM fallback.
+
+    Queries are embedded with the same function Chroma uses for
+    ``engineering_docs`` and compared to the centroid of each category's
+    labeled examples. When the gap between the best and second-best cosine
+    similarity is below ``min_margin`` the LLM decides instead.
+    """
+
+    def __init__(self, client=None, examples=None, embedding_function=None,
+                 min_margin=DEFAULT_MIN_MARGIN, model="gpt-4o",
+                 batch_window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch=DEFAULT_MAX_BATCH):
+        self.client = client
+        self.examples = examples or DEFAULT_EXAMPLES
+        if embedding_function is None:
+            from chromadb.utils import embedding_functions
+
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        self.embedding_function = embedding_function
+        self.min_margin = min_margin
+        self.model = model
+        self.categories = list(self.examples)
+        self._centroids = None
+        self.max_batch = max_batch
+        self.batcher = (
+            RoutingBatcher(self.classify_many_with_llm, batch_window_ms / 1000, max_batch)
+            if batch_window_ms > 0 else None
+        )
+
+    @property
+    def centroids(self):
+        if self._centroids is None:
+            centroids = [
+                _normalize(self.embedding_function(self.examples[category])).mean(axis=0)
+                for category in self.categories
+            ]
+            self._centroids = _normalize(centroids)
+        return self._centroids
+
+    def classify_locally(self, query, query_embedding=None):
+        if query_embedding is None:
+            query_embedding = self.embedding_function([query])[0]
+        query_vector = _normalize(query_embedding)
+        similarities = self.centroids @ query_vector
+        ranked = np.argsort(similarities)[::-1]
+        best = similarities[ranked[0]]
+        runner_up = similarities[ranked[1]] if len(ranked) > 1 else -1.0
+        return {
+            "category": self.categories[ranked[0]],
+            "confidence": float(best),
+            "margin": float(best - runner_up),
+            "scores": {
+                category: float(score) for category, score in zip(self.categories, similarities)
+            },
+        }
+
+    def classify_with_llm(self, query):
+        with span("routing.llm") as llm_span:
+            response = cached_chat_completion(
+                self.client,
+                model=self.model,
+                messages=[{"role": "user", "content": ROUTER_PROMPT.format(query=query)}],
+            )
+            llm_span.record_usage(response)
+        return response.choices[0].message.content.strip().strip("'\".").lower()
+
+    def classify_many_with_llm(self, queries):
+        """Categories for ``queries`` from one structured-output call (None where the reply is unusable)."""
+        numbered = "\n".join(f"    {index}. {query}" for index, query in enumerate(queries, start=1))
+        with span("routing.llm", batch_size=len(queries)) as llm_span:
+            response = cached_chat_completion(
+                self.client,
+                model=self.model,
+                messages=[{"role": "user", "content": ROUTER_BATCH_PROMPT.format(queries=numbered)}],
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "routing",
+                        "strict": True,
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "categories": {"type": "array", "items": {"type": "string", "enum": self.categories}},
+                            },
+                            "required": ["categories"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+            )
+            llm_span.record_usage(response)
+        try:
+            categories = json.loads(response.choices[0].message.content)["categories"]
+        except (ValueError, KeyError, TypeError):
+            categories = []
+        if len(categories) != len(queries):
+            # A reply that does not line up with the queries cannot be trusted for any of them.
+            return [None] * len(queries)
+        return [str(category).strip().lower() for category in categories]
+
+    def _apply_llm(self, decision, llm_category):
+        # Keep the local answer if the model replies with something off-label.
+        if llm_category in self.categories:
+            decision["category"] = llm_category
+            decision["path"] = "llm"
+        else:
+            decision["path"] = "local (llm reply ignored)"
+
+    def route(self, query, query_embedding=None):
+        """Return the routing decision and which path (``local``/``llm``) produced it.
+
+        Pass ``query_embedding`` when the caller already embedded the query
+        (e.g. for retrieval) to skip a second embedding pass. Concurrent
+        callers that need the LLM share one micro-batched call.
+        """
+        with span("routing") as routing_span:
+            start_time = time.perf_counter()
+            decision = self.classify_locally(query, query_embedding)
+            decision["path"] = "local"
+
+            if decision["margin"] < self.min_margin and self.client is not None:
+                if self.batcher is not None:
+                    llm_category = self.batcher.submit(query).result()
+                else:
+                    llm_category = self.classify_with_llm(query)
+                self._apply_llm(decision, llm_category)
+
+            decision["latency_ms"] = (time.perf_counter() - start_time) * 1000
+            routing_span.set(category=decision["category"], path=decision["path"], margin=decision["margin"])
+        return decision
+
+    def route_many(self, queries, query_embeddings=None):
+        """Route a batch: local classification for all, one LLM call per ``max_batch`` ambiguous queries."""
+        with span("routing", batch_size=len(queries)) as routing_span:
+            start_time = time.perf_counter()
+            if query_embeddings is None:
+                query_embeddings = self.embedding_function(list(queries))
+            decisions = [
+                {**self.classify_locally(query, embedding), "path": "local"}
+                for query, embedding in zip(queries, query_embeddings)
+            ]
+
+            ambiguous = [index for index, decision in enumerate(decisions) if decision["margin"] < self.min_margin]
+            if ambiguous and self.client is not None:
+                for start in range(0, len(ambiguous), self.max_batch):
+                    chunk = ambiguous[start:start + self.max_batch]
+                    categories = self.classify_many_with_llm([queries[index] for index in chunk])
+                    for index, category in zip(chunk, categories):
+                        self._apply_llm(decisions[index], category)
+
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            for decision in decisions:
+                decision["latency_ms"] = latency_ms
+            routing_span.set(llm_routed=sum(1 for decision in decisions if decision["path"] == "llm"))
+        return decisions
@@ -0,0 +1,60 @@
+import os
+import weakref
+
+from deepeval.models import DeepEvalBaseLLM
+
+DEFAULT_JUDGE_MODEL = os.getenv("EVAL_JUDGE_MODEL", "gpt-4o")
+
+
+class PooledJudgeModel(DeepEvalBaseLLM):
+    """DeepEval judge that sends its calls through the process's pooled OpenAI clients.
+
+    DeepEval's built-in ``GPTModel`` opens its own OpenAI client, so judge
+    calls would bypass the shared rate limiter and retry policy. This model
+    uses ``resources.get_openai_client()`` for sync calls and one pooled
+    ``AsyncOpenAI`` per event loop for async ones. When DeepEval passes a
+    pydantic ``schema``, the reply is requested as JSON and validated into it.
+    """
+
+    def __init__(self, model=DEFAULT_JUDGE_MODEL):
+        self.model_name = model
+        self._async_clients = weakref.WeakKeyDictionary()
+        super().__init__(model)
+
+    def load_model(self):
+        from resources import get_openai_client
+
+        return get_openai_client()
+
+    def get_model_name(self):
+        return self.model_name
+
+    def _request(self, prompt, schema):
+        request = {"model": self.model_name, "messages": [{"role": "user", "content": prompt}]}
+        if schema is not None:
+            request["response_format"] = {"type": "json_object"}
+        return request
+
+    @staticmethod
+    def _parse(completion, schema):
+        content = completion.choices[0].message.content
+        return schema.model_validate_json(content) if schema is not None else content
+
+    def generate(self, prompt, schema=None):
+        return self._parse(self.load_model().chat.completions.create(**self._request(prompt, schema)), schema)
+
+    def _async_client(self):
+        import asyncio
+
+        from resources import create_async_openai_client
+
+        # An AsyncOpenAI's connection pool is bound to the loop it first ran on.
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = create_async_openai_client()
+        return client
+
+    async def a_generate(self, prompt, schema=None):
+        completion = await self._async_client().chat.completions.create(**self._request(prompt, schema))
+        return self._parse(completion, schema)
@@ -0,0 +1,182 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./data/bm25_index.json")
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Terms in more than this share of the documents ("rule", "must", ...) carry
+# almost no IDF; skipping them avoids walking near-complete posting lists.
+LEXICAL_MAX_DF = float(os.getenv("LEXICAL_MAX_DF", "0.5"))
+
+# Keeps exact identifiers such as "sha-256", "200ms" or "http/1.1" as single terms.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a about all an and any are as at be been but by can could do does for from has have how i if in into is it its
+may must need no not of on or our should so than that the their them then there these they this to use was we
+what when where which while who will with without would you your
+""".split())
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over the rule documents.
+
+    Mirrors ``engineering_docs`` (same ids, documents and metadata) and is
+    persisted as JSON next to the Chroma store; postings are rebuilt on load.
+    ``refresh()`` reloads it when another process (e.g. ``1_ingest.py``) has
+    rewritten the file.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self.documents = {}
+        self._postings = {}
+        self._lengths = {}
+        self._total_length = 0
+        self._mtime = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def upsert(self, ids, documents, metadatas):
+        with self._lock:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                self._remove(doc_id)
+                terms = Counter(tokenize(document))
+                for term, count in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = count
+                self.documents[doc_id] = (document, dict(metadata or {}))
+                self._lengths[doc_id] = sum(terms.values())
+                self._total_length += self._lengths[doc_id]
+
+    def delete(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        if doc_id not in self.documents:
+            return
+        for term in set(tokenize(self.documents.pop(doc_id)[0])):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def _idf(self, term):
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.documents) - df + 0.5) / (df + 0.5))
+
+    def search(self, query, k=10, category=None, max_df=LEXICAL_MAX_DF):
+        """Top-``k`` ``(doc_id, score, coverage, matched_terms)`` hits, best first.
+
+        ``coverage`` is the IDF-weighted share of the query's terms that the
+        document contains, i.e. how completely it matches the query. Terms
+        the index has never seen count as missed, weighted at the maximum
+        IDF. Stopwords and terms in more than ``max_df`` of the documents
+        are ignored for both scoring and coverage.
+        """
+        with self._lock:
+            if not self.documents:
+                return []
+            document_count = len(self.documents)
+            max_idf = math.log(1 + (document_count + 0.5) / 0.5)
+            terms = []
+            unknown_idf = 0.0
+            for term in dict.fromkeys(tokenize(query)):
+                if term in STOPWORDS:
+                    continue
+                df = len(self._postings.get(term, ()))
+                if not df:
+                    unknown_idf += max_idf
+                elif df <= max_df * document_count:
+                    terms.append(term)
+            if not terms:
+                return []
+
+            # Rarest terms first (MaxScore): once the remaining terms together
+            # cannot lift a new document into the top k, they only update
+            # documents that are already candidates.
+            idf = {term: self._idf(term) for term in terms}
+            terms.sort(key=idf.get, reverse=True)
+            remaining_bound = [0.0] * (len(terms) + 1)
+            for position in range(len(terms) - 1, -1, -1):
+                remaining_bound[position] = remaining_bound[position + 1] + idf[terms[position]] * (BM25_K1 + 1)
+
+            average_length = self._total_length / document_count
+            scores = {}
+            matched_idf = {}
+            matched_terms = Counter()
+            for position, term in enumerate(terms):
+                postings = self._postings[term]
+                admit_new = len(scores) < k or remaining_bound[position] > heapq.nlargest(k, scores.values())[-1]
+                if admit_new:
+                    entries = postings.items()
+                elif len(postings) < len(scores):
+                    entries = [(doc_id, frequency) for doc_id, frequency in postings.items() if doc_id in scores]
+                else:
+                    entries = [(doc_id, postings[doc_id]) for doc_id in scores if doc_id in postings]
+                for doc_id, frequency in entries:
+                    if admit_new and doc_id not in scores:
+                        if category is not None and self.documents[doc_id][1].get("category") != category:
+                            continue
+                        scores[doc_id] = matched_idf[doc_id] = 0.0
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / average_length)
+                    scores[doc_id] += idf[term] * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    matched_idf[doc_id] += idf[term]
+                    matched_terms[doc_id] += 1
+
+            total_idf = sum(idf.values()) + unknown_idf
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [
+                (doc_id, score, matched_idf[doc_id] / total_idf, matched_terms[doc_id])
+                for doc_id, score in best
+            ]
+
+    def save(self):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix(".tmp")
+            with temporary.open("w", encoding="utf-8") as handle:
+                json.dump({doc_id: list(entry) for doc_id, entry in self.documents.items()}, handle)
+            os.replace(temporary, self.path)
+            self._mtime = self.path.stat().st_mtime
+
+    def refresh(self):
+        """Reload from disk if the file changed since it was last loaded or saved."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            with self.path.open(encoding="utf-8") as handle:
+                stored = json.load(handle)
+            self.documents, self._postings, self._lengths, self._total_length = {}, {}, {}, 0
+            self.upsert(list(stored), [entry[0] for entry in stored.values()], [entry[1] for entry in stored.values()])
+            self._mtime = mtime
+            return True
+
+    @classmethod
+    def load_or_build(cls, collection, path=DEFAULT_INDEX_PATH):
+        """Load the persisted index, or build it from ``collection`` the first time."""
+        index = cls(path)
+        if not index.refresh():
+            stored = collection.get(include=["documents", "metadatas"])
+            index.upsert(stored["ids"], stored["documents"], stored["metadatas"])
+            index.save()
+        return index
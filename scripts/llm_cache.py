@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./data/llm_cache.sqlite")
+DEFAULT_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+DEFAULT_MAX_DISK_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_MAX_MEMORY_ENTRIES = 256
+CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "").lower() in {"1", "true", "yes"}
+
+
+def request_key(request):
+    """Hash of everything that influences the completion: model, messages, sampling params."""
+    payload = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier chat-completion cache: in-memory LRU in front of SQLite.
+
+    Entries older than ``ttl_seconds`` are treated as misses and purged; the
+    disk tier keeps at most ``max_disk_entries`` rows, evicting the least
+    recently used.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_memory_entries=DEFAULT_MAX_MEMORY_ENTRIES, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._db.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["memory_hits"] += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+            row = self._db.execute(
+                "SELECT payload, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                self.stats["misses"] += 1
+                return None
+
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            payload = json.loads(row[0])
+            self._remember(key, payload, row[1])
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            return payload
+
+    def set(self, key, payload):
+        now = time.time()
+        with self._lock:
+            self._remember(key, payload, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), now, now),
+            )
+            if self.ttl_seconds > 0:
+                self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+            self._db.commit()
+            self.stats["writes"] += 1
+
+    def _remember(self, key, payload, created_at):
+        self._memory[key] = (payload, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+def _cacheable(request, use_cache):
+    return use_cache and not CACHE_DISABLED and not request.get("stream")
+
+
+def _from_cache(payload):
+    # A cache hit implies a client already exists, so openai is imported by now.
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion.model_validate({**payload, "cache_hit": True})
+
+
+def is_cache_hit(response):
+    return bool(getattr(response, "cache_hit", False))
+
+
+def cached_response(request, use_cache=True, cache=None):
+    """The cached ``ChatCompletion`` for a (non-streamed) ``request``, or None on a miss or with caching off."""
+    if not _cacheable(request, use_cache):
+        return None
+    payload = (cache or get_default_cache()).get(request_key(request))
+    return _from_cache(payload) if payload is not None else None
+
+
+def remember_response(request, payload, use_cache=True, cache=None):
+    """Store ``payload`` (a ``ChatCompletion`` dump, e.g. assembled from a stream) as ``request``'s reply."""
+    if _cacheable(request, use_cache):
+        (cache or get_default_cache()).set(request_key(request), payload)
+
+
+def cached_chat_completion(client, use_cache=True, cache=None, **request):
+    """Drop-in for ``client.chat.completions.create(**request)`` backed by the response cache.
+
+    Pass ``use_cache=False`` to bypass the cache for a single call.
+    Streaming requests are not cached here; ``streaming.stream_chat_completion``
+    shares these entries.
+    """
+    if not _cacheable(request, use_cache):
+        return client.chat.completions.create(**request)
+
+    cache = cache or get_default_cache()
+    key = request_key(request)
+    payload = cache.get(key)
+    if payload is not None:
+        return _from_cache(payload)
+
+    response = client.chat.completions.create(**request)
+    cache.set(key, response.model_dump(mode="json"))
+    return response
+
+
+async def acached_chat_completion(async_client, use_cache=True, cache=None, **request):
+    """Async variant of :func:`cached_chat_completion` for ``AsyncOpenAI`` clients."""
+    if not _cacheable(request, use_cache):
+        return await async_client.chat.completions.create(**request)
+
+    cache = cache or get_default_cache()
+    key = request_key(request)
+    payload = cache.get(key)
+    if payload is not None:
+        return _from_cache(payload)
+
+    response = await async_client.chat.completions.create(**request)
+    cache.set(key, response.model_dump(mode="json"))
+    return response
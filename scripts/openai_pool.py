@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import httpx
+
+DEFAULT_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))  # 0 = unlimited
+DEFAULT_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "30000"))  # 0 = unlimited
+DEFAULT_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+DEFAULT_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_KEEPALIVE_CONNECTIONS", "32"))
+DEFAULT_KEEPALIVE_EXPIRY_S = 60.0
+DEFAULT_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "60"))
+
+# Completion tokens assumed for a request that sets no max_tokens.
+DEFAULT_COMPLETION_ESTIMATE = 512
+CHARS_PER_TOKEN = 4
+DEFAULT_RETRY_AFTER_S = 1.0
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units evenly over a minute; not thread-safe on its own."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Take ``amount`` now and return how long to wait until it is actually covered."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def clamp(self, remaining, now):
+        self._refill(now)
+        self.level = min(self.level, float(remaining))
+
+
+class RateLimiter:
+    """Client-side RPM and TPM budget shared by every OpenAI client in the process.
+
+    Each request reserves one request and its estimated tokens up front and
+    sleeps off any deficit. Responses feed back the server's view: the
+    ``x-ratelimit-remaining-*`` headers tighten the buckets, and a 429 pauses
+    every caller until its ``Retry-After`` has passed, so one rate-limited
+    request does not turn into a storm of them.
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM_LIMIT, tpm=DEFAULT_TPM_LIMIT):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.stats = {"requests": 0, "throttled": 0, "wait_s": 0.0, "rate_limited": 0}
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_tokens):
+        """Seconds the caller must wait before sending a request of ``estimated_tokens``."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None and estimated_tokens:
+                wait = max(wait, self.tokens.reserve(estimated_tokens, now))
+            self.stats["requests"] += 1
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["wait_s"] += wait
+            return wait
+
+    def acquire(self, estimated_tokens):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, estimated_tokens):
+        wait = self.reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Refund (or charge) the difference between a request's estimated and reported tokens."""
+        if self.tokens is None or actual_tokens is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens._refill(now)
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated_tokens - actual_tokens)
+
+    def observe(self, response):
+        """Sync the buckets with the rate-limit headers of ``response``."""
+        headers = response.headers
+        with self._lock:
+            now = time.monotonic()
+            if response.status_code == 429:
+                self.stats["rate_limited"] += 1
+                self.paused_until = max(self.paused_until, now + retry_after_seconds(headers))
+            for bucket, header in ((self.requests, "x-ratelimit-remaining-requests"),
+                                   (self.tokens, "x-ratelimit-remaining-tokens")):
+                if bucket is not None and headers.get(header, "").isdigit():
+                    bucket.clamp(int(headers[header]), now)
+
+
+def retry_after_seconds(headers):
+    """Delay requested by ``retry-after-ms`` / ``retry-after``, or a 1s default."""
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return max(0.0, float(headers[header]) * scale)
+        except (KeyError, ValueError):
+            continue
+    return DEFAULT_RETRY_AFTER_S
+
+
+def _chat_body(request):
+    """The JSON body of a chat-completions request, or None for anything else."""
+    if request.method != "POST" or not request.content:
+        return None
+    try:
+        body = json.loads(request.content)
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) and "messages" in body else None
+
+
+def estimate_request_tokens(request):
+    """Rough prompt + completion tokens of a chat request (0 for anything else)."""
+    body = _chat_body(request)
+    if body is None:
+        return 0
+    prompt_chars = sum(len(str(message.get("content") or "")) for message in body["messages"])
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or DEFAULT_COMPLETION_ESTIMATE
+    return prompt_chars // CHARS_PER_TOKEN + completion
+
+
+def _settles_from_body(request, response):
+    # Streamed bodies are left alone (reading them here would defeat
+    # streaming); the rate-limit headers still correct the buckets.
+    body = _chat_body(request)
+    return body is not None and not body.get("stream") and response.status_code == 200
+
+
+def response_tokens(response):
+    """``usage.total_tokens`` of a read chat-completion response, or None."""
+    try:
+        usage = json.loads(response.content).get("usage") or {}
+    except (ValueError, AttributeError):
+        return None
+    return usage.get("total_tokens")
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    def __init__(self, limiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def handle_request(self, request):
+        estimated_tokens = estimate_request_tokens(request)
+        self.limiter.acquire(estimated_tokens)
+        response = super().handle_request(request)
+        self.limiter.observe(response)
+        if estimated_tokens and _settles_from_body(request, response):
+            response.read()
+            self.limiter.settle(estimated_tokens, response_tokens(response))
+        return response
+
+
+class AsyncRateLimitedTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, limiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    async def handle_async_request(self, request):
+        estimated_tokens = estimate_request_tokens(request)
+        await self.limiter.aacquire(estimated_tokens)
+        response = await super().handle_async_request(request)
+        self.limiter.observe(response)
+        if estimated_tokens and _settles_from_body(request, response):
+            await response.aread()
+            self.limiter.settle(estimated_tokens, response_tokens(response))
+        return response
+
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections=DEFAULT_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY_S,
+    )
+
+
+def create_openai_client(api_key, limiter=None, max_retries=DEFAULT_MAX_RETRIES):
+    """``OpenAI`` client on a keep-alive pool, throttled by ``limiter``.
+
+    429s and 5xx responses are retried by the SDK with jittered exponential
+    backoff that honors ``Retry-After``; every attempt passes the limiter again.
+    """
+    from openai import DefaultHttpxClient, OpenAI
+
+    transport = RateLimitedTransport(limiter or RateLimiter(), limits=_pool_limits())
+    return OpenAI(
+        api_key=api_key,
+        max_retries=max_retries,
+        timeout=DEFAULT_TIMEOUT_S,
+        http_client=DefaultHttpxClient(transport=transport),
+    )
+
+
+def create_async_openai_client(api_key, limiter=None, max_retries=DEFAULT_MAX_RETRIES):
+    """Async counterpart of :func:`create_openai_client`."""
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    transport = AsyncRateLimitedTransport(limiter or RateLimiter(), limits=_pool_limits())
+    return AsyncOpenAI(
+        api_key=api_key,
+        max_retries=max_retries,
+        timeout=DEFAULT_TIMEOUT_S,
+        http_client=DefaultAsyncHttpxClient(transport=transport),
+    )
@@ -0,0 +1,424 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+
+DEFAULT_PARTITIONING = os.getenv("INDEX_PARTITIONING", "auto")  # "auto", "category" or "none"
+PARTITION_SEPARATOR = "__"
+REBUILD_SUFFIX = "-rebuild"
+PAGE_SIZE = 5000
+DEFAULT_HNSW_PARAMS = {"M": 16, "ef_construction": 100, "ef_search": 64}
+HNSW_METADATA_KEYS = {"M": "hnsw:M", "ef_construction": "hnsw:construction_ef", "ef_search": "hnsw:search_ef"}
+
+
+def parse_hnsw_params(value):
+    """``'{"*": {"M": 16}, "security": {"ef_search": 128}}'`` -> per-category overrides (``*`` = all)."""
+    return json.loads(value) if value else {}
+
+
+HNSW_PARAMS = parse_hnsw_params(os.getenv("INDEX_HNSW_PARAMS"))
+
+
+def hnsw_params(category):
+    """HNSW parameters a new partition for ``category`` is created with."""
+    return {**DEFAULT_HNSW_PARAMS, **HNSW_PARAMS.get("*", {}), **HNSW_PARAMS.get(category, {})}
+
+
+def hnsw_metadata(params):
+    return {HNSW_METADATA_KEYS[key]: int(value) for key, value in params.items()}
+
+
+def params_from_metadata(metadata):
+    metadata = metadata or {}
+    return {key: metadata[name] for key, name in HNSW_METADATA_KEYS.items() if name in metadata}
+
+
+def _slug(category):
+    return re.sub(r"[^a-z0-9_-]+", "-", category.lower()).strip("-_") or "uncategorized"
+
+
+def partition_name(base, category):
+    # Chroma names allow [a-zA-Z0-9._-] and at most 63 characters; the
+    # category itself is kept verbatim in the partition's metadata. The
+    # hash of the verbatim category keeps "Security" and "security", or two
+    # long categories with a common prefix, in separate collections.
+    digest = hashlib.sha256(category.encode("utf-8")).hexdigest()[:8]
+    prefix = f"{base}{PARTITION_SEPARATOR}{_slug(category)}"[:63 - len(REBUILD_SUFFIX) - len(digest) - 1]
+    return f"{prefix}-{digest}"
+
+
+def legacy_partition_name(base, category):
+    """The name partitions were created under before names carried a category hash."""
+    return f"{base}{PARTITION_SEPARATOR}{_slug(category)}"[:63 - len(REBUILD_SUFFIX)]
+
+
+def _collection_names(client):
+    # Chroma 0.6 returns names, earlier versions Collection objects.
+    return [getattr(item, "name", item) for item in client.list_collections()]
+
+
+def _category_filter(where):
+    """The category a ``where`` clause pins the query to, or None."""
+    if where and set(where) == {"category"} and isinstance(where["category"], str):
+        return where["category"]
+    return None
+
+
+def _is_missing_collection(error):
+    # Chroma raises InvalidCollectionException (0.5/0.6), NotFoundError (1.x)
+    # or, before that, a ValueError for a handle whose collection was deleted.
+    return (type(error).__name__ in {"InvalidCollectionException", "NotFoundError"}
+            or "does not exist" in str(error))
+
+
+def _refreshing(method):
+    """Retry ``method`` once with fresh partition handles if a partition was swapped out under it."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as error:
+            if not _is_missing_collection(error):
+                raise
+        self.refresh()
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class PartitionedCollection:
+    """One Chroma collection per category behind the ``Collection`` calls the repo uses.
+
+    ``query(where={"category": c})``, which is what ``RetrievalService``
+    sends for the router's category, searches only that category's HNSW
+    index instead of filtering a shared one. Any other ``where`` fans out to
+    every partition and merges by distance. ``upsert`` writes each record
+    to its category's partition, creating it with :func:`hnsw_params`
+    (overridden by ``params`` when given), and drops the id from any
+    partition it was in before.
+
+    :func:`rebuild_partition` replaces a partition's collection. A call
+    that hits the deleted one re-reads the partition list and retries, and
+    between the old index being dropped and the new one taking its name,
+    the rebuilt copy is served, so running apps need no reload.
+    """
+
+    def __init__(self, client, name, embedding_function=None, params=None):
+        self.client = client
+        self.name = name
+        self.embedding_function = embedding_function
+        self.params = params or {}
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the partition list, e.g. after another process added or rebuilt one."""
+        partitions, legacy, rebuilt = {}, {}, {}
+        for name in _collection_names(self.client):
+            if not name.startswith(self.name + PARTITION_SEPARATOR):
+                continue
+            try:
+                collection = self.client.get_collection(name=name, embedding_function=self.embedding_function)
+            except Exception as error:
+                if not _is_missing_collection(error):
+                    raise
+                continue  # Dropped by a rebuild since it was listed.
+            category = (collection.metadata or {}).get("category")
+            if category is None:
+                continue
+            if partition_name(self.name, category) == name:
+                partitions[category] = collection
+            elif partition_name(self.name, category) + REBUILD_SUFFIX == name:
+                rebuilt[category] = collection
+            elif legacy_partition_name(self.name, category) == name:
+                legacy[category] = collection
+        # Partitions created before names were hashed keep serving until rebuilt.
+        # A rebuild copy stands in only while the partition itself is gone
+        # (mid-swap, or an interrupted rebuild the next one will finish).
+        for fallback in (legacy, rebuilt):
+            for category, collection in fallback.items():
+                partitions.setdefault(category, collection)
+        with self._lock:
+            self._partitions = partitions
+
+    @property
+    def categories(self):
+        with self._lock:
+            return sorted(self._partitions)
+
+    def partition(self, category, create=False):
+        with self._lock:
+            collection = self._partitions.get(category)
+        if collection is not None:
+            return collection
+        name = partition_name(self.name, category)
+        names = _collection_names(self.client)
+        if name in names:
+            # Created by another process since the last refresh.
+            collection = self.client.get_collection(name=name, embedding_function=self.embedding_function)
+        else:
+            collection = self._legacy_partition(category, names)
+        if collection is None:
+            if not create:
+                return None
+            collection = self.client.get_or_create_collection(
+                name=name,
+                embedding_function=self.embedding_function,
+                metadata={
+                    "partition_of": self.name,
+                    "category": category,
+                    **hnsw_metadata({**hnsw_params(category), **self.params}),
+                },
+            )
+        with self._lock:
+            self._partitions[category] = collection
+        return collection
+
+    def _legacy_partition(self, category, names):
+        """``category``'s partition under its pre-hash name, if it has one."""
+        legacy_name = legacy_partition_name(self.name, category)
+        if legacy_name not in names:
+            return None
+        collection = self.client.get_collection(name=legacy_name, embedding_function=self.embedding_function)
+        # Under the old scheme, colliding categories shared a name; it belongs to the one in its metadata.
+        return collection if (collection.metadata or {}).get("category") == category else None
+
+    def _all(self):
+        with self._lock:
+            return list(self._partitions.values())
+
+    @_refreshing
+    def count(self):
+        return sum(collection.count() for collection in self._all())
+
+    @_refreshing
+    def upsert(self, ids, documents, metadatas, embeddings=None, previous_categories=None):
+        """Write each record to its category's partition.
+
+        ``previous_categories`` maps ids that are already stored to their
+        stored category (ids missing from it are new). When given, only
+        records whose category changed are deleted from their old
+        partition; otherwise every other partition is checked for the ids.
+        """
+        groups = {}
+        for index, metadata in enumerate(metadatas):
+            category = (metadata or {}).get("category")
+            if not category:
+                raise ValueError(f"Record {ids[index]!r} has no 'category'; partitions are keyed by category")
+            groups.setdefault(category, []).append(index)
+
+        # A record whose category changed must leave its old partition.
+        if previous_categories is not None:
+            moved = {}
+            for category, indices in groups.items():
+                for index in indices:
+                    previous = previous_categories.get(ids[index])
+                    if previous is not None and previous != category:
+                        moved.setdefault(previous, []).append(ids[index])
+            for previous, moved_ids in moved.items():
+                collection = self.partition(previous)
+                if collection is not None:
+                    collection.delete(ids=moved_ids)
+        else:
+            with self._lock:
+                partitions = list(self._partitions.items())
+            for category, collection in partitions:
+                others = [ids[index] for other, indices in groups.items() if other != category for index in indices]
+                if others:
+                    stale = collection.get(ids=others, include=[])["ids"]
+                    if stale:
+                        collection.delete(ids=stale)
+
+        for category, indices in groups.items():
+            self.partition(category, create=True).upsert(
+                ids=[ids[index] for index in indices],
+                documents=[documents[index] for index in indices],
+                metadatas=[metadatas[index] for index in indices],
+                embeddings=[embeddings[index] for index in indices] if embeddings is not None else None,
+            )
+
+    @_refreshing
+    def delete(self, ids):
+        for collection in self._all():
+            collection.delete(ids=ids)
+
+    @_refreshing
+    def get(self, ids=None, where=None, include=("metadatas", "documents")):
+        include = list(include)
+        category = _category_filter(where)
+        if category is not None:
+            targets, where = [self.partition(category)], None
+        else:
+            targets = self._all()
+        result = {"ids": [], **{key: [] for key in include}}
+        for collection in targets:
+            if collection is None:
+                continue
+            part = collection.get(ids=ids, where=where, include=include)
+            result["ids"].extend(part["ids"])
+            for key in include:
+                result[key].extend(part[key] if part[key] is not None else [])
+        return result
+
+    @_refreshing
+    def query(self, query_embeddings, n_results=10, where=None, include=("metadatas", "documents", "distances")):
+        include = list(include)
+        category = _category_filter(where)
+        if category is not None:
+            collection = self.partition(category)
+            if collection is not None:
+                return collection.query(query_embeddings=query_embeddings, n_results=n_results, include=include)
+            return {"ids": [[] for _ in query_embeddings], **{key: [[] for _ in query_embeddings] for key in include}}
+
+        # No single category: search every partition and keep the closest overall.
+        fetch = list(dict.fromkeys([*include, "distances"]))
+        merged = [[] for _ in query_embeddings]
+        for collection in self._all():
+            part = collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where, include=fetch)
+            for row, row_ids in enumerate(part["ids"]):
+                for column, doc_id in enumerate(row_ids):
+                    merged[row].append((doc_id, {key: part[key][row][column] for key in fetch}))
+        result = {"ids": [], **{key: [] for key in include}}
+        for hits in merged:
+            hits = sorted(hits, key=lambda hit: hit[1]["distances"])[:n_results]
+            result["ids"].append([doc_id for doc_id, _ in hits])
+            for key in include:
+                result[key].append([values[key] for _, values in hits])
+        return result
+
+
+def open_collection(client, name, embedding_function=None, partitioning=DEFAULT_PARTITIONING, create=False):
+    """The rule index stored under ``name``: partitioned by category or one shared collection.
+
+    ``auto`` uses partitions when the store already has them or has no
+    rule index yet, and the single collection when only that exists, so
+    stores ingested before partitioning keep working until migrated.
+    """
+    if partitioning == "auto":
+        names = _collection_names(client)
+        partitioned = name not in names or any(other.startswith(name + PARTITION_SEPARATOR) for other in names)
+    else:
+        partitioned = partitioning == "category"
+    if partitioned:
+        return PartitionedCollection(client, name, embedding_function)
+    if create:
+        return client.get_or_create_collection(name=name, embedding_function=embedding_function)
+    return client.get_collection(name=name, embedding_function=embedding_function)
+
+
+def _copy(source, target, page_size=PAGE_SIZE):
+    """Copy every record with its stored embedding (nothing is re-embedded)."""
+    copied = 0
+    while True:
+        page = source.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=copied)
+        if not page["ids"]:
+            return copied
+        target.upsert(
+            ids=page["ids"],
+            documents=page["documents"],
+            metadatas=page["metadatas"],
+            embeddings=[[float(value) for value in vector] for vector in page["embeddings"]],
+        )
+        copied += len(page["ids"])
+
+
+def rebuild_partition(client, base, category, params=None, embedding_function=None, page_size=PAGE_SIZE):
+    """Rebuild ``category``'s HNSW index from scratch, optionally with new ``params``.
+
+    Records are copied into a fresh collection, which then replaces the
+    partition. This compacts away the deleted and overwritten entries HNSW
+    keeps, and is the only way to change ``M`` or ``ef_construction``. The
+    partition's current parameters are kept unless overridden. Readers in
+    running processes move to the new index by themselves (see
+    :class:`PartitionedCollection`). Writes made to the partition while it
+    is being rebuilt are lost, so stop ingestion first. Returns the number
+    of records copied.
+    """
+    name = partition_name(base, category)
+    temporary = name + REBUILD_SUFFIX
+    names = _collection_names(client)
+    # A partition created before names were hashed is moved to its new name here.
+    current, legacy_name = name, legacy_partition_name(base, category)
+    if name not in names and legacy_name in names:
+        legacy = client.get_collection(name=legacy_name, embedding_function=embedding_function)
+        if (legacy.metadata or {}).get("category") == category:
+            current = legacy_name
+    if temporary in names:
+        if current not in names:
+            # The previous rebuild stopped after dropping the old index: finish the swap.
+            client.get_collection(name=temporary, embedding_function=embedding_function).modify(name=name)
+            current = name
+        else:
+            client.delete_collection(name=temporary)
+
+    source = client.get_collection(name=current, embedding_function=embedding_function)
+    merged = {**params_from_metadata(source.metadata), **(params or {})}
+    metadata = {**(source.metadata or {}), **hnsw_metadata(merged)}
+    target = client.create_collection(name=temporary, embedding_function=embedding_function, metadata=metadata)
+    copied = _copy(source, target, page_size)
+    client.delete_collection(name=current)
+    target.modify(name=name)
+    return copied
+
+
+def migrate_collection(client, name, embedding_function=None, drop_source=False, page_size=PAGE_SIZE):
+    """Move a single shared collection into per-category partitions; returns the records moved."""
+    source = client.get_collection(name=name, embedding_function=embedding_function)
+    partitioned = PartitionedCollection(client, name, embedding_function)
+    moved = _copy(source, partitioned, page_size)
+    if drop_source:
+        client.delete_collection(name=name)
+    return moved
+
+
+def partition_stats(client, name, embedding_function=None):
+    """One row per partition: category, collection name, size and HNSW parameters."""
+    partitioned = PartitionedCollection(client, name, embedding_function)
+    rows = []
+    for category in partitioned.categories:
+        collection = partitioned.partition(category)
+        params = {**DEFAULT_HNSW_PARAMS, **params_from_metadata(collection.metadata)}
+        rows.append({"category": category, "collection": collection.name, "count": collection.count(), **params})
+    return rows
+
+
+def main() -> int:
+    from resources import COLLECTION_NAME, get_chroma_client, get_embedding_function
+
+    parser = argparse.ArgumentParser(description="Inspect, rebuild or migrate the per-category rule index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show each partition's size and HNSW parameters.")
+    rebuild = commands.add_parser("rebuild", help="Rebuild (and compact) partitions, optionally with new parameters.")
+    rebuild.add_argument("--category", action="append", help="Partition to rebuild (repeatable; default: all).")
+    rebuild.add_argument("--m", type=int, dest="M")
+    rebuild.add_argument("--ef-construction", type=int)
+    rebuild.add_argument("--ef-search", type=int)
+    migrate = commands.add_parser("migrate", help=f"Split the single '{COLLECTION_NAME}' collection by category.")
+    migrate.add_argument("--drop-source", action="store_true", help="Delete the single collection afterwards.")
+    args = parser.parse_args()
+
+    client = get_chroma_client()
+    embedding_function = get_embedding_function()
+    if args.command == "migrate":
+        moved = migrate_collection(client, COLLECTION_NAME, embedding_function, drop_source=args.drop_source)
+        print(f"✅ Moved {moved} records into per-category partitions of '{COLLECTION_NAME}'.")
+    elif args.command == "rebuild":
+        params = {key: getattr(args, key) for key in HNSW_METADATA_KEYS if getattr(args, key) is not None}
+        categories = args.category or PartitionedCollection(client, COLLECTION_NAME, embedding_function).categories
+        for category in categories:
+            copied = rebuild_partition(client, COLLECTION_NAME, category, params, embedding_function)
+            print(f"🔧 Rebuilt '{category}': {copied} records")
+        print("✅ Rebuild complete. Running apps switch to the rebuilt indexes on their next query.")
+
+    for row in partition_stats(client, COLLECTION_NAME, embedding_function):
+        print(f"   {row['category']:<20} {row['count']:>9} docs | M={row['M']} "
+              f"ef_construction={row['ef_construction']} ef_search={row['ef_search']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,297 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+ROOT_DIR = SCRIPTS_DIR.parent
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./data/chroma_db")
+COLLECTION_NAME = "engineering_docs"
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./data/bm25_index.json")
+LANGGRAPH_CHECKPOINT_PATH = os.getenv("LANGGRAPH_CHECKPOINT_PATH", "./data/langgraph_checkpoints.sqlite")
+PREFLIGHT_ENABLED = os.getenv("OPENAI_PREFLIGHT", "1").lower() not in {"0", "false", "no"}
+# A failed preflight is re-run once it is this old, so a transient failure does not stick.
+PREFLIGHT_RETRY_S = 30.0
+
+
+class ResourceRegistry:
+    """Process-wide cache of expensive objects (modules, clients, graphs, collections).
+
+    Each resource is built once by its factory on first ``get`` and reused
+    until ``invalidate`` drops it. Streamlit re-executes ``app.py`` on every
+    interaction, but imported modules survive, so resources held here do too.
+
+    Factories run outside the registry lock: a slow build only blocks
+    callers asking for that same name, who wait for its result instead of
+    building a second copy.
+
+    Objects keep the resources they were built from (the retrieval service
+    holds its collection and router, a loaded script module the functions
+    it imported), so dropping one name does not refresh its dependents.
+    Only ``invalidate()`` with no name, which also drops the script
+    modules so they are re-executed, is a supported reload. Dropping a
+    single name is meant for leaves nothing else holds, such as the
+    preflight check.
+    """
+
+    def __init__(self):
+        self._resources = {}
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, factory):
+        with self._lock:
+            if name in self._resources:
+                return self._resources[name]
+            build = self._building.get(name)
+            owner = build is None
+            if owner:
+                build = self._building[name] = Future()
+        if not owner:
+            return build.result()
+        try:
+            value = factory()
+        except BaseException as error:
+            with self._lock:
+                if self._building.get(name) is build:
+                    del self._building[name]
+            build.set_exception(error)
+            raise
+        with self._lock:
+            # An invalidate or override during the build wins; the stale value is not kept.
+            if self._building.get(name) is build:
+                del self._building[name]
+                self._resources[name] = value
+        build.set_result(value)
+        return value
+
+    def override(self, name, value):
+        """Install ``value`` as resource ``name`` (benchmarks swap in stubs this way)."""
+        with self._lock:
+            self._building.pop(name, None)
+            self._resources[name] = value
+
+    def peek(self, name, default=None):
+        """Return a resource if it has already been built, without building it."""
+        with self._lock:
+            return self._resources.get(name, default)
+
+    def invalidate(self, name=None):
+        """Drop one resource, or everything when ``name`` is None."""
+        with self._lock:
+            if name is None:
+                self._resources.clear()
+                self._building.clear()
+            else:
+                self._resources.pop(name, None)
+                self._building.pop(name, None)
+
+    def names(self):
+        with self._lock:
+            return sorted(self._resources)
+
+
+registry = ResourceRegistry()
+
+
+def load_api_key():
+    load_dotenv(ROOT_DIR / ".env")
+    api_key = (os.getenv("OPENAI_API_KEY") or "").strip().strip('"').strip("'")
+    if not api_key:
+        raise RuntimeError(
+            "OPENAI_API_KEY is missing. Set it in .env in the project root."
+        )
+    return api_key
+
+
+def _exec_script(script_filename, module_name):
+    script_path = SCRIPTS_DIR / script_filename
+    module_spec = spec_from_file_location(module_name, script_path)
+    if module_spec is None or module_spec.loader is None:
+        raise ImportError(f"Could not load module from {script_path}")
+    module = module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return module
+
+
+def load_script_module(script_filename, module_name=None):
+    """Execute a script (e.g. ``3_workflow.py``) once per process and return the module."""
+    module_name = module_name or Path(script_filename).stem
+    return registry.get(f"module:{script_filename}", lambda: _exec_script(script_filename, module_name))
+
+
+def get_rate_limiter():
+    """RPM/TPM limiter shared by every sync and async OpenAI client in the process."""
+    from openai_pool import RateLimiter
+
+    return registry.get("openai_rate_limiter", RateLimiter)
+
+
+def get_openai_client():
+    """The process-wide pooled, rate-limited, retrying ``OpenAI`` client."""
+    import openai_pool
+
+    return registry.get(
+        "openai_client", lambda: openai_pool.create_openai_client(load_api_key(), limiter=get_rate_limiter())
+    )
+
+
+def create_async_openai_client():
+    """A fresh pooled ``AsyncOpenAI`` client sharing the process-wide rate limiter.
+
+    Not registry-cached on purpose: its connection pool is bound to the event
+    loop it first runs on, and each ``asyncio.run`` starts a new loop.
+    """
+    import openai_pool
+
+    return openai_pool.create_async_openai_client(load_api_key(), limiter=get_rate_limiter())
+
+
+def get_judge_model():
+    """DeepEval judge model whose calls go through the pooled, rate-limited OpenAI clients."""
+    from judge_model import PooledJudgeModel
+
+    return registry.get("judge_model", PooledJudgeModel)
+
+
+def get_embedding_function():
+    """The embedding function shared by the Chroma collection and the intent router."""
+    from chromadb.utils import embedding_functions
+
+    return registry.get("embedding_function", embedding_functions.DefaultEmbeddingFunction)
+
+
+def get_chroma_client(path=None):
+    import chromadb
+
+    path = path or CHROMA_PATH
+    return registry.get(f"chroma_client:{path}", lambda: chromadb.PersistentClient(path=path))
+
+
+def get_collection(name=COLLECTION_NAME, path=None, create=False):
+    """The rule index: per-category partitions, or one shared collection (``INDEX_PARTITIONING``)."""
+    from partitioned_index import open_collection
+
+    path = path or CHROMA_PATH
+    return registry.get(
+        f"collection:{path}:{name}",
+        lambda: open_collection(get_chroma_client(path), name, get_embedding_function(), create=create),
+    )
+
+
+def get_router():
+    from intent_router import IntentRouter
+
+    return registry.get(
+        "intent_router",
+        lambda: IntentRouter(client=get_openai_client(), embedding_function=get_embedding_function()),
+    )
+
+
+def get_lexical_index(collection=None):
+    """BM25 index mirroring ``engineering_docs``; built from the collection if no index file exists yet."""
+    from lexical_index import LexicalIndex
+
+    return registry.get(
+        f"lexical_index:{LEXICAL_INDEX_PATH}",
+        lambda: LexicalIndex.load_or_build(collection or get_collection(), LEXICAL_INDEX_PATH),
+    )
+
+
+def get_retrieval_service():
+    from retrieval import RetrievalService
+
+    return registry.get(
+        "retrieval_service",
+        lambda: RetrievalService(
+            get_collection(), get_embedding_function(), router=get_router(), lexical_index=get_lexical_index()
+        ),
+    )
+
+
+def get_context_packer():
+    from context_packing import ContextPacker
+
+    return registry.get("context_packer", lambda: ContextPacker(get_collection()))
+
+
+def get_semantic_cache():
+    from semantic_cache import ANSWER_CACHE_COLLECTION, SemanticCache
+
+    def build():
+        collection = get_chroma_client().get_or_create_collection(
+            name=ANSWER_CACHE_COLLECTION,
+            embedding_function=get_embedding_function(),
+            metadata={"hnsw:space": "cosine"},
+        )
+        return SemanticCache(collection, get_embedding_function())
+
+    return registry.get("semantic_cache", build)
+
+
+def get_langgraph_checkpointer(path=None):
+    """SQLite checkpointer that persists LangGraph state after every node."""
+    import sqlite3
+
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    path = path or LANGGRAPH_CHECKPOINT_PATH
+
+    def build():
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Streamlit and the batch runner drive graphs from several threads.
+        return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
+    return registry.get(f"langgraph_checkpointer:{path}", build)
+
+
+def get_eval_worker_pool():
+    """Background DeepEval workers draining the evaluation queue, started once per process."""
+    from eval_queue import EvalWorkerPool
+
+    return registry.get("eval_worker_pool", lambda: EvalWorkerPool().start())
+
+
+def _launch_preflight():
+    future = Future()
+
+    def run():
+        try:
+            healthcheck = load_script_module("0_healthcheck.py")
+            result = healthcheck.check_openai_auth(get_openai_client())
+        except Exception as error:
+            result = (False, f"OpenAI health check failed: {error}")
+        future.finished_at = time.monotonic()
+        future.set_result(result)
+
+    threading.Thread(target=run, name="openai-preflight", daemon=True).start()
+    return future
+
+
+def start_preflight_check():
+    """Start the OpenAI auth check from ``0_healthcheck.py`` in the background, once per process.
+
+    Returns a future resolving to ``(ok, message)``, so callers can render
+    straight away and pick the result up when it is ready. A passing check
+    is kept for the life of the process; a failing one is re-run once it is
+    ``PREFLIGHT_RETRY_S`` old. With ``OPENAI_PREFLIGHT=0`` no request is
+    made and the future resolves to ``(True, ...)`` immediately.
+    """
+    if not PREFLIGHT_ENABLED:
+        future = Future()
+        future.set_result((True, "OpenAI preflight check disabled (OPENAI_PREFLIGHT=0)"))
+        return future
+    check = registry.peek("openai_preflight")
+    if (check is not None and check.done() and not check.result()[0]
+            and time.monotonic() - check.finished_at > PREFLIGHT_RETRY_S):
+        registry.invalidate("openai_preflight")
+    return registry.get("openai_preflight", _launch_preflight)
+
+
+def get_preflight_result():
+    """``(ok, message)`` from the OpenAI auth check, waiting for it if it is still running."""
+    return start_preflight_check().result()
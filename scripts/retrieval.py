@@ -0,0 +1,177 @@
+import os
+import threading
+from collections import OrderedDict
+
+from tracing import span
+
+DEFAULT_EMBEDDING_CACHE_SIZE = 4096
+# A lexical hit skips the vector search when it covers this IDF-weighted share
+# of the query's terms, matches at least LEXICAL_MIN_TERMS of them and
+# outscores the runner-up by LEXICAL_DOMINANCE.
+LEXICAL_MIN_COVERAGE = float(os.getenv("LEXICAL_MIN_COVERAGE", "0.8"))
+LEXICAL_MIN_TERMS = int(os.getenv("LEXICAL_MIN_TERMS", "2"))
+LEXICAL_DOMINANCE = float(os.getenv("LEXICAL_DOMINANCE", "2.0"))
+FUSION_CANDIDATES = 10
+RRF_K = 60
+
+
+class RetrievalService:
+    """Batched, category-filtered hybrid retrieval over ``engineering_docs``.
+
+    With a partitioned index (``partitioned_index.PartitionedCollection``)
+    the category filter selects that category's own HNSW index.
+
+    Each query is first looked up in the BM25 ``lexical_index``. A confident
+    exact-term match is returned straight away, with no embedding, routing
+    or ANN search. The remaining queries are embedded once (and remembered
+    in a small LRU), routed, and grouped by category. Each group is answered
+    with a single vectorized ``collection.query`` call, and its ranking is
+    fused with the lexical one by reciprocal rank fusion.
+    """
+
+    def __init__(self, collection, embedding_function, router=None,
+                 embedding_cache_size=DEFAULT_EMBEDDING_CACHE_SIZE, lexical_index=None,
+                 min_coverage=LEXICAL_MIN_COVERAGE, dominance=LEXICAL_DOMINANCE, min_terms=LEXICAL_MIN_TERMS):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.router = router
+        self.embedding_cache_size = embedding_cache_size
+        self.lexical_index = lexical_index
+        self.min_coverage = min_coverage
+        self.dominance = dominance
+        self.min_terms = min_terms
+        self._embeddings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_queries(self, queries):
+        """Embeddings for ``queries``; only texts not seen recently hit the model, in one batch."""
+        with self._lock:
+            vectors = {query: self._embeddings[query] for query in queries if query in self._embeddings}
+            for query in vectors:
+                self._embeddings.move_to_end(query)
+
+        missing = [query for query in dict.fromkeys(queries) if query not in vectors]
+        if missing:
+            for query, vector in zip(missing, self.embedding_function(missing)):
+                vectors[query] = [float(value) for value in vector]
+            with self._lock:
+                for query in missing:
+                    self._embeddings[query] = vectors[query]
+                while len(self._embeddings) > self.embedding_cache_size:
+                    self._embeddings.popitem(last=False)
+
+        return [vectors[query] for query in queries]
+
+    def _confident(self, hits):
+        if not hits:
+            return False
+        _, score, coverage, matched_terms = hits[0]
+        runner_up = hits[1][1] if len(hits) > 1 else 0.0
+        return coverage >= self.min_coverage and matched_terms >= self.min_terms and score >= self.dominance * runner_up
+
+    def _lexical_match(self, doc_id, score):
+        document, metadata = self.lexical_index.documents[doc_id]
+        return {"id": doc_id, "document": document, "metadata": metadata, "distance": None,
+                "score": score, "retrieval": "lexical"}
+
+    def _fuse(self, vector_matches, lexical_hits, k):
+        """Reciprocal rank fusion of the vector and lexical rankings."""
+        fused = {}
+        for rank, match in enumerate(vector_matches):
+            fused[match["id"]] = {**match, "score": 1.0 / (RRF_K + rank + 1), "retrieval": "vector"}
+        for rank, (doc_id, *_) in enumerate(lexical_hits):
+            if doc_id in fused:
+                fused[doc_id]["score"] += 1.0 / (RRF_K + rank + 1)
+                fused[doc_id]["retrieval"] = "hybrid"
+            else:
+                fused[doc_id] = self._lexical_match(doc_id, 1.0 / (RRF_K + rank + 1))
+        return sorted(fused.values(), key=lambda match: match["score"], reverse=True)[:k]
+
+    def retrieve_many(self, queries, categories=None, k=1):
+        """Top-``k`` rules per query, in input order.
+
+        ``categories`` may be given (one per query); otherwise each query is
+        routed with the intent router, reusing the embedding computed here,
+        unless a confident lexical hit decides the category first.
+        Each result is ``{"query", "category", "route_path", "matches"}`` where
+        ``matches`` holds ``{"id", "document", "metadata", "distance", "score",
+        "retrieval"}`` dicts; ``retrieval`` is ``lexical``, ``vector`` or
+        ``hybrid`` and ``distance`` is None for lexical-only matches.
+        """
+        queries = list(queries)
+        results = [None] * len(queries)
+        lexical_hits = [[] for _ in queries]
+
+        if self.lexical_index is not None:
+            self.lexical_index.refresh()
+            with span("retrieval.lexical", batch_size=len(queries)) as lexical_span:
+                for index, query in enumerate(queries):
+                    category = categories[index] if categories is not None else None
+                    lexical_hits[index] = self.lexical_index.search(query, max(k, FUSION_CANDIDATES), category)
+                    if not self._confident(lexical_hits[index]):
+                        continue
+                    top_category = self.lexical_index.documents[lexical_hits[index][0][0]][1].get("category")
+                    # The search was unfiltered when no category was given; keep only the
+                    # winner's category so callers packing k > 1 rules never mix categories.
+                    same_category = [
+                        (doc_id, score) for doc_id, score, *_ in lexical_hits[index]
+                        if category is not None
+                        or self.lexical_index.documents[doc_id][1].get("category") == top_category
+                    ]
+                    results[index] = {
+                        "query": query,
+                        "category": category or top_category,
+                        "route_path": "given" if categories is not None else "lexical",
+                        "matches": [self._lexical_match(doc_id, score) for doc_id, score in same_category[:k]],
+                    }
+                lexical_span.set(confident=sum(1 for result in results if result is not None))
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        embeddings = dict(zip(pending, self.embed_queries([queries[index] for index in pending])))
+
+        if categories is not None:
+            for index in pending:
+                results[index] = {"query": queries[index], "category": categories[index], "route_path": "given"}
+        else:
+            # Ambiguous queries share one batched LLM routing call.
+            decisions = self.router.route_many(
+                [queries[index] for index in pending], [embeddings[index] for index in pending]
+            )
+            for index, decision in zip(pending, decisions):
+                results[index] = {"query": queries[index], "category": decision["category"], "route_path": decision["path"]}
+
+        groups = {}
+        for index in pending:
+            groups.setdefault(results[index]["category"], []).append(index)
+
+        # Extra vector candidates only matter when there is a lexical ranking to fuse with.
+        n_results = max(k, FUSION_CANDIDATES) if self.lexical_index is not None else k
+        for category, indices in groups.items():
+            with span("retrieval", category=category, batch_size=len(indices), k=k):
+                response = self.collection.query(
+                    query_embeddings=[embeddings[index] for index in indices],
+                    n_results=n_results,
+                    where={"category": category},
+                    include=["documents", "metadatas", "distances"],
+                )
+            for row, index in enumerate(indices):
+                vector_matches = [
+                    {"id": doc_id, "document": document, "metadata": metadata or {}, "distance": distance}
+                    for doc_id, document, metadata, distance in zip(
+                        response["ids"][row],
+                        response["documents"][row],
+                        response["metadatas"][row],
+                        response["distances"][row],
+                    )
+                ]
+                hits = [
+                    hit for hit in lexical_hits[index]
+                    if self.lexical_index.documents[hit[0]][1].get("category") == category
+                ]
+                results[index]["matches"] = self._fuse(vector_matches, hits, k)
+        return results
+
+    def retrieve(self, query, category, k=1):
+        return self.retrieve_many([query], [category], k=k)[0]
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from tracing import span
+
+ANSWER_CACHE_COLLECTION = "answer_cache"
+DEFAULT_SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_DISABLED = os.getenv("SEMANTIC_CACHE_DISABLED", "").lower() in {"1", "true", "yes"}
+
+
+def variant(workflow, **options):
+    """Cache namespace for ``workflow`` run with ``options`` (e.g. ``multi_agent[drafts=3,speculative=True]``).
+
+    Runs whose options change the answer must not share cached answers.
+    """
+    if not options:
+        return workflow
+    return f"{workflow}[{','.join(f'{key}={value}' for key, value in sorted(options.items()))}]"
+
+
+class SemanticCache:
+    """Answer cache keyed by requirement similarity rather than exact text.
+
+    Past requirements live in their own Chroma collection (cosine space)
+    with the generated answer in metadata. A lookup returns the closest
+    entry for the same workflow and category if its similarity reaches
+    ``threshold``; near-paraphrases such as "MFA for admins" and "admin
+    accounts need MFA" then share one generation.
+    """
+
+    def __init__(self, collection, embedding_function, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.threshold = threshold
+        self.enabled = not SEMANTIC_CACHE_DISABLED
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _embedding(self, requirement, query_embedding):
+        if query_embedding is not None:
+            return [float(value) for value in query_embedding]
+        return [float(value) for value in self.embedding_function([requirement])[0]]
+
+    def lookup(self, workflow, requirement, category, query_embedding=None):
+        """Return ``{"answer", "similarity", "cached_requirement"}`` on a hit, else None."""
+        if not self.enabled:
+            return None
+
+        with span("semantic_cache.lookup", workflow=workflow, category=category) as lookup_span:
+            response = self.collection.query(
+                query_embeddings=[self._embedding(requirement, query_embedding)],
+                n_results=1,
+                where={"$and": [{"workflow": workflow}, {"category": category}]},
+                include=["documents", "metadatas", "distances"],
+            )
+            if not response["ids"] or not response["ids"][0]:
+                similarity = None
+            else:
+                similarity = 1.0 - response["distances"][0][0]
+            hit = similarity is not None and similarity >= self.threshold
+            lookup_span.set(hit=hit, similarity=similarity)
+
+        if not hit:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return {
+            "answer": json.loads(response["metadatas"][0][0]["answer"]),
+            "similarity": similarity,
+            "cached_requirement": response["documents"][0][0],
+        }
+
+    def store(self, workflow, requirement, category, answer, query_embedding=None):
+        """Remember ``answer`` (any JSON-serializable value) for this requirement."""
+        if not self.enabled:
+            return
+        entry_id = hashlib.sha256(f"{workflow}\n{category}\n{requirement}".encode("utf-8")).hexdigest()[:32]
+        self.collection.upsert(
+            ids=[entry_id],
+            documents=[requirement],
+            embeddings=[self._embedding(requirement, query_embedding)],
+            metadatas=[{
+                "workflow": workflow,
+                "category": category,
+                "answer": json.dumps(answer),
+                "created_at": time.time(),
+            }],
+        )
+        self._count("stores")
+
+    def get_or_compute(self, workflow, requirement, category, compute, query_embedding=None):
+        """Return ``(answer, hit)`` where ``hit`` is the :meth:`lookup` result or None.
+
+        ``compute()`` only runs on a miss, and its result is stored.
+        """
+        cached = self.lookup(workflow, requirement, category, query_embedding)
+        if cached is not None:
+            return cached["answer"], cached
+        answer = compute()
+        self.store(workflow, requirement, category, answer, query_embedding)
+        return answer, None
+
+    def invalidate(self, categories=None):
+        """Drop cached answers for ``categories`` (all entries when None).
+
+        Call this whenever rule documents in ``engineering_docs`` change so
+        plans generated from stale rules are never served.
+        """
+        if categories is None:
+            ids = self.collection.get(include=[])["ids"]
+        else:
+            categories = list(categories)
+            if not categories:
+                return 0
+            where = {"category": categories[0]} if len(categories) == 1 else {"category": {"$in": categories}}
+            ids = self.collection.get(where=where, include=[])["ids"]
+        if ids:
+            self.collection.delete(ids=ids)
+        self._count("invalidated", len(ids))
+        return len(ids)
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
@@ -0,0 +1,93 @@
+import time
+
+from llm_cache import cached_response, remember_response
+from tracing import span
+
+
+def stream_chat_completion(client, stats=None, stage="generation", use_cache=True, cache=None, **request):
+    """Yield completion text deltas as they arrive from ``client``.
+
+    ``stats`` (a dict, if given) is filled in while streaming with
+    ``ttft_s`` (time to first token), ``total_s``, ``prompt_tokens``,
+    ``completion_tokens``, ``tokens_per_sec`` and ``cache_hit``. Token
+    counts come from the final usage chunk; if the server omits it, content
+    chunks are counted. The same numbers are recorded on a ``stage``
+    tracing span.
+
+    Streams share the response cache with ``cached_chat_completion``: a hit
+    is replayed as a single chunk (spending no tokens), and a stream read to
+    the end is stored as the completion it assembled. ``use_cache=False``
+    bypasses the cache.
+    """
+    stats = {} if stats is None else stats
+    with span(stage, model=request.get("model"), streamed=True) as stream_span:
+        start_time = time.perf_counter()
+        response = cached_response(request, use_cache, cache)
+        if response is not None:
+            stream_span.record_usage(response)
+            stats.update({
+                "ttft_s": time.perf_counter() - start_time,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "tokens_per_sec": None,
+                "cache_hit": True,
+            })
+            yield response.choices[0].message.content
+            stats["total_s"] = time.perf_counter() - start_time
+            stream_span.set(**stats)
+            return
+
+        completion = yield from _stream(client, stats, request)
+        stats["cache_hit"] = False
+        stream_span.set(cache="miss" if use_cache else "bypass", **stats)
+        if completion.get("id"):  # An empty stream has nothing worth replaying.
+            remember_response(request, completion, use_cache, cache)
+
+
+def _stream(client, stats, request):
+    """Yield deltas, filling ``stats``; returns the assembled ``ChatCompletion`` payload."""
+    start_time = time.perf_counter()
+    chunk_count = 0
+    usage = None
+    chunks = []
+    finish_reason = "stop"
+    base = {}
+
+    stream = client.chat.completions.create(
+        stream=True, stream_options={"include_usage": True}, **request
+    )
+    for chunk in stream:
+        base = base or {"id": chunk.id, "created": chunk.created, "model": chunk.model}
+        if chunk.usage is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if chunk_count == 0:
+                stats["ttft_s"] = time.perf_counter() - start_time
+            chunk_count += 1
+            chunks.append(delta)
+            yield delta
+
+    total_s = time.perf_counter() - start_time
+    completion_tokens = usage.completion_tokens if usage else chunk_count
+    generation_s = total_s - stats.get("ttft_s", 0.0)
+    stats.update({
+        "total_s": total_s,
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        "completion_tokens": completion_tokens,
+        "tokens_per_sec": completion_tokens / generation_s if generation_s > 0 else None,
+    })
+    return {
+        **base,
+        "object": "chat.completion",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(chunks)},
+            "finish_reason": finish_reason,
+            "logprobs": None,
+        }],
+        "usage": usage.model_dump(mode="json") if usage else None,
+    }
@@ -1,22 +1,21 @@
-from importlib.util import module_from_spec, spec_from_file_location
-from pathlib import Path
+import argparse
+import asyncio
+import json
+import time
 
-from deepeval.metrics import FaithfulnessMetric
-from deepeval.test_case import LLMTestCase
 from dotenv import load_dotenv
 
+from eval_queue import get_default_queue
+from eval_store import ameasure, reuse_summary
+from resources import create_async_openai_client, get_judge_model, load_script_module
+from tracing import span, trace
 
-def _load_run_integrated_workflow():
-    workflow_file = Path(__file__).with_name("3_workflow.py")
-    module_spec = spec_from_file_location("workflow_module", workflow_file)
-    if module_spec is None or module_spec.loader is None:
-        raise ImportError(f"Could not load workflow module from {workflow_file}")
-    workflow_module = module_from_spec(module_spec)
-    module_spec.loader.exec_module(workflow_module)
-    return workflow_module.run_integrated_workflow
+DEFAULT_CONCURRENCY = 8
 
-
-run_integrated_workflow = _load_run_integrated_workflow()
+# Shared with app.py through the resource registry: 3_workflow.py is executed once per process.
+# It builds its clients on first use, so this import stays cheap.
+workflow_module = load_script_module("3_workflow.py", "workflow_module")
+run_integrated_workflow = workflow_module.run_integrated_workflow
 
 load_dotenv()
 
@@ -36,41 +35,183 @@ test_scenarios = [
     }
 ]
 
-def run_batch_test():
-    results = []
-    metric = FaithfulnessMetric(threshold=0.7)
-    
-    print(f"🧪 Starting Batch Test for {len(test_scenarios)} scenarios...\n")
-
-    for i, scenario in enumerate(test_scenarios):
-        print(f"Running Test {i+1}: {scenario['input']}")
-        
-        # Execute your actual workflow
-        actual_output = run_integrated_workflow(scenario['input'])
-        
-        # Create a Test Case for Evaluation
-        # In a real batch, you'd pull the actual context retrieved by the workflow
-        test_case = LLMTestCase(
-            input=scenario['input'],
-            actual_output=actual_output,
-            retrieval_context=["Standard: Use SHA-256 for encryption and 200ms for API timeouts."] 
-        )
-        
-        metric.measure(test_case)
-        
-        results.append({
-            "input": scenario['input'],
-            "score": metric.score,
-            "passed": metric.is_successful()
-        })
+
+def load_scenarios(path):
+    """Read scenarios from a JSONL file with one ``{"input", "expected_category"}`` object per line."""
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def _route_and_retrieve_each(queries):
+    """Batched routing and retrieval, falling back to one query at a time if the batch fails.
+
+    A query that still fails gets ``{"error": ...}`` instead of a retrieval,
+    which its scenario then reports as its own error row.
+    """
+    try:
+        return workflow_module.route_and_retrieve(queries)
+    except Exception as error:
+        print(f"⚠️ Batched routing/retrieval failed ({error}); retrying each scenario on its own.")
+    retrievals = []
+    for query in queries:
+        try:
+            retrievals.append(workflow_module.route_and_retrieve([query])[0])
+        except Exception as error:
+            retrievals.append({"error": f"routing/retrieval failed: {error}"})
+    return retrievals
+
+
+async def _run_scenario(scenario, retrieval, semaphore, async_client, evaluate, use_store, defer_evaluation):
+    async with semaphore:
+        # A sync context manager: each gathered scenario runs in its own task, so its trace id stays its own.
+        with trace():
+            start_time = time.perf_counter()
+            try:
+                if "error" in retrieval:
+                    raise RuntimeError(retrieval["error"])
+                workflow_result = await workflow_module.arun_integrated_workflow(
+                    scenario['input'], async_client, retrieval=retrieval
+                )
+                if not evaluate or defer_evaluation:
+                    job_id = None
+                    if evaluate:
+                        # Judged later by the background workers (scripts/eval_queue.py).
+                        job_id = await asyncio.to_thread(
+                            get_default_queue().enqueue,
+                            "batch_test",
+                            workflow_result["category"],
+                            scenario['input'],
+                            workflow_result["context"],
+                            workflow_result["output"],
+                            ["generation_honesty"],
+                        )
+                    return {
+                        "input": scenario['input'],
+                        "category": workflow_result["category"],
+                        "expected_category": scenario.get("expected_category"),
+                        "score": None,
+                        "passed": None,
+                        "reason": None,
+                        "reused": None,
+                        "eval_job_id": job_id,
+                        "latency_s": round(time.perf_counter() - start_time, 2),
+                        "error": None,
+                    }
+
+                from deepeval.metrics import FaithfulnessMetric
+                from deepeval.test_case import LLMTestCase
+
+                # Each task gets its own metric: a shared instance would race on .score/.reason.
+                metric = FaithfulnessMetric(threshold=0.7, async_mode=True, model=get_judge_model())
+                test_case = LLMTestCase(
+                    input=scenario['input'],
+                    actual_output=workflow_result["output"],
+                    retrieval_context=[workflow_result["context"]]
+                )
+                # Unchanged (input, output, context) triples reuse the stored score instead of re-judging.
+                with span("metric.faithfulness", metric="FaithfulnessMetric") as metric_span:
+                    evaluation = await ameasure(metric, test_case, use_store=use_store)
+                    metric_span.set(
+                        score=evaluation["score"],
+                        reused=evaluation["reused"],
+                        evaluation_cost=None if evaluation["reused"] else getattr(metric, "evaluation_cost", None),
+                    )
+
+                return {
+                    "input": scenario['input'],
+                    "category": workflow_result["category"],
+                    "expected_category": scenario.get("expected_category"),
+                    "score": evaluation["score"],
+                    "passed": evaluation["success"],
+                    "reason": evaluation["reason"],
+                    "reused": evaluation["reused"],
+                    "eval_job_id": None,
+                    "latency_s": round(time.perf_counter() - start_time, 2),
+                    "error": None,
+                }
+            except Exception as error:
+                return {
+                    "input": scenario['input'],
+                    "category": None,
+                    "expected_category": scenario.get("expected_category"),
+                    "score": None,
+                    "passed": False,
+                    "reason": None,
+                    "reused": None,
+                    "eval_job_id": None,
+                    "latency_s": round(time.perf_counter() - start_time, 2),
+                    "error": str(error),
+                }
+
+
+async def run_batch_test_async(scenarios=None, concurrency=DEFAULT_CONCURRENCY, evaluate=True, use_store=True,
+                               defer_evaluation=False):
+    """Run every scenario through the workflow; ``evaluate=False`` skips the judge (used by benchmarks).
+
+    With ``use_store``, scenarios whose output and context are unchanged since
+    a previous run reuse the stored faithfulness result. ``defer_evaluation``
+    enqueues every output for the background evaluation workers instead of
+    judging inline; rows then carry ``eval_job_id``.
+    """
+    scenarios = test_scenarios if scenarios is None else scenarios
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    print(f"🧪 Starting Batch Test for {len(scenarios)} scenarios (concurrency={concurrency})...\n")
+    start_time = time.perf_counter()
+    # Route and retrieve the whole batch up front: one embedding pass and one
+    # collection.query per category instead of one of each per scenario.
+    # A failure there is reported per scenario rather than aborting the run.
+    retrievals = await asyncio.to_thread(_route_and_retrieve_each, [scenario['input'] for scenario in scenarios])
+    # gather() preserves input order regardless of completion order.
+    async with create_async_openai_client() as async_client:
+        results = await asyncio.gather(*(
+            _run_scenario(scenario, retrieval, semaphore, async_client, evaluate, use_store, defer_evaluation)
+            for scenario, retrieval in zip(scenarios, retrievals)
+        ))
+    elapsed = time.perf_counter() - start_time
 
     # --- FINAL REPORT ---
     print("\n📊 --- BATCH TEST REPORT ---")
     for res in results:
-        status = "✅ PASS" if res['passed'] else "❌ FAIL"
-        print(f"{status} | Score: {res['score']} | Query: {res['input']}")
+        status = "⏭️ SKIP" if res['passed'] is None and not res['error'] else ("✅ PASS" if res['passed'] else "❌ FAIL")
+        detail = f"Error: {res['error']}" if res['error'] else f"Score: {res['score']}"
+        print(f"{status} | {detail} | Query: {res['input']}")
+
+    passed = sum(1 for res in results if res['passed'])
+    errors = sum(1 for res in results if res['error'])
+    failed = sum(1 for res in results if res['passed'] is False and not res['error'])
+    print(
+        f"\n⏱️ {len(results)} scenarios in {elapsed:.1f}s "
+        f"({len(results) / elapsed if elapsed else 0:.2f} scenarios/s) | "
+        f"passed {passed}, failed {failed}, errors {errors}"
+    )
+    if evaluate and defer_evaluation:
+        print(f"📨 {sum(1 for res in results if res['eval_job_id'])} outputs queued for background evaluation")
+    elif evaluate:
+        print(f"♻️ Evaluations: {reuse_summary([res['reused'] for res in results if res['reused'] is not None])}")
 
     return results
 
+
+def run_batch_test(scenarios=None, concurrency=DEFAULT_CONCURRENCY, evaluate=True, use_store=True,
+                   defer_evaluation=False):
+    return asyncio.run(run_batch_test_async(scenarios, concurrency, evaluate, use_store, defer_evaluation))
+
+
 if __name__ == "__main__":
-    run_batch_test()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the batch faithfulness suite.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum scenarios in flight at once.")
+    parser.add_argument("--scenarios", help="Optional JSONL file of scenarios to run instead of the built-in three.")
+    parser.add_argument("--rescore", action="store_true",
+                        help="Ignore stored evaluations and re-judge every scenario.")
+    parser.add_argument("--defer-eval", action="store_true",
+                        help="Queue outputs for the background evaluation workers instead of judging inline.")
+    args = parser.parse_args()
+
+    run_batch_test(
+        load_scenarios(args.scenarios) if args.scenarios else None,
+        args.concurrency,
+        use_store=not args.rescore,
+        defer_evaluation=args.defer_eval,
+    )
@@ -0,0 +1,188 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_TRACE_PATH = os.getenv("TRACE_PATH", "./data/traces.jsonl")
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in {"0", "false", "no"}
+
+_current_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+class Span:
+    """One timed stage. Attributes set while the span is open end up in the JSONL record."""
+
+    def __init__(self, stage, attrs):
+        self.record = {"stage": stage, "trace_id": _current_trace_id.get(), **attrs}
+        self._start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.record.update(attrs)
+
+    def record_usage(self, response):
+        """Copy model, token usage and cache status from a chat completion.
+
+        A cache hit spent no tokens, so it records 0 rather than the stored
+        response's original usage.
+        """
+        usage = getattr(response, "usage", None)
+        cache_hit = getattr(response, "cache_hit", False)
+        self.record.update({
+            "model": getattr(response, "model", None),
+            "prompt_tokens": 0 if cache_hit else (usage.prompt_tokens if usage else None),
+            "completion_tokens": 0 if cache_hit else (usage.completion_tokens if usage else None),
+            "cache": "hit" if cache_hit else "miss",
+        })
+
+
+class _NoopSpan:
+    record = {}
+
+    def set(self, **attrs):
+        pass
+
+    def record_usage(self, response):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Writes one JSON line per finished span to an append-only file.
+
+    When disabled, ``span`` hands out a shared no-op object and never touches
+    the clock or the file.
+    """
+
+    def __init__(self, path=DEFAULT_TRACE_PATH, enabled=TRACING_ENABLED):
+        self.path = Path(path)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._handle = None
+
+    @contextmanager
+    def trace(self, name=None):
+        """Group the spans opened inside this block under one trace id.
+
+        Without ``name``, an enclosing trace's id is kept, so nested workflow
+        calls stay part of the caller's trace.
+        """
+        token = _current_trace_id.set(name or _current_trace_id.get() or uuid.uuid4().hex[:16])
+        try:
+            yield _current_trace_id.get()
+        finally:
+            _current_trace_id.reset(token)
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        span = Span(stage, attrs)
+        wall_start = time.time()
+        try:
+            yield span
+        except Exception as error:
+            span.set(error=f"{type(error).__name__}: {error}")
+            raise
+        finally:
+            span.record["ts"] = wall_start
+            span.record["duration_ms"] = round((time.perf_counter() - span._start) * 1000, 3)
+            self._write(span.record)
+
+    def _write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._handle is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._handle = self.path.open("a", encoding="utf-8", buffering=1)
+            self._handle.write(line)
+
+
+tracer = Tracer()
+span = tracer.span
+trace = tracer.trace
+
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def _tail_lines(handle, limit):
+    """The last ``limit`` complete lines of a binary file, read backwards in blocks."""
+    handle.seek(0, os.SEEK_END)
+    position = handle.tell()
+    data = b""
+    while position > 0 and data.count(b"\n") <= limit:
+        step = min(READ_BLOCK_SIZE, position)
+        position -= step
+        handle.seek(position)
+        data = handle.read(step) + data
+    lines = data.split(b"\n")
+    if position > 0:
+        lines = lines[1:]  # Starts mid-line.
+    return lines
+
+
+def read_spans(path=DEFAULT_TRACE_PATH, limit=None):
+    """Load span records from a JSONL sink (the last ``limit`` lines if given).
+
+    With ``limit`` only the end of the file is read, however large it has
+    grown. A line still being written by another process (no trailing
+    newline yet) or otherwise torn is skipped.
+    """
+    path = Path(path)
+    if not path.exists():
+        return []
+    with path.open("rb") as handle:
+        lines = _tail_lines(handle, limit) if limit else handle.read().split(b"\n")
+    # Everything after the last newline is an unfinished write.
+    lines = lines[:-1]
+    if limit:
+        lines = lines[-limit:]
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values`` (``fraction`` in 0..1)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_by_stage(records):
+    """Aggregate span records into per-stage count, p50/p95 latency and token totals."""
+    stages = {}
+    for record in records:
+        stages.setdefault(record["stage"], []).append(record)
+
+    summary = []
+    for stage, stage_records in sorted(stages.items()):
+        durations = [record["duration_ms"] for record in stage_records]
+        summary.append({
+            "stage": stage,
+            "count": len(stage_records),
+            "p50_ms": round(percentile(durations, 0.50), 1),
+            "p95_ms": round(percentile(durations, 0.95), 1),
+            "prompt_tokens": sum(record.get("prompt_tokens") or 0 for record in stage_records),
+            "completion_tokens": sum(record.get("completion_tokens") or 0 for record in stage_records),
+            "cache_hits": sum(1 for record in stage_records if record.get("cache") == "hit"),
+            "errors": sum(1 for record in stage_records if record.get("error")),
+        })
+    return summary
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent / "scripts"
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from eval_queue import DEFAULT_WORKERS as DEFAULT_EVAL_WORKERS, EvalWorkerPool
+from resources import get_openai_client, load_api_key, load_script_module
+
+DEFAULT_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+DEFAULT_MAX_WORKERS = int(os.getenv("SERVICE_MAX_WORKERS", "8"))
+DEFAULT_MAX_PENDING = int(os.getenv("SERVICE_MAX_PENDING", "64"))
+MAX_BODY_BYTES = 1024 * 1024
+REVISION_MODES = ("delta", "full")
+
+# Optional workflow fields -> accepted JSON type; anything else is a 400, not a 500 inside the workflow.
+OPTION_TYPES = {
+    "use_semantic_cache": bool,
+    "speculative": bool,
+    "drafts": int,
+    "max_concurrency": int,
+    "token_budget": int,
+    "time_budget_s": (int, float),
+    "revision_mode": str,
+    "run_id": str,
+}
+# Options that must be at least this large.
+OPTION_MINIMUMS = {"drafts": 1, "max_concurrency": 1, "token_budget": 0, "time_budget_s": 0}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _required(body, field):
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' must be a non-empty string")
+    return value
+
+
+def _options(body, names):
+    """The fields of ``names`` present in ``body``, type-checked against ``OPTION_TYPES``."""
+    options = {}
+    for name in names:
+        if name not in body:
+            continue
+        value, expected = body[name], OPTION_TYPES[name]
+        # bool is an int subclass, but `"drafts": true` is a client bug, not 1 draft.
+        if not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+            kind = {bool: "a boolean", int: "an integer", str: "a string"}.get(expected, "a number")
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be {kind}")
+        if name in OPTION_MINIMUMS and value < OPTION_MINIMUMS[name]:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be at least {OPTION_MINIMUMS[name]}")
+        options[name] = value
+    if options.get("revision_mode", REVISION_MODES[0]) not in REVISION_MODES:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'revision_mode' must be one of {', '.join(REVISION_MODES)}")
+    return options
+
+
+def generate(body):
+    workflow = load_script_module("3_workflow.py", "workflow_module")
+    output = workflow.run_integrated_workflow(_required(body, "query"), **_options(body, ("use_semantic_cache",)))
+    return {"output": output}
+
+
+def multi_agent(body):
+    multi_agent_module = load_script_module("5_multi_agent.py", "multi_agent_module")
+    options = _options(body, ("use_semantic_cache", "speculative", "drafts", "max_concurrency", "token_budget"))
+    return multi_agent_module.run_multi_agent_workflow(_required(body, "requirement"), **options)
+
+
+def langgraph(body):
+    langgraph_module = load_script_module("6_langgraph_flow.py", "langgraph_flow_module")
+    if body.get("resume_run_id"):
+        return langgraph_module.resume_langgraph_run(_required(body, "resume_run_id"))
+    options = _options(body, ("use_semantic_cache", "revision_mode", "token_budget", "time_budget_s", "run_id"))
+    return langgraph_module.run_langgraph_workflow(_required(body, "requirement"), **options)
+
+
+def _metrics(body):
+    metrics = body.get("metrics")
+    if metrics is not None and (not isinstance(metrics, list) or not all(isinstance(m, str) for m in metrics)):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'metrics' must be a list of metric names")
+    return metrics
+
+
+def audit(body):
+    final_eval_module = load_script_module("7_final_eval.py", "final_eval_module")
+    return final_eval_module.run_final_audit(
+        query=_required(body, "query"),
+        context=_required(body, "context"),
+        output=_required(body, "output"),
+        metrics=_metrics(body),
+    )
+
+
+def health(_body):
+    # Always a live round trip (unlike start_preflight_check, which caches success).
+    healthcheck = load_script_module("0_healthcheck.py")
+    ok, message = healthcheck.check_openai_auth(get_openai_client())
+    return {"ok": ok, "message": message}
+
+
+# POST path -> blocking handler run on the worker pool.
+ROUTES = {
+    "/generate": generate,
+    "/multi-agent": multi_agent,
+    "/langgraph": langgraph,
+    "/audit": audit,
+}
+
+
+class WorkflowService:
+    """Asyncio HTTP/1.1 front end for the workflows.
+
+    Handlers are blocking, so they run on a thread pool of ``max_workers``.
+    ``/health`` has its own single thread, so probes never queue behind
+    long workflows; concurrent probes share one check. Identical requests (same path and JSON body) that arrive while one is
+    already executing share that execution instead of starting another
+    (single-flight). Beyond ``max_pending`` distinct executions the service
+    answers 503 rather than queueing without bound.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow")
+        self.health_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="health")
+        self.health_check = None
+        self.in_flight = {}
+        self.stats = {"requests": 0, "executions": 0, "coalesced": 0, "rejected": 0, "errors": 0}
+        self.started_at = time.time()
+
+    async def execute(self, path, body):
+        """Run ``ROUTES[path](body)``, joining an identical in-flight execution if there is one.
+
+        Returns ``(result, coalesced)``.
+        """
+        key = (path, json.dumps(body, sort_keys=True))
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            # shield: one caller disconnecting must not cancel the shared execution.
+            return await asyncio.shield(task), True
+
+        if len(self.in_flight) >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many requests in flight; retry later")
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(loop.run_in_executor(self.executor, ROUTES[path], body))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        self.stats["executions"] += 1
+        return await asyncio.shield(task), False
+
+    async def health(self):
+        if self.health_check is None or self.health_check.done():
+            loop = asyncio.get_running_loop()
+            self.health_check = asyncio.ensure_future(loop.run_in_executor(self.health_executor, health, {}))
+        result = dict(await asyncio.shield(self.health_check))
+        result["service"] = {
+            **self.stats,
+            "in_flight": len(self.in_flight),
+            "max_workers": self.max_workers,
+            "uptime_s": round(time.time() - self.started_at, 1),
+        }
+        return (HTTPStatus.OK if result["ok"] else HTTPStatus.SERVICE_UNAVAILABLE), result
+
+    async def dispatch(self, method, path, body):
+        if path == "/health" and method == "GET":
+            return await self.health()
+        if path not in ROUTES:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown endpoint {path}")
+        if method != "POST":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{path} only accepts POST")
+        result, coalesced = await self.execute(path, body)
+        return HTTPStatus.OK, {"result": result, "coalesced": coalesced}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, raw_body = request
+                self.stats["requests"] += 1
+                try:
+                    body = json.loads(raw_body) if raw_body else {}
+                    if not isinstance(body, dict):
+                        raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+                    status, payload = await self.dispatch(method, path.split("?", 1)[0], body)
+                except json.JSONDecodeError as error:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {error}"}
+                except HTTPError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except Exception as error:
+                    self.stats["errors"] += 1
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(error).__name__}: {error}"}
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await _write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as error:
+            await _write_response(writer, error.status, {"error": str(error)}, keep_alive=False)
+        finally:
+            writer.close()
+
+
+async def _read_request(reader):
+    """``(method, path, headers, body)`` for the next request, or None at end of stream."""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, path, _version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+        if length < 0:
+            raise ValueError(length)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed Content-Length header")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+async def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, max_workers=DEFAULT_MAX_WORKERS,
+                max_pending=DEFAULT_MAX_PENDING, eval_workers=DEFAULT_EVAL_WORKERS):
+    service = WorkflowService(max_workers, max_pending)
+    if eval_workers:
+        # Sampled outputs are judged here, on their own threads, never on the request path.
+        EvalWorkerPool(workers=eval_workers).start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"🛰️ Workflow service listening on http://{host}:{port} ({max_workers} workers)")
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Headless HTTP service for the QA workflows.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Workflow executions running at once.")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING,
+                        help="Distinct executions accepted before answering 503.")
+    parser.add_argument("--eval-workers", type=int, default=DEFAULT_EVAL_WORKERS,
+                        help="Background evaluation workers (0 to leave the queue to scripts/eval_queue.py).")
+    args = parser.parse_args()
+
+    load_api_key()  # Fail fast on a missing key instead of on the first request.
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_workers, args.max_pending, args.eval_workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+os.environ.setdefault("TRACING_ENABLED", "0")
+
+import test_suite  # noqa: E402
+
+SCENARIOS = [
+    {"input": "slow security query", "expected_category": "security"},
+    {"input": "broken query", "expected_category": "technical"},
+    {"input": "fast technical query", "expected_category": "technical"},
+    {"input": "unroutable query", "expected_category": "security"},
+]
+
+
+class _Client:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def _retrieve(queries):
+    return [
+        {"error": "routing/retrieval failed: no category"} if query == "unroutable query"
+        else {"category": query.split()[1], "context": f"rules for {query}", "source": "inline"}
+        for query in queries
+    ]
+
+
+async def _workflow(query, async_client, retrieval):
+    if query == "broken query":
+        raise RuntimeError("model unavailable")
+    # The first scenario finishes last; results must still come back in input order.
+    await asyncio.sleep(0.05 if query.startswith("slow") else 0)
+    return {"category": retrieval["category"], "context": retrieval["context"], "output": f"plan for {query}"}
+
+
+def _run(monkeypatch, retrieve=_retrieve):
+    monkeypatch.setattr(test_suite, "create_async_openai_client", _Client)
+    monkeypatch.setattr(test_suite.workflow_module, "route_and_retrieve", retrieve)
+    monkeypatch.setattr(test_suite.workflow_module, "arun_integrated_workflow", _workflow)
+    return asyncio.run(test_suite.run_batch_test_async(SCENARIOS, concurrency=2, evaluate=False))
+
+
+def test_batch_keeps_input_order_and_reports_errors_per_scenario(monkeypatch):
+    results = _run(monkeypatch)
+
+    assert [row["input"] for row in results] == [scenario["input"] for scenario in SCENARIOS]
+    assert [row["category"] for row in results] == ["security", None, "technical", None]
+    assert results[0]["error"] is None and results[2]["error"] is None
+    assert results[1]["error"] == "model unavailable"
+    assert "no category" in results[3]["error"]
+
+
+def test_failed_batch_retrieval_falls_back_to_one_query_at_a_time(monkeypatch):
+    def retrieve(queries):
+        if len(queries) > 1:
+            raise RuntimeError("batch embedding failed")
+        return _retrieve(queries)
+
+    results = _run(monkeypatch, retrieve)
+
+    assert [row["error"] is None for row in results] == [True, False, True, False]
@@ -0,0 +1,84 @@
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from eval_queue import MAX_ATTEMPTS, EvalQueue  # noqa: E402
+
+# A lease this short has always expired, so every claim finds the running job abandoned.
+EXPIRED_LEASE_S = -1
+
+
+def _queue(tmp_path, **kwargs):
+    return EvalQueue(path=tmp_path / "eval_queue.sqlite", **kwargs)
+
+
+def _offer(queue, category):
+    return queue.offer("generate", category, "query", "context", "output")
+
+
+def test_sampling_is_stratified_per_category(tmp_path):
+    queue = _queue(tmp_path, sample_rate=0.1, category_rates={"security": 0.5})
+
+    technical = [_offer(queue, "technical") for _ in range(30)]
+    security = [_offer(queue, "security") for _ in range(10)]
+
+    # Exactly every tenth technical output and every second security output,
+    # however busy the other category is.
+    assert [index for index, job_id in enumerate(technical) if job_id] == [0, 10, 20]
+    assert sum(1 for job_id in security if job_id) == 5
+
+
+def test_sampling_counters_survive_reopening_the_queue(tmp_path):
+    first = _queue(tmp_path, sample_rate=0.5)
+    assert _offer(first, "security") is not None
+    assert _offer(first, "security") is None
+
+    reopened = _queue(tmp_path, sample_rate=0.5)
+    assert _offer(reopened, "security") is not None
+
+
+def test_enqueue_bypasses_sampling(tmp_path):
+    queue = _queue(tmp_path, sample_rate=0.0)
+
+    assert _offer(queue, "security") is None
+    assert queue.enqueue("audit", "security", "query", "context", "output") is not None
+
+
+def test_abandoned_job_is_reclaimed_until_its_attempts_run_out(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue.enqueue("audit", "security", "query", "context", "output", ["faithfulness"])
+
+    job = queue.claim()
+    assert job["id"] == job_id and job["attempts"] == 1 and job["metrics"] == ["faithfulness"]
+    # Still leased: no other worker may take it.
+    assert queue.claim() is None
+
+    for attempt in range(2, MAX_ATTEMPTS + 1):
+        job = queue.claim(lease_s=EXPIRED_LEASE_S)
+        assert job["id"] == job_id and job["attempts"] == attempt
+
+    assert queue.claim(lease_s=EXPIRED_LEASE_S) is None
+    failed = queue.job(job_id)
+    assert failed["status"] == "failed"
+    assert "lease expired" in failed["error"]
+
+
+def test_failed_attempt_is_requeued_then_completed(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue.enqueue("audit", "security", "query", "context", "output")
+
+    queue.fail(queue.claim(), "rate limited")
+    assert queue.job(job_id)["status"] == "queued"
+
+    job = queue.claim()
+    assert job["attempts"] == 2
+    queue.complete(job_id, {"faithfulness": 0.9}, {"faithfulness": "grounded"})
+    assert queue.job(job_id) == {
+        "id": job_id,
+        "status": "done",
+        "scores": {"faithfulness": 0.9},
+        "reasons": {"faithfulness": "grounded"},
+        "error": None,
+    }
@@ -0,0 +1,102 @@
+import math
+import random
+import sys
+from collections import Counter
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from lexical_index import BM25_B, BM25_K1, LexicalIndex, tokenize  # noqa: E402
+
+RULES = {
+    "mfa": ("Rule: All admin accounts must use Multi-Factor Authentication (MFA).", "security"),
+    "sha": ("Rule: Passwords must be hashed using SHA-256 with a unique salt.", "security"),
+    "latency": ("Rule: API response time for login must be under 200ms.", "technical"),
+    "rate-limit": ("Rule: The search endpoint must return HTTP 429 when rate limited.", "technical"),
+}
+
+
+def _index(tmp_path, rules=RULES):
+    index = LexicalIndex(tmp_path / "bm25_index.json")
+    index.upsert(list(rules), [text for text, _ in rules.values()],
+                 [{"category": category} for _, category in rules.values()])
+    return index
+
+
+def test_identifiers_stay_single_terms():
+    assert tokenize("Hash with SHA-256 in under 200ms over HTTP/1.1") == [
+        "hash", "with", "sha-256", "in", "under", "200ms", "over", "http/1.1",
+    ]
+
+
+def test_exact_identifier_ranks_its_rule_first_with_full_coverage(tmp_path):
+    doc_id, score, coverage, matched_terms = _index(tmp_path).search("SHA-256 salt", k=2)[0]
+
+    assert doc_id == "sha"
+    assert score > 0
+    assert coverage == 1.0
+    assert matched_terms == 2
+
+
+def test_unknown_and_stop_words_lower_coverage_but_not_ranking(tmp_path):
+    hits = _index(tmp_path).search("How do we enforce MFA for contractors?")
+
+    assert [hit[0] for hit in hits] == ["mfa"]
+    # "contractors" is not indexed and counts as missed; stopwords are ignored.
+    assert 0 < hits[0][2] < 1
+    assert hits[0][3] == 1
+
+
+def test_category_filter_and_common_terms(tmp_path):
+    index = _index(tmp_path)
+
+    assert [hit[0] for hit in index.search("admin login", category="technical")] == ["latency"]
+    # "rule" is in every document: above max_df it carries no signal and is skipped.
+    assert index.search("rule") == []
+
+
+def test_delete_removes_the_document_from_results(tmp_path):
+    index = _index(tmp_path)
+    index.delete(["sha"])
+
+    assert index.search("SHA-256") == []
+    assert len(index) == len(RULES) - 1
+
+
+def _brute_force(index, query):
+    """Plain BM25 over every document, for comparison with the pruned search."""
+    terms = [term for term in dict.fromkeys(tokenize(query)) if term in index._postings]
+    count = len(index.documents)
+    terms = [term for term in terms if len(index._postings[term]) <= 0.5 * count]
+    average_length = sum(index._lengths.values()) / count
+    scores = Counter()
+    for term in terms:
+        df = len(index._postings[term])
+        idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+        for doc_id, frequency in index._postings[term].items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * index._lengths[doc_id] / average_length)
+            scores[doc_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+    return scores
+
+
+def test_pruned_search_returns_the_exact_top_k(tmp_path):
+    generator = random.Random(7)
+    vocabulary = [f"term{number}" for number in range(300)]
+    rules = {
+        f"doc-{number}": (" ".join(generator.choices(vocabulary, k=generator.randint(5, 30))), "security")
+        for number in range(2000)
+    }
+    index = _index(tmp_path, rules)
+
+    for _ in range(25):
+        query = " ".join(generator.sample(vocabulary, 4))
+        expected = _brute_force(index, query)
+        hits = index.search(query, k=10)
+        assert len(hits) == min(10, len(expected))
+        for doc_id, score, *_ in hits:
+            assert math.isclose(score, expected[doc_id])
+        # Nothing outside the result beats its lowest score.
+        lowest = hits[-1][1]
+        returned = {hit[0] for hit in hits}
+        assert all(score <= lowest + 1e-9 for doc_id, score in expected.items() if doc_id not in returned)
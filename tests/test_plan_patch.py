@@ -0,0 +1,48 @@
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+os.environ.setdefault("TRACING_ENABLED", "0")
+
+from resources import load_script_module  # noqa: E402
+
+langgraph_flow = load_script_module("6_langgraph_flow.py")
+
+PLAN = "## Scope\nAdmin logins.\n\n## Cases\n1. MFA prompt shown."
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+def test_section_patch_replaces_only_named_sections():
+    patched = langgraph_flow.apply_plan_patch(PLAN, "## Cases\n1. MFA prompt shown.\n2. Lockout after 5 failures.")
+    assert "Admin logins." in patched
+    assert "Lockout after 5 failures." in patched
+
+
+def test_patch_without_headings_replaces_the_whole_plan():
+    rewrite = "Rewritten plan: cover MFA enrolment, prompts and lockout."
+    assert langgraph_flow.apply_plan_patch(PLAN, rewrite) == rewrite
+
+
+def test_architect_sends_the_full_plan_to_the_auditor_when_the_patch_has_no_headings(monkeypatch):
+    rewrite = "Rewritten plan: cover MFA enrolment, prompts and lockout."
+    monkeypatch.setattr(langgraph_flow, "get_openai_client", lambda: None)
+    monkeypatch.setattr(langgraph_flow, "cached_chat_completion", lambda client, **request: _completion(rewrite))
+    state = {
+        "requirement": "Admins must use MFA.",
+        "test_plan": PLAN,
+        "feedback": "Missing lockout cases.",
+        "revision_count": 1,
+        "revision_mode": "delta",
+    }
+
+    update = langgraph_flow.architect_node(state)
+
+    assert update["test_plan"] == rewrite
+    # No changed sections: the auditor reviews the full, actually applied plan.
+    assert update["changed_sections"] == ""
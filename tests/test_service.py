@@ -0,0 +1,61 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import service  # noqa: E402
+
+
+def test_identical_requests_share_one_execution(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def slow_route(body):
+        calls.append(body)
+        release.wait(5)
+        return {"echo": body["query"]}
+
+    monkeypatch.setitem(service.ROUTES, "/generate", slow_route)
+
+    async def run():
+        workflow_service = service.WorkflowService(max_workers=2)
+        first = asyncio.ensure_future(workflow_service.execute("/generate", {"query": "mfa"}))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(workflow_service.execute("/generate", {"query": "mfa"}))
+        other = asyncio.ensure_future(workflow_service.execute("/generate", {"query": "latency"}))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(first, second, other), workflow_service.stats
+
+    (first, second, other), stats = asyncio.run(run())
+
+    assert first == ({"echo": "mfa"}, False)
+    assert second == ({"echo": "mfa"}, True)
+    assert other == ({"echo": "latency"}, False)
+    assert len(calls) == 2
+    assert stats["executions"] == 2 and stats["coalesced"] == 1
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"drafts": "3"}, "'drafts' must be an integer"),
+    ({"drafts": True}, "'drafts' must be an integer"),
+    ({"drafts": 0}, "'drafts' must be at least 1"),
+    ({"speculative": "yes"}, "'speculative' must be a boolean"),
+    ({"revision_mode": "partial"}, "'revision_mode' must be one of delta, full"),
+])
+def test_badly_typed_options_are_rejected(body, message):
+    with pytest.raises(service.HTTPError) as error:
+        service._options(body, ("drafts", "speculative", "revision_mode"))
+
+    assert error.value.status == 400
+    assert str(error.value) == message
+
+
+def test_valid_options_pass_through():
+    options = service._options({"drafts": 3, "time_budget_s": 1.5, "query": "ignored"}, ("drafts", "time_budget_s"))
+
+    assert options == {"drafts": 3, "time_budget_s": 1.5}